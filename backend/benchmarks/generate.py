@@ -0,0 +1,191 @@
+"""
+Synthetic data generator: data rooms x folder depth x fan-out x files per
+folder, loaded with COPY (millions of rows in minutes) in one transaction per
+data room, followed by a rebuild of the aggregates.
+
+Every room has `fanout` root folders, each folder has `fanout` subfolders down
+to `depth` levels and every folder holds `files` files. Files point to a few
+shared sparse PDFs (a PDF header and trailer around a hole of --file-size
+bytes), so disk usage stays small whatever the size; their text_status is
+'indexed' so the text indexer leaves them alone.
+
+Generated rooms are named "<prefix>-<n>-<random>" and can be removed with --drop.
+
+    cd backend && python -m benchmarks.generate --rooms 2 --depth 3 --fanout 10 --files 20
+    cd backend && python -m benchmarks.generate --drop
+"""
+import argparse
+import csv
+import io
+import json
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+from sqlalchemy import delete
+
+from src.database.db import SessionLocal, get_engine
+from src.database.models import DataRoom
+from src.repository import stats
+from src.repository.files import UPLOAD_DIR
+
+BLOB_DIR = UPLOAD_DIR / "benchmark"
+
+FOLDER_COLUMNS = ('id', 'data_room_id', 'parent_folder_id', 'name', 'depth', 'created_at', 'updated_at')
+FILE_COLUMNS = (
+    'id', 'data_room_id', 'folder_id', 'name', 'original_name', 'storage_path', 'file_size',
+    'content_type', 'created_at', 'updated_at', 'text_status',
+)
+
+
+def write_sparse_pdf(path: Path, size: int) -> None:
+    """
+    A file of `size` bytes that takes (almost) no disk space.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("wb") as f:
+        f.write(b"%PDF-1.4\n%benchmark\n")
+        f.truncate(max(size, 32))
+        f.seek(max(size, 32) - 6)
+        f.write(b"%%EOF\n")
+
+
+def blob_paths(variants: int, size: int) -> list:
+    paths = []
+    for i in range(variants):
+        path = BLOB_DIR / f"{i}-{size}.pdf"
+        if not path.exists():
+            write_sparse_pdf(path, size)
+        paths.append(str(path))
+    return paths
+
+
+class CopyBuffer:
+    """
+    CSV rows of one table, sent with COPY whenever `chunk` rows are waiting.
+    """
+
+    def __init__(self, cursor, table: str, columns: tuple, chunk: int):
+        self.cursor = cursor
+        self.sql = f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)"
+        self.chunk = chunk
+        self.rows = 0
+        self.total = 0
+        self._buffer = io.StringIO()
+        self._writer = csv.writer(self._buffer)
+
+    def add(self, row: tuple) -> bool:
+        """
+        Add a row; True once the buffer should be flushed.
+        """
+        self._writer.writerow(row)
+        self.rows += 1
+        return self.rows >= self.chunk
+
+    def flush(self) -> None:
+        if self.rows:
+            self._buffer.seek(0)
+            self.cursor.copy_expert(self.sql, self._buffer)
+            self.total += self.rows
+            self.rows = 0
+            self._buffer = io.StringIO()
+            self._writer = csv.writer(self._buffer)
+
+
+def generate_room(cursor, name: str, depth: int, fanout: int, files: int, file_size: int, blobs: list, chunk: int):
+    now = datetime.now().isoformat()
+    data_room_id = uuid.uuid4()
+    cursor.execute(
+        "INSERT INTO data_room (id, name, created_at, updated_at) VALUES (%s, %s, %s, %s)",
+        (str(data_room_id), name, now, now)
+    )
+    folders = CopyBuffer(cursor, 'folders', FOLDER_COLUMNS, chunk)
+    file_rows = CopyBuffer(cursor, 'files', FILE_COLUMNS, chunk)
+
+    def flush():
+        # Files reference folders, so their folders go first
+        folders.flush()
+        file_rows.flush()
+
+    level = [None]  # parents of the current level; None = data room root
+    for folder_depth in range(depth):
+        next_level = []
+        for parent_id in level:
+            for i in range(fanout):
+                folder_id = uuid.uuid4()
+                next_level.append(folder_id)
+                # An empty unquoted field is NULL in COPY's csv format
+                if folders.add((folder_id, data_room_id, parent_id or '', f"folder-{folder_depth}-{i}", folder_depth, now, now)):
+                    flush()
+                for j in range(files):
+                    if file_rows.add((
+                        uuid.uuid4(), data_room_id, folder_id, f"file-{j}", f"file-{j}.pdf",
+                        blobs[j % len(blobs)], file_size, 'application/pdf', now, now, 'indexed'
+                    )):
+                        flush()
+        level = next_level
+    flush()
+    return data_room_id, folders.total, file_rows.total
+
+
+def drop(prefix: str) -> int:
+    db = SessionLocal()
+    try:
+        result = db.execute(delete(DataRoom).where(DataRoom.name.like(f"{prefix}-%")))  # type: ignore
+        db.commit()
+        return result.rowcount
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rooms', type=int, default=1)
+    parser.add_argument('--depth', type=int, default=3)
+    parser.add_argument('--fanout', type=int, default=5)
+    parser.add_argument('--files', type=int, default=10, help="files per folder")
+    parser.add_argument('--file-size', type=int, default=1024 * 1024, help="apparent size of the sparse PDFs")
+    parser.add_argument('--blob-variants', type=int, default=8, help="distinct blob files shared by all rows")
+    parser.add_argument('--chunk', type=int, default=50000, help="rows per COPY")
+    parser.add_argument('--prefix', default='benchmark')
+    parser.add_argument('--drop', action='store_true', help="delete the generated data rooms and exit")
+    args = parser.parse_args()
+
+    if args.drop:
+        print(json.dumps({'dropped_rooms': drop(args.prefix)}))
+        return
+
+    blobs = blob_paths(args.blob_variants, args.file_size)
+    for n in range(args.rooms):
+        started = time.perf_counter()
+        name = f"{args.prefix}-{n}-{uuid.uuid4().hex[:8]}"
+        connection = get_engine().raw_connection()
+        try:
+            cursor = connection.cursor()
+            data_room_id, folders, files = generate_room(
+                cursor, name, args.depth, args.fanout, args.files, args.file_size, blobs, args.chunk
+            )
+            connection.commit()
+        finally:
+            connection.close()
+        loaded = time.perf_counter()
+
+        db = SessionLocal()
+        try:
+            stats.rebuild_stats(db, data_room_id)
+            db.commit()
+        finally:
+            db.close()
+        print(json.dumps({
+            'data_room_id': str(data_room_id),
+            'name': name,
+            'folders': folders,
+            'files': files,
+            'copy_seconds': round(loaded - started, 2),
+            'stats_seconds': round(time.perf_counter() - loaded, 2),
+        }))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,274 @@
+"""
+Load test: concurrent clients drive the real ASGI app with a weighted mix of
+browse, download, upload, rename and delete requests against data generated
+by benchmarks.generate, and the run is reported as JSON: throughput and, per
+operation, p50/p95/p99 latency, errors and SQL statements per request (from
+the Server-Timing header of SQL profiling, which the runner turns on).
+
+Modes:
+- inprocess: httpx over ASGITransport, no network in between
+- socket: the app served by uvicorn on a local port in this process
+- --url: an already running server (queries per request only if it has
+  SQL_PROFILING=true)
+
+The embedded modes run without the lifespan (no text indexer or event broker)
+and with rate limiting off. Deletes only remove files uploaded by the run
+itself.
+
+    cd backend && python -m benchmarks.generate --rooms 1 --depth 3 --fanout 10 --files 20
+    cd backend && python -m benchmarks.load --mode inprocess --concurrency 16 --duration 30 \\
+        [--mix browse_folder=50,download=20,upload=10,rename=10,delete=10] [--save-baseline load.json]
+    cd backend && python -m benchmarks.load --mode socket --baseline load.json --max-regression 20
+"""
+import argparse
+import asyncio
+import json
+import random
+import re
+import socket
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict
+from typing import Dict, List
+
+import httpx
+from sqlalchemy import text
+
+from benchmarks import report
+from config import settings
+
+DEFAULT_MIX = "browse_room=5,browse_folder=40,get_file=20,download=15,upload=10,rename=5,delete=5"
+
+_QUERIES_RE = re.compile(r'desc="(\d+) queries"')
+
+_SAMPLE_SQL = """
+SELECT id FROM {table}
+WHERE data_room_id IN (SELECT id FROM data_room WHERE name LIKE :pattern)
+ORDER BY random() LIMIT :limit
+"""
+
+
+class Targets:
+    """
+    Ids the operations pick from: a random sample of the generated data plus
+    the files uploaded during the run.
+    """
+
+    def __init__(self, prefix: str, sample: int):
+        from src.database.db import SessionLocal
+        db = SessionLocal()
+        try:
+            params = {'pattern': f"{prefix}-%", 'limit': sample}
+            self.rooms = [str(i) for i in db.execute(text(
+                "SELECT id FROM data_room WHERE name LIKE :pattern LIMIT :limit"
+            ), params).scalars()]
+            self.folders = [str(i) for i in db.execute(text(_SAMPLE_SQL.format(table='folders')), params).scalars()]
+            self.files = [str(i) for i in db.execute(text(_SAMPLE_SQL.format(table='files')), params).scalars()]
+        finally:
+            db.close()
+        if not (self.rooms and self.folders and self.files):
+            sys.exit(f"No generated data rooms named '{prefix}-*' with folders and files; run benchmarks.generate first")
+        self.uploaded: List[str] = []
+
+
+async def browse_room(client, targets, args):
+    return await client.get(f"/api/data-rooms/{random.choice(targets.rooms)}")
+
+
+async def browse_folder(client, targets, args):
+    return await client.get(f"/api/folders/{random.choice(targets.folders)}")
+
+
+async def get_file(client, targets, args):
+    return await client.get(f"/api/files/{random.choice(targets.files)}")
+
+
+async def download(client, targets, args):
+    return await client.get(f"/api/files/{random.choice(targets.files)}/download")
+
+
+async def upload(client, targets, args):
+    content = b"%PDF-1.4\n" + b"0" * max(args.upload_size - 9, 0)
+    response = await client.post(
+        "/api/files/upload",
+        data={'name': f"load-{uuid.uuid4().hex[:12]}", 'folder_id': random.choice(targets.folders)},
+        files={'file': ("load.pdf", content, "application/pdf")},
+    )
+    if response.status_code == 201:
+        targets.uploaded.append(response.json()['id'])
+    return response
+
+
+async def rename(client, targets, args):
+    file_id = random.choice(targets.uploaded or targets.files)
+    return await client.put(f"/api/files/{file_id}", json={'name': f"renamed-{uuid.uuid4().hex[:12]}"})
+
+
+async def delete(client, targets, args):
+    if not targets.uploaded:
+        return await upload(client, targets, args)
+    file_id = targets.uploaded.pop(random.randrange(len(targets.uploaded)))
+    return await client.delete(f"/api/files/{file_id}")
+
+
+OPERATIONS = {
+    'browse_room': browse_room,
+    'browse_folder': browse_folder,
+    'get_file': get_file,
+    'download': download,
+    'upload': upload,
+    'rename': rename,
+    'delete': delete,
+}
+
+
+def parse_mix(mix: str) -> Dict[str, float]:
+    weights = {}
+    for part in mix.split(','):
+        name, _, weight = part.partition('=')
+        if name.strip() not in OPERATIONS:
+            raise argparse.ArgumentTypeError(f"Unknown operation '{name}', expected one of {', '.join(OPERATIONS)}")
+        weights[name.strip()] = float(weight or 1)
+    return weights
+
+
+async def run_load(client: httpx.AsyncClient, targets: Targets, args) -> dict:
+    weights = parse_mix(args.mix)
+    names, weight_values = list(weights), list(weights.values())
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    queries: Dict[str, List[int]] = defaultdict(list)
+    errors: Dict[str, int] = defaultdict(int)
+
+    # Warm up (connections, statement caches) before timing
+    for _ in range(args.warmup):
+        await OPERATIONS[random.choice(names)](client, targets, args)
+
+    started = time.perf_counter()
+    deadline = started + args.duration
+
+    async def worker():
+        while time.perf_counter() < deadline:
+            name = random.choices(names, weights=weight_values)[0]
+            start = time.perf_counter()
+            try:
+                response = await OPERATIONS[name](client, targets, args)
+                status = response.status_code
+                if status < 400:
+                    # Read the whole body, e.g. of downloads
+                    await response.aread()
+            except httpx.HTTPError:
+                response, status = None, 0
+            elapsed = (time.perf_counter() - start) * 1000
+            latencies[name].append(elapsed)
+            if status == 0 or status >= 400:
+                errors[name] += 1
+            if response is not None:
+                match = _QUERIES_RE.search(response.headers.get('server-timing', ''))
+                if match:
+                    queries[name].append(int(match.group(1)))
+
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - started
+
+    total = sum(len(samples) for samples in latencies.values())
+    return {
+        'mode': args.mode if not args.url else 'url',
+        'concurrency': args.concurrency,
+        'duration_s': round(elapsed, 2),
+        'requests': total,
+        'throughput_rps': round(total / elapsed, 1),
+        'errors': sum(errors.values()),
+        'operations': {
+            name: {
+                'count': len(latencies[name]),
+                'errors': errors[name],
+                'latency_ms': report.summarize(latencies[name]),
+                'queries_per_request': (
+                    round(sum(queries[name]) / len(queries[name]), 2) if queries[name] else None
+                ),
+            }
+            for name in sorted(latencies)
+        },
+    }
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(app, port: int):
+    import uvicorn
+    server = uvicorn.Server(uvicorn.Config(app, host='127.0.0.1', port=port, lifespan='off', log_level='warning'))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, thread
+
+
+async def main_async(args) -> dict:
+    targets = Targets(args.prefix, args.sample)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    timeout = httpx.Timeout(60)
+
+    if args.url:
+        async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=timeout) as client:
+            return await run_load(client, targets, args)
+
+    from main import app
+    settings.SQL_PROFILING = True
+    settings.RATE_LIMIT_ENABLED = False
+    if args.mode == 'inprocess':
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://benchmark', timeout=timeout) as client:
+            return await run_load(client, targets, args)
+
+    server, thread = start_server(app, free_port())
+    try:
+        base_url = f"http://127.0.0.1:{server.config.port}"
+        async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=timeout) as client:
+            return await run_load(client, targets, args)
+    finally:
+        server.should_exit = True
+        thread.join(timeout=10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mode', choices=('inprocess', 'socket'), default='inprocess')
+    parser.add_argument('--url', help="base URL of a running server instead of an embedded app")
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=20, help="seconds")
+    parser.add_argument('--warmup', type=int, default=50, help="requests before timing starts")
+    parser.add_argument('--mix', default=DEFAULT_MIX, help="operation=weight,...")
+    parser.add_argument('--upload-size', type=int, default=256 * 1024)
+    parser.add_argument('--prefix', default='benchmark', help="name prefix of the generated data rooms")
+    parser.add_argument('--sample', type=int, default=10000, help="folders/files sampled as targets")
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--save-baseline', help="write the per-operation latencies to this file")
+    parser.add_argument('--baseline', help="compare p95 latencies against this file")
+    parser.add_argument('--max-regression', type=float, default=20, help="percent")
+    args = parser.parse_args()
+    parse_mix(args.mix)
+    random.seed(args.seed)
+
+    result = asyncio.run(main_async(args))
+    print(json.dumps(result, indent=2))
+
+    latencies = {name: op['latency_ms'] for name, op in result['operations'].items()}
+    if args.save_baseline:
+        report.save(args.save_baseline, latencies)
+    if args.baseline:
+        found = report.regressions(latencies, report.load(args.baseline), 'p95', args.max_regression)
+        for line in found:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        if found:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,314 @@
+"""
+Micro-benchmarks of the repository and serialization hot paths, in the style
+of pyperf: every case is calibrated to a number of loops per sample (at least
+--min-time seconds), then --samples samples are timed and reported as time
+per operation (mean, stdev, median, min, max in microseconds).
+
+Cases:
+- get_data_room / get_folder / get_file: repository lookups (ORM) and the
+  read path of the GET endpoints (listings / reads), on a local fixture
+- create_folder: one committed folder per operation
+- upload_file_<size>: repository upload of a PDF of that size
+- serialize_<wide|deep>_<model|fast>: a folder tree through FolderResponse
+  (response_model path) and through the fast TypeAdapter path
+
+Results can be saved as a baseline; a later run with --baseline fails (exit
+status 1) if a case's median got more than --max-regression percent slower.
+
+Needs the database from DATABASE_URL (a throwaway data room is created and
+removed again). Redis is replaced by fakeredis unless --real-redis is given.
+
+    cd backend && python -m benchmarks.micro [--cases get_file,serialize] [--save-baseline micro.json]
+    cd backend && python -m benchmarks.micro --baseline micro.json --max-regression 10
+"""
+import argparse
+import io
+import json
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime
+from typing import Callable, Dict, List, Tuple
+
+from fastapi import UploadFile
+
+from benchmarks import report
+from src.database.db import SessionLocal, ReadSessionLocal
+from src.database.models import DataRoom, Folder, File
+from src.repository import data_rooms, folders, files, listings, reads
+from src.schemas import FolderCreate, FolderResponse
+from src import serialization
+
+UPLOAD_SIZES = {'64k': 64 * 1024, '1m': 1024 * 1024, '10m': 10 * 1024 * 1024}
+
+
+def use_fake_redis() -> None:
+    try:
+        import fakeredis
+    except ImportError:
+        sys.exit("fakeredis is not installed (pip install 'fakeredis[lua]'), or pass --real-redis")
+    from src import cache
+    server = fakeredis.FakeServer()
+    cache.use_clients(
+        fakeredis.FakeRedis(server=server, decode_responses=True),
+        fakeredis.aioredis.FakeRedis(server=server, decode_responses=True),
+    )
+
+
+# ------------------- Fixture -------------------
+
+class Fixture:
+    """
+    A data room with a folder of --wide files and a chain of --deep nested
+    folders with a few files each.
+    """
+
+    def __init__(self, wide: int, deep: int):
+        db = SessionLocal()
+        try:
+            data_room = DataRoom(name=f"micro-{uuid.uuid4().hex[:8]}")
+            db.add(data_room)
+            db.flush()
+            self.data_room_id = data_room.id
+
+            wide_folder = Folder(name="wide", depth=0, data_room_id=data_room.id)
+            db.add(wide_folder)
+            db.flush()
+            self.folder_id = wide_folder.id
+            db.add_all([self._file(data_room.id, wide_folder.id, i) for i in range(wide)])
+
+            parent = None
+            for level in range(deep):
+                folder = Folder(
+                    name=f"deep-{level}", depth=level, data_room_id=data_room.id,
+                    parent_folder_id=parent.id if parent else None
+                )
+                db.add(folder)
+                db.flush()
+                db.add_all([self._file(data_room.id, folder.id, i) for i in range(3)])
+                if parent is None:
+                    self.deep_folder_id = folder.id
+                parent = folder
+
+            db.flush()
+            self.file_id = db.execute(
+                File.__table__.select().where(File.folder_id == wide_folder.id).limit(1)  # type: ignore
+            ).first().id
+            db.commit()
+        finally:
+            db.close()
+        self.blobs: List[str] = []
+
+    @staticmethod
+    def _file(data_room_id, folder_id, i: int) -> File:
+        return File(
+            name=f"file-{i}", original_name=f"file-{i}.pdf", storage_path="uploads/micro.pdf",
+            file_size=1024, content_type="application/pdf", data_room_id=data_room_id, folder_id=folder_id,
+            text_status='indexed'
+        )
+
+    def drop(self) -> None:
+        db = SessionLocal()
+        try:
+            db.delete(db.get(DataRoom, self.data_room_id))
+            db.commit()
+        finally:
+            db.close()
+        files.remove_blobs(self.blobs)
+
+
+# ------------------- Cases -------------------
+
+def _read_case(session_factory, fn: Callable) -> Callable:
+    """
+    Operation that runs fn in a session and ends the transaction like a request.
+    """
+    db = session_factory()
+
+    def op():
+        fn(db)
+        db.rollback()
+
+    op.close = db.close
+    return op
+
+
+def build_cases(fixture: Fixture, args) -> Dict[str, Callable[[], Callable]]:
+    def create_folder():
+        db = SessionLocal()
+
+        def op():
+            folders.create_folder(db, FolderCreate(
+                name=f"c-{uuid.uuid4().hex[:12]}", parent_folder_id=fixture.folder_id,
+                data_room_id=fixture.data_room_id
+            ))
+
+        op.close = db.close
+        return op
+
+    def upload_file(size: int):
+        def factory():
+            db = SessionLocal()
+            content = b"%PDF-1.4\n" + b"0" * (size - 9)
+
+            def op():
+                uploaded = files.upload_file(
+                    db, UploadFile(file=io.BytesIO(content), filename="micro.pdf"),
+                    fixture.folder_id, f"u-{uuid.uuid4().hex[:12]}"
+                )
+                fixture.blobs.append(uploaded.storage_path)
+
+            op.close = db.close
+            return op
+        return factory
+
+    def serialize(record: dict, fast: bool):
+        def factory():
+            if fast:
+                return lambda: serialization.folder_adapter.dump_json(record)
+            return lambda: FolderResponse.model_validate(record).model_dump_json()
+        return factory
+
+    wide, deep = tree_records(args.wide, args.deep)
+    cases = {
+        'get_data_room_orm': lambda: _read_case(
+            SessionLocal, lambda db: data_rooms.get_data_room(db, fixture.data_room_id)),
+        'get_data_room_tree': lambda: _read_case(
+            ReadSessionLocal, lambda db: listings.get_data_room_tree(db, fixture.data_room_id)),
+        'get_folder_orm': lambda: _read_case(
+            SessionLocal, lambda db: folders.get_folder(db, fixture.folder_id)),
+        'get_folder_tree': lambda: _read_case(
+            ReadSessionLocal, lambda db: listings.get_folder_tree(db, fixture.folder_id)),
+        'get_file_orm': lambda: _read_case(
+            SessionLocal, lambda db: files.get_file(db, fixture.file_id)),
+        'get_file_reads': lambda: _read_case(
+            ReadSessionLocal, lambda db: reads.get_file(db, fixture.file_id)),
+        'create_folder': create_folder,
+        'serialize_wide_model': serialize(wide, fast=False),
+        'serialize_wide_fast': serialize(wide, fast=True),
+        'serialize_deep_model': serialize(deep, fast=False),
+        'serialize_deep_fast': serialize(deep, fast=True),
+    }
+    for label, size in UPLOAD_SIZES.items():
+        cases[f'upload_file_{label}'] = upload_file(size)
+    return cases
+
+
+def tree_records(wide: int, deep: int) -> Tuple[dict, dict]:
+    """
+    In-memory FolderRecords: one folder with `wide` files, and a chain of
+    `deep` nested folders with three files each.
+    """
+    now = datetime.now()
+    room_id = uuid.uuid4()
+
+    def folder(name: str, depth: int, parent_id=None) -> dict:
+        return {
+            'id': uuid.uuid4(), 'name': name, 'depth': depth, 'parent_folder_id': parent_id,
+            'data_room_id': room_id, 'created_at': now, 'updated_at': now, 'direct_file_count': 0,
+            'direct_size': 0, 'file_count': 0, 'total_size': 0, 'last_modified_at': now,
+            'folders': [], 'files': [],
+        }
+
+    def file(folder_id, i: int) -> dict:
+        return {
+            'id': uuid.uuid4(), 'name': f"file-{i}", 'original_name': f"file-{i}.pdf",
+            'storage_path': "uploads/micro.pdf", 'file_size': 1024, 'content_type': "application/pdf",
+            'data_room_id': room_id, 'folder_id': folder_id, 'created_at': now, 'updated_at': now,
+            'text_status': 'indexed', 'page_count': 1,
+        }
+
+    wide_record = folder("wide", 0)
+    wide_record['files'] = [file(wide_record['id'], i) for i in range(wide)]
+
+    deep_record = parent = folder("deep-0", 0)
+    for level in range(deep):
+        parent['files'] = [file(parent['id'], i) for i in range(3)]
+        if level < deep - 1:
+            child = folder(f"deep-{level + 1}", level + 1, parent['id'])
+            parent['folders'].append(child)
+            parent = child
+    return wide_record, deep_record
+
+
+# ------------------- Runner -------------------
+
+def run_case(factory: Callable, samples: int, min_time: float) -> dict:
+    op = factory()
+    try:
+        # Warm up, then calibrate the loops so a sample takes at least min_time
+        start = time.perf_counter()
+        op()
+        loops = 1
+        while True:
+            start = time.perf_counter()
+            for _ in range(loops):
+                op()
+            elapsed = time.perf_counter() - start
+            if elapsed >= min_time or loops >= 1_000_000:
+                break
+            loops *= 2 if elapsed * 2 >= min_time else 10
+
+        values = []
+        for _ in range(samples):
+            start = time.perf_counter()
+            for _ in range(loops):
+                op()
+            values.append((time.perf_counter() - start) / loops * 1_000_000)
+    finally:
+        close = getattr(op, 'close', None)
+        if close is not None:
+            close()
+
+    return {
+        'loops': loops,
+        'samples': samples,
+        'mean_us': round(statistics.mean(values), 2),
+        'stdev_us': round(statistics.stdev(values), 2) if len(values) > 1 else 0.0,
+        'median_us': round(statistics.median(values), 2),
+        'min_us': round(min(values), 2),
+        'max_us': round(max(values), 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--cases', help="comma separated case name prefixes (default: all)")
+    parser.add_argument('--samples', type=int, default=10)
+    parser.add_argument('--min-time', type=float, default=0.1, help="seconds per sample")
+    parser.add_argument('--wide', type=int, default=2000, help="files of the wide folder")
+    parser.add_argument('--deep', type=int, default=50, help="levels of the deep folder chain")
+    parser.add_argument('--real-redis', action='store_true', help="use the configured Redis instead of fakeredis")
+    parser.add_argument('--save-baseline', help="write the results to this file")
+    parser.add_argument('--baseline', help="compare medians against this file")
+    parser.add_argument('--max-regression', type=float, default=10, help="percent")
+    args = parser.parse_args()
+
+    if not args.real_redis:
+        use_fake_redis()
+
+    fixture = Fixture(args.wide, args.deep)
+    results = {}
+    try:
+        cases = build_cases(fixture, args)
+        prefixes = args.cases.split(',') if args.cases else ['']
+        for name, factory in cases.items():
+            if any(name.startswith(prefix) for prefix in prefixes):
+                results[name] = run_case(factory, args.samples, args.min_time)
+                print(json.dumps({'case': name, **results[name]}), flush=True)
+    finally:
+        fixture.drop()
+
+    if args.save_baseline:
+        report.save(args.save_baseline, results)
+    if args.baseline:
+        found = report.regressions(results, report.load(args.baseline), 'median_us', args.max_regression)
+        for line in found:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        if found:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
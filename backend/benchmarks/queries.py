@@ -0,0 +1,122 @@
+"""
+Query layer micro-benchmark: per-call cost of the metadata lookups of the hot
+GET endpoints through the ORM (select(Model) + entity loading, default
+session) versus src/repository/reads.py (cached lambda statements returning
+Core rows, read session).
+
+Needs the database from DATABASE_URL; a throwaway data room is created and
+removed again.
+
+    cd backend && python -m benchmarks.queries [--iterations 2000] [--rounds 3]
+"""
+import argparse
+import json
+import time
+import uuid
+
+from sqlalchemy import select
+
+from src.database.db import SessionLocal, ReadSessionLocal
+from src.database.models import DataRoom, Folder, File
+from src.repository import reads
+
+
+def orm_file(db, file_id):
+    return db.execute(select(File).where(File.id == file_id)).scalar_one_or_none()  # type: ignore
+
+
+def orm_data_room(db, data_room_id):
+    return db.execute(select(DataRoom).where(DataRoom.id == data_room_id)).scalar_one_or_none()  # type: ignore
+
+
+def orm_folder_version(db, folder_id):
+    return db.execute(
+        select(Folder.data_room_id, DataRoom.change_seq)
+        .join(DataRoom, DataRoom.id == Folder.data_room_id)  # type: ignore
+        .where(Folder.id == folder_id)  # type: ignore
+    ).first()
+
+
+def per_call_us(session_factory, fn, entity_id, iterations: int) -> tuple:
+    """
+    (wall, CPU) microseconds per call. CPU time leaves out the wait for the
+    database, i.e. it is the Python overhead this benchmark is about.
+    """
+    db = session_factory()
+    try:
+        for _ in range(50):  # warm up caches and the connection
+            fn(db, entity_id)
+            db.rollback()
+        wall, cpu = time.perf_counter(), time.process_time()
+        for _ in range(iterations):
+            fn(db, entity_id)
+            db.rollback()  # a request ends its transaction and identity map
+        wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+        return wall / iterations * 1_000_000, cpu / iterations * 1_000_000
+    finally:
+        db.close()
+
+
+def create_fixture():
+    db = SessionLocal()
+    try:
+        data_room = DataRoom(name=f"benchmark-{uuid.uuid4().hex[:8]}")
+        db.add(data_room)
+        db.flush()
+        folder = Folder(name="benchmark", depth=0, data_room_id=data_room.id)
+        db.add(folder)
+        db.flush()
+        file = File(
+            name="benchmark", original_name="benchmark.pdf", storage_path="uploads/benchmark.pdf",
+            file_size=1, content_type="application/pdf", data_room_id=data_room.id, folder_id=folder.id
+        )
+        db.add(file)
+        db.commit()
+        return data_room.id, folder.id, file.id
+    finally:
+        db.close()
+
+
+def drop_fixture(data_room_id):
+    db = SessionLocal()
+    try:
+        db.delete(db.get(DataRoom, data_room_id))
+        db.commit()
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=2000)
+    parser.add_argument('--rounds', type=int, default=3)
+    args = parser.parse_args()
+
+    data_room_id, folder_id, file_id = create_fixture()
+    try:
+        cases = [
+            ('get_file', orm_file, reads.get_file, file_id),
+            ('get_data_room', orm_data_room, reads.get_data_room, data_room_id),
+            ('folder_version', orm_folder_version, reads.get_folder_room_version, folder_id),
+        ]
+        for name, orm_fn, read_fn, entity_id in cases:
+            # Alternate the two and keep the best round, the database adds plenty of noise
+            orm_wall = orm_cpu = read_wall = read_cpu = float('inf')
+            for _ in range(args.rounds):
+                wall, cpu = per_call_us(SessionLocal, orm_fn, entity_id, args.iterations)
+                orm_wall, orm_cpu = min(orm_wall, wall), min(orm_cpu, cpu)
+                wall, cpu = per_call_us(ReadSessionLocal, read_fn, entity_id, args.iterations)
+                read_wall, read_cpu = min(read_wall, wall), min(read_cpu, cpu)
+            print(json.dumps({
+                'query': name,
+                'orm_cpu_us': round(orm_cpu, 1),
+                'reads_cpu_us': round(read_cpu, 1),
+                'orm_wall_us': round(orm_wall, 1),
+                'reads_wall_us': round(read_wall, 1),
+            }))
+    finally:
+        drop_fixture(data_room_id)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""
+Query budgets of the read endpoints and of folder copy / data room clone
+(which answer with the copied tree): each request is made through the app
+(TestClient, no lifespan) inside profiling.query_budget(), and the script
+exits non-zero if an endpoint ran more statements than its budget, printing
+the statements. Budgets do not grow with the size of the data room, so a lazy
+loading regression (N+1) fails here. Copies and clones leave the files out,
+since the fixture has no stored blobs to link.
+
+Needs the database from DATABASE_URL; a throwaway data room is created and
+removed again. Redis is optional (the ETag lookups fall back to the database).
+
+    cd backend && python -m benchmarks.query_budgets [--folders 20] [--files 5]
+"""
+import argparse
+import json
+import sys
+import uuid
+
+from fastapi.testclient import TestClient
+
+from main import app
+from src.database.db import SessionLocal
+from src.database.models import DataRoom, Folder, File
+from src.profiling import QueryBudgetExceeded, query_budget
+
+# Statements per request, independent of the number of folders and files;
+# one of them is the SET LOCAL statement_timeout of the request deadline
+BUDGETS = {
+    'GET /api/data-rooms/{data_room_id}': 5,
+    'GET /api/data-rooms/{data_room_id}?fields=id,name&include=folders': 4,
+    'GET /api/folders/{folder_id}': 4,
+    'GET /api/files/{file_id}': 3,
+    'GET /api/data-rooms/{data_room_id}/changes': 3,
+    'POST /api/folders/{folder_id}/copy': 13,
+    'POST /api/data-rooms/{data_room_id}/clone': 14,
+}
+
+
+def request_body(endpoint: str):
+    if endpoint.endswith('/copy'):
+        return {'include_files': False}
+    if endpoint.endswith('/clone'):
+        return {'name': f"benchmark-clone-{uuid.uuid4().hex[:8]}", 'include_files': False}
+    return None
+
+
+def create_fixture(folders: int, files: int):
+    db = SessionLocal()
+    try:
+        data_room = DataRoom(name=f"benchmark-{uuid.uuid4().hex[:8]}")
+        db.add(data_room)
+        db.flush()
+        root = Folder(name="root", depth=0, data_room_id=data_room.id)
+        db.add(root)
+        db.flush()
+        file_id = None
+        for i in range(folders):
+            folder = Folder(name=f"folder-{i}", depth=1, parent_folder_id=root.id, data_room_id=data_room.id)
+            db.add(folder)
+            db.flush()
+            for j in range(files):
+                file = File(
+                    name=f"file-{j}", original_name=f"file-{j}.pdf", storage_path=f"uploads/benchmark-{j}.pdf",
+                    file_size=1, content_type="application/pdf", data_room_id=data_room.id, folder_id=folder.id
+                )
+                db.add(file)
+                db.flush()
+                file_id = file.id
+        db.commit()
+        return data_room.id, root.id, file_id
+    finally:
+        db.close()
+
+
+def drop_fixture(data_room_ids):
+    db = SessionLocal()
+    try:
+        for data_room_id in data_room_ids:
+            db.delete(db.get(DataRoom, data_room_id))
+        db.commit()
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--folders', type=int, default=20)
+    parser.add_argument('--files', type=int, default=5)
+    args = parser.parse_args()
+
+    client = TestClient(app)
+    data_room_id, folder_id, file_id = create_fixture(args.folders, args.files)
+    data_room_ids = [data_room_id]
+    failed = False
+    try:
+        for endpoint, budget in BUDGETS.items():
+            method, path = endpoint.split(' ', 1)
+            url = path.format(data_room_id=data_room_id, folder_id=folder_id, file_id=file_id)
+            responses = [client.request(method, url, json=request_body(endpoint))]  # warm up
+            try:
+                with query_budget(budget) as used:
+                    response = client.request(method, url, json=request_body(endpoint))
+                    responses.append(response)
+                error = None
+            except QueryBudgetExceeded as e:
+                failed, error = True, str(e)
+            print(json.dumps({
+                'endpoint': endpoint, 'status': response.status_code, 'queries': used.queries, 'budget': budget
+            }))
+            if error:
+                print(error, file=sys.stderr)
+            if endpoint.endswith('/clone'):
+                data_room_ids += [r.json()['id'] for r in responses if r.status_code == 201]
+    finally:
+        drop_fixture(data_room_ids)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
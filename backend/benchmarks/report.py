@@ -0,0 +1,62 @@
+"""
+Statistics and baselines shared by the benchmarks: latency summaries and a
+comparison against a stored baseline that fails a run on regressions.
+"""
+import json
+import math
+from pathlib import Path
+from typing import Dict, List, Sequence
+
+
+def percentile(sorted_values: Sequence[float], p: float) -> float:
+    """
+    p-th percentile (0-100) of sorted values, linearly interpolated.
+    """
+    if not sorted_values:
+        return float('nan')
+    rank = (len(sorted_values) - 1) * p / 100
+    low, high = math.floor(rank), math.ceil(rank)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (rank - low)
+
+
+def summarize(samples: Sequence[float]) -> dict:
+    """
+    count, mean, p50/p95/p99, min and max of some samples (rounded to 3 places).
+    """
+    values = sorted(samples)
+    if not values:
+        return {'count': 0}
+    return {
+        'count': len(values),
+        'mean': round(sum(values) / len(values), 3),
+        'p50': round(percentile(values, 50), 3),
+        'p95': round(percentile(values, 95), 3),
+        'p99': round(percentile(values, 99), 3),
+        'min': round(values[0], 3),
+        'max': round(values[-1], 3),
+    }
+
+
+def save(path: str, results: Dict[str, dict]) -> None:
+    Path(path).write_text(json.dumps(results, indent=2, sort_keys=True) + "\n")
+
+
+def load(path: str) -> Dict[str, dict]:
+    return json.loads(Path(path).read_text())
+
+
+def regressions(results: Dict[str, dict], baseline: Dict[str, dict], metric: str, threshold_pct: float) -> List[str]:
+    """
+    Cases whose metric (lower is better) is more than threshold_pct percent
+    above the baseline. Cases missing on either side are ignored.
+    """
+    found = []
+    for name, stats in sorted(results.items()):
+        before = baseline.get(name, {}).get(metric)
+        after = stats.get(metric)
+        if not before or after is None:
+            continue
+        change = (after - before) / before * 100
+        if change > threshold_pct:
+            found.append(f"{name}: {metric} {before} -> {after} (+{change:.1f}%)")
+    return found
@@ -0,0 +1,109 @@
+"""
+Serialization benchmark: folder listings through the response_model path
+(ORM objects validated into FolderResponse, then encoded by FastAPI) versus
+the fast path (Core rows assembled into dicts, encoded by a TypeAdapter).
+
+No database is needed; rows and ORM objects are built in memory.
+
+    cd backend && python -m benchmarks.serialization [--sizes 10000 100000] [--repeat 3]
+"""
+import argparse
+import json
+import time
+import uuid
+from collections import namedtuple
+from datetime import datetime
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from src.database.models import Folder, File
+from src.repository.listings import _assemble
+from src.repository.reads import FILE_COLUMNS, FOLDER_COLUMNS
+from src.schemas import FolderResponse
+from src import serialization
+
+FOLDERS_PER_LISTING = 100
+
+FolderRow = namedtuple('FolderRow', [c.key for c in FOLDER_COLUMNS])
+FileRow = namedtuple('FileRow', [c.key for c in FILE_COLUMNS])
+
+
+def build_rows(items: int):
+    """
+    Rows of a folder with FOLDERS_PER_LISTING subfolders and the rest as files,
+    spread over the folder and its subfolders.
+    """
+    now = datetime.now()
+    room_id = uuid.uuid4()
+    root_id = uuid.uuid4()
+    folders = [FolderRow(root_id, 'root', 0, None, room_id, now, now, 0, 0, 0, 0, now)]
+    for i in range(FOLDERS_PER_LISTING):
+        folders.append(FolderRow(uuid.uuid4(), f'folder-{i}', 1, root_id, room_id, now, now, 0, 0, 0, 0, now))
+    files = []
+    for i in range(items - FOLDERS_PER_LISTING):
+        folder = folders[i % len(folders)]
+        files.append(FileRow(
+            uuid.uuid4(), f'file-{i}', f'file-{i}.pdf', f'uploads/{uuid.uuid4()}.pdf', 123456,
+            'application/pdf', room_id, folder.id, now, now, 'indexed', 3
+        ))
+    return folders, files
+
+
+def build_orm(folder_rows, file_rows) -> Folder:
+    folders = {row.id: Folder(**row._asdict()) for row in folder_rows}
+    for folder in folders.values():
+        parent = folders.get(folder.parent_folder_id)
+        if parent is not None:
+            parent.folders.append(folder)
+    for row in file_rows:
+        folders[row.folder_id].files.append(File(**row._asdict()))
+    return folders[folder_rows[0].id]
+
+
+def response_model_path(folder: Folder) -> bytes:
+    # What FastAPI does for response_model=FolderResponse: validate, dump to JSON-able data, json.dumps
+    adapter = TypeAdapter(FolderResponse)
+    validated = adapter.validate_python(folder, from_attributes=True)
+    content = jsonable_encoder(adapter.dump_python(validated, mode='json'))
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(',', ':')).encode('utf-8')
+
+
+def fast_path(folder_rows, file_rows) -> bytes:
+    folders, _, _ = _assemble(folder_rows, file_rows)
+    return serialization.folder_adapter.dump_json(folders[folder_rows[0].id])
+
+
+def best_of(repeat: int, fn, *args) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(*args)
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        folder_rows, file_rows = build_rows(size)
+        orm_root = build_orm(folder_rows, file_rows)
+        # Both paths must produce the same document
+        assert json.loads(response_model_path(orm_root)) == json.loads(fast_path(folder_rows, file_rows))
+
+        old = best_of(args.repeat, response_model_path, orm_root)
+        new = best_of(args.repeat, fast_path, folder_rows, file_rows)
+        print(json.dumps({
+            'items': size,
+            'response_model_ms': round(old * 1000, 1),
+            'fast_path_ms': round(new * 1000, 1),
+            'speedup': round(old / new, 1),
+        }))
+
+
+if __name__ == '__main__':
+    main()
@@ -6,6 +6,116 @@ class Settings(BaseSettings):
     REDIS_DOMAIN: str = 'redis'
     REDIS_PORT: int = 6379
     REDIS_PASSWORD: str = "000000"
+    # Blob storage directory; relative paths (stored in files.storage_path) resolve against the working directory
+    UPLOAD_DIR: str = 'uploads'
+    # Server-local directory imports are only allowed below this path (disabled when unset)
+    IMPORT_ROOT: str | None = None
+    IMPORT_WORKERS: int = 8
+    # Limits of ZIP imports: PDF members and bytes extracted (counted while unpacking)
+    IMPORT_MAX_MEMBERS: int = 50000
+    IMPORT_MAX_BYTES: int = 20 * 1024 * 1024 * 1024
+    # PDF text extraction pipeline (src/text_index.py)
+    TEXT_INDEX_WORKERS: int = 2
+    TEXT_INDEX_QUEUE_SIZE: int = 1000
+    TEXT_INDEX_MAX_ATTEMPTS: int = 3
+    TEXT_INDEX_TIMEOUT: float = 120
+    TEXT_SEARCH_CONFIG: str = 'simple'
+    # Live change events (src/events.py): buffered events per subscriber, subscribers per worker
+    EVENTS_QUEUE_SIZE: int = 100
+    EVENTS_MAX_SUBSCRIBERS: int = 10000
+    EVENTS_HEARTBEAT_SECONDS: float = 15
+    REDIS_SOCKET_TIMEOUT: float = 0.5
+    # Lifetime of cached data room versions; bounds staleness if a cache write is lost
+    VERSION_CACHE_TTL: int = 60
+    # Idempotency-Key (src/idempotency.py): lifetime of stored responses, of the
+    # claim of a running request, how long a duplicate waits, largest stored body
+    IDEMPOTENCY_TTL: int = 86400
+    IDEMPOTENCY_LOCK_TTL: int = 600
+    IDEMPOTENCY_WAIT_SECONDS: float = 30
+    IDEMPOTENCY_MAX_BODY: int = 1024 * 1024
+    # Request bodies up to this size (except multipart uploads) are hashed into
+    # the fingerprint a retry must match; larger ones are compared by length
+    IDEMPOTENCY_MAX_HASHED_BODY: int = 64 * 1024
+    # Per-request SQL profiling with Server-Timing headers (src/profiling.py);
+    # statement shapes repeated more often than the threshold are logged as N+1
+    SQL_PROFILING: bool = False
+    SQL_PROFILING_N1_THRESHOLD: int = 5
+    # Logging (src/logger.py): json or text lines, records buffered for the
+    # writer thread, share of INFO/DEBUG records kept
+    LOG_LEVEL: str = 'INFO'
+    LOG_FORMAT: str = 'json'
+    LOG_QUEUE_SIZE: int = 10000
+    LOG_INFO_SAMPLE_RATE: float = 1.0
+    # Request tracing (src/tracing.py): share of requests traced (0 disables
+    # tracing; when enabled, requests with a sampled traceparent header always
+    # are); spans go to TRACE_FILE as JSON lines, rotated to TRACE_FILE.1 at
+    # TRACE_FILE_MAX_BYTES, or to an OTLP/HTTP collector when
+    # TRACE_OTLP_ENDPOINT is set
+    TRACE_SAMPLE_RATE: float = 0.0
+    TRACE_FILE: str = 'traces.jsonl'
+    TRACE_FILE_MAX_BYTES: int = 100 * 1024 * 1024
+    TRACE_OTLP_ENDPOINT: str | None = None
+    TRACE_QUEUE_SIZE: int = 10000
+    TRACE_BATCH_SIZE: int = 512
+    TRACE_EXPORT_INTERVAL: float = 1.0
+    # Admission control (src/admission.py): requests in flight and queued per
+    # concurrency class and worker, how long a queued request waits before it
+    # is shed with 503, and the Retry-After sent with it
+    ADMISSION_ENABLED: bool = True
+    ADMISSION_UPLOAD_CONCURRENCY: int = 4
+    ADMISSION_UPLOAD_QUEUE: int = 16
+    ADMISSION_DOWNLOAD_CONCURRENCY: int = 12
+    ADMISSION_DOWNLOAD_QUEUE: int = 64
+    ADMISSION_METADATA_CONCURRENCY: int = 16
+    ADMISSION_METADATA_QUEUE: int = 256
+    ADMISSION_ADMIN_CONCURRENCY: int = 2
+    ADMISSION_ADMIN_QUEUE: int = 8
+    ADMISSION_QUEUE_TIMEOUT: float = 5
+    ADMISSION_RETRY_AFTER: int = 1
+    # Request deadlines in seconds per concurrency class (src/deadlines.py), 0 for
+    # none; clients can ask for a shorter one with X-Request-Timeout
+    REQUEST_DEADLINE_METADATA: float = 30
+    REQUEST_DEADLINE_UPLOAD: float = 300
+    REQUEST_DEADLINE_DOWNLOAD: float = 600
+    REQUEST_DEADLINE_ADMIN: float = 900
+    # How often each worker releases quota reservations older than
+    # REQUEST_DEADLINE_UPLOAD (src/maintenance.py), 0 = never
+    QUOTA_RESERVATION_SWEEP_INTERVAL: float = 60
+    # Rate limits (src/rate_limit.py): tokens per second and bucket size per
+    # client, route class and data room; tokens leased from Redis per round trip
+    # and how long a worker may hold them
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_METADATA_RATE: float = 50
+    RATE_LIMIT_METADATA_BURST: int = 100
+    RATE_LIMIT_UPLOAD_RATE: float = 5
+    RATE_LIMIT_UPLOAD_BURST: int = 20
+    RATE_LIMIT_DOWNLOAD_RATE: float = 20
+    RATE_LIMIT_DOWNLOAD_BURST: int = 50
+    RATE_LIMIT_ADMIN_RATE: float = 0.5
+    RATE_LIMIT_ADMIN_BURST: int = 5
+    RATE_LIMIT_LEASE_SIZE: int = 10
+    RATE_LIMIT_LEASE_SECONDS: float = 1
+    # Metrics (src/metrics.py): directory in which worker processes share their
+    # values so that /metrics sums all of them (serve.py uses a temporary one
+    # when it runs several workers), and how often each worker writes there
+    METRICS_DIR: str | None = None
+    METRICS_EXPORT_INTERVAL: float = 5.0
+    # Production server (serve.py): 0 workers = one per CPU; workers restart after
+    # SERVER_MAX_REQUESTS (+ up to the jitter) requests, 0 = never
+    SERVER_HOST: str = '0.0.0.0'
+    SERVER_PORT: int = 8000
+    SERVER_WORKERS: int = 0
+    SERVER_BACKLOG: int = 2048
+    SERVER_MAX_REQUESTS: int = 10000
+    SERVER_MAX_REQUESTS_JITTER: int = 1000
+    SERVER_KEEPALIVE_TIMEOUT: int = 5
+    SERVER_GRACEFUL_TIMEOUT: int = 30
+    SERVER_ACCESS_LOG: bool = False
+    # Warm-up before a worker takes requests (src/warmup.py): pooled connections
+    # to open, most recently changed data rooms to load
+    WARMUP_ENABLED: bool = False
+    WARMUP_CONNECTIONS: int = 5
+    WARMUP_ROOMS: int = 10
 
     model_config = SettingsConfigDict(env_file=".env")
 
@@ -1,42 +1,89 @@
 from fastapi import FastAPI
-from src.routes import folders, files, data_rooms
+from fastapi.concurrency import run_in_threadpool
+from src.routes import folders, files, data_rooms, batch, metrics as metrics_route
 from fastapi.middleware.cors import CORSMiddleware
-import uvicorn
 from config import settings
-from fastapi_limiter import FastAPILimiter
-import redis.asyncio as redis
 from contextlib import asynccontextmanager
+from src.text_index import get_indexer
+from src.events import get_broker
+from src.idempotency import IdempotencyMiddleware
+from src.admission import AdmissionMiddleware
+from src.deadlines import DeadlineMiddleware
+from src.metrics import MetricsMiddleware, start_export as start_metrics_export, stop_export as stop_metrics_export
+from src.profiling import ProfilingMiddleware
+from src.logger import RequestContextMiddleware
+from src.database.db import get_engine
+from src.repository.files import init_storage
+from src import tracing
+from src import maintenance
+
+# Importing this module has no side effects: the engine, storage directory,
+# Redis clients and background workers are set up when the app starts (the
+# lifespan below) or on first use. `app` is created on first access, so
+# `uvicorn main:app` and `from main import app` keep working, while serve.py
+# uses the create_app factory.
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
-    r = await redis.Redis(
-        host=settings.REDIS_DOMAIN,
-        port=settings.REDIS_PORT,
-        password=settings.REDIS_PASSWORD,
-        db=0,
-        encoding="utf-8",
-        decode_responses=True
-    )
-    await FastAPILimiter.init(r)
+    get_engine()
+    init_storage()
+    get_indexer().start()
+    start_metrics_export()
+    maintenance.start()
+    await get_broker().start()
+    if settings.WARMUP_ENABLED:
+        from src.warmup import warm_up
+        await run_in_threadpool(warm_up)
     yield
     # Shutdown (cleanup if needed)
-    await r.close()
+    await get_broker().stop()
+    await maintenance.stop()
+    get_indexer().stop(wait=False)
+    stop_metrics_export()
 
-app = FastAPI(lifespan=lifespan)
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=False,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+def create_app() -> FastAPI:
+    tracing.instrument_repository()
 
-app.include_router(data_rooms.router, prefix='/api')
-app.include_router(folders.router, prefix='/api')
-app.include_router(files.router, prefix='/api')
+    app = FastAPI(lifespan=lifespan)
 
-if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    app.add_middleware(IdempotencyMiddleware)
+    app.add_middleware(ProfilingMiddleware)
+    app.add_middleware(AdmissionMiddleware)
+    app.add_middleware(DeadlineMiddleware)
+    app.add_middleware(MetricsMiddleware)
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_credentials=False,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+    app.add_middleware(tracing.TracingMiddleware)
+    app.add_middleware(RequestContextMiddleware)
+
+    app.include_router(data_rooms.router, prefix='/api')
+    app.include_router(folders.router, prefix='/api')
+    app.include_router(files.router, prefix='/api')
+    app.include_router(batch.router, prefix='/api')
+    app.include_router(metrics_route.router)
+    return app
 
+
+_app = None
+
+
+def __getattr__(name):
+    global _app
+    if name == "app":
+        if _app is None:
+            _app = create_app()
+        return _app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(create_app(), host="0.0.0.0", port=8000)
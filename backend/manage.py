@@ -0,0 +1,193 @@
+import argparse
+import time
+from datetime import timedelta
+from pathlib import Path
+from uuid import UUID
+
+from sqlalchemy import select, update
+
+from config import settings
+from src.database.db import SessionLocal
+from src.database.models import DataRoom, File
+from src.text_index import TextIndexer
+from src.repository import imports as repository_imports
+from src.repository import stats as repository_stats
+from src.repository import quotas as repository_quotas
+from src.repository import changes as repository_changes
+
+
+def migrate_command(args):
+    """
+    Apply database migrations and optionally create the demo data. Run once per
+    deploy, before the servers start (serve.py does not migrate).
+    """
+    from alembic import command
+    from alembic.config import Config
+
+    command.upgrade(Config(str(Path(__file__).parent / "alembic.ini")), args.revision)
+    if args.seed:
+        from seed import seed
+        seed()
+
+
+def import_command(args):
+    """
+    Import a directory tree or a ZIP archive of PDF files into a data room.
+    Re-running the same command resumes an interrupted import.
+    """
+    source = Path(args.source)
+    db = SessionLocal()
+    try:
+        if source.is_dir():
+            summary = repository_imports.import_directory(
+                db, args.data_room_id, source,
+                parent_folder_id=args.parent_folder_id,
+                workers=args.workers,
+                move=args.move
+            )
+        else:
+            with source.open('rb') as archive:
+                summary = repository_imports.import_zip(
+                    db, args.data_room_id, archive,
+                    parent_folder_id=args.parent_folder_id,
+                    workers=args.workers
+                )
+    except (repository_imports.ArchiveTooLargeError, repository_quotas.QuotaExceededError) as e:
+        raise SystemExit(str(e))
+    finally:
+        db.close()
+
+    if summary is None:
+        raise SystemExit("Data room or parent folder not found")
+
+    print(summary.model_dump_json(indent=2))
+
+
+def rebuild_stats_command(args):
+    """
+    Recompute folder and data room size/count aggregates (quota usage) from
+    scratch and release quota reservations of uploads that died.
+    """
+    db = SessionLocal()
+    try:
+        repository_stats.rebuild_stats(db, args.data_room_id)
+        released = repository_quotas.expire_reservations(
+            db, timedelta(seconds=settings.REQUEST_DEADLINE_UPLOAD), args.data_room_id
+        )
+        if released:
+            print(f"Released {released} expired quota reservations")
+        # Bump the data room versions so cached responses with old aggregates are refetched
+        stmt = select(DataRoom.id, DataRoom.name)
+        if args.data_room_id:
+            stmt = stmt.where(DataRoom.id == args.data_room_id)  # type: ignore
+        for data_room_id, name in db.execute(stmt).all():
+            repository_changes.record(db, data_room_id, 'data_room', data_room_id, name=name)
+        db.commit()
+    finally:
+        db.close()
+
+    print("Stats rebuilt")
+
+
+def backfill_text_command(args):
+    """
+    Extract and index the text of files that are not indexed yet.
+    Safe to interrupt and re-run; progress is kept per file.
+    """
+    db = SessionLocal()
+    indexer = TextIndexer(SessionLocal, workers=args.workers)
+    try:
+        if args.retry_failed:
+            stmt = update(File).where(File.text_status == 'failed').values(text_status='pending')  # type: ignore
+            if args.data_room_id:
+                stmt = stmt.where(File.data_room_id == args.data_room_id)  # type: ignore
+            db.execute(stmt)
+            db.commit()
+
+        indexer.start()
+        started = time.monotonic()
+        last_id = None
+        while True:
+            # Keyset pagination over the partial index of pending files
+            stmt = select(File.id, File.storage_path).where(
+                File.text_status == 'pending'  # type: ignore
+            ).order_by(File.id).limit(500)
+            if last_id is not None:
+                stmt = stmt.where(File.id > last_id)  # type: ignore
+            if args.data_room_id:
+                stmt = stmt.where(File.data_room_id == args.data_room_id)  # type: ignore
+            rows = db.execute(stmt).all()
+            db.rollback()  # do not hold a snapshot while the workers update rows
+            if not rows:
+                break
+
+            for file_id, storage_path in rows:
+                # Blocks while the queue is full, so memory use stays bounded
+                indexer.submit(file_id, storage_path, block=True)
+            last_id = rows[-1].id
+            print(f"{time.monotonic() - started:.0f}s {indexer.progress()}")
+
+        indexer.stop(wait=True)
+    finally:
+        indexer.stop(wait=False)
+        db.close()
+
+    print(f"Done: {indexer.progress()}")
+
+
+def prune_changes_command(args):
+    """
+    Delete change feed entries older than the given number of days. Clients
+    that are further behind get 410 from the changes endpoint and reload.
+    """
+    db = SessionLocal()
+    try:
+        deleted = repository_changes.prune_changes(db, timedelta(days=args.days), args.data_room_id)
+        db.commit()
+    finally:
+        db.close()
+
+    print(f"Deleted {deleted} changes")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Data rooms management commands")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    migrate_parser = subparsers.add_parser('migrate', help=migrate_command.__doc__)
+    migrate_parser.add_argument('--revision', default='head')
+    migrate_parser.add_argument('--seed', action='store_true', help="Also create the demo data room")
+    migrate_parser.set_defaults(func=migrate_command)
+
+    import_parser = subparsers.add_parser('import', help=import_command.__doc__)
+    import_parser.add_argument('data_room_id', type=UUID)
+    import_parser.add_argument('source', help="Directory or .zip archive to import")
+    import_parser.add_argument('--parent-folder-id', type=UUID, default=None)
+    import_parser.add_argument('--workers', type=int, default=settings.IMPORT_WORKERS)
+    import_parser.add_argument(
+        '--move', action='store_true',
+        help="Remove the source files once they are imported (directory imports only)"
+    )
+    import_parser.set_defaults(func=import_command)
+
+    stats_parser = subparsers.add_parser('rebuild-stats', help=rebuild_stats_command.__doc__)
+    stats_parser.add_argument('--data-room-id', type=UUID, default=None, help="Only this data room")
+    stats_parser.set_defaults(func=rebuild_stats_command)
+
+    backfill_parser = subparsers.add_parser('backfill-text', help=backfill_text_command.__doc__)
+    backfill_parser.add_argument('--data-room-id', type=UUID, default=None, help="Only this data room")
+    backfill_parser.add_argument('--workers', type=int, default=settings.TEXT_INDEX_WORKERS)
+    backfill_parser.add_argument('--retry-failed', action='store_true', help="Also retry files that failed before")
+    backfill_parser.set_defaults(func=backfill_text_command)
+
+    prune_parser = subparsers.add_parser('prune-changes', help=prune_changes_command.__doc__)
+    prune_parser.add_argument('--days', type=float, default=30, help="Keep changes of the last N days (default 30)")
+    prune_parser.add_argument('--data-room-id', type=UUID, default=None, help="Only this data room")
+    prune_parser.set_defaults(func=prune_changes_command)
+
+    return parser
+
+
+if __name__ == "__main__":
+    args = build_parser().parse_args()
+    args.func(args)
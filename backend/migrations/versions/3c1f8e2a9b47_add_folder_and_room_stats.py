@@ -0,0 +1,87 @@
+"""Add folder and data room stats
+
+Revision ID: 3c1f8e2a9b47
+Revises: 00a5daaa1748
+Create Date: 2026-10-19 10:12:41.503118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3c1f8e2a9b47'
+down_revision: Union[str, Sequence[str], None] = '00a5daaa1748'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('data_room', sa.Column('file_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('data_room', sa.Column('total_size', sa.BigInteger(), server_default='0', nullable=False))
+    op.add_column('data_room', sa.Column('last_modified_at', sa.DateTime(), nullable=True))
+    op.add_column('folders', sa.Column('direct_file_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('folders', sa.Column('direct_size', sa.BigInteger(), server_default='0', nullable=False))
+    op.add_column('folders', sa.Column('file_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('folders', sa.Column('total_size', sa.BigInteger(), server_default='0', nullable=False))
+    op.add_column('folders', sa.Column('last_modified_at', sa.DateTime(), nullable=True))
+    # Backfill the aggregates of existing data (the same statements as
+    # stats.rebuild_stats, inlined so this revision does not depend on app code)
+    op.execute("""
+        WITH RECURSIVE closure AS (
+            SELECT id AS ancestor_id, id AS folder_id FROM folders
+            UNION ALL
+            SELECT c.ancestor_id, f.id FROM folders f JOIN closure c ON f.parent_folder_id = c.folder_id
+        ),
+        direct AS (
+            SELECT folder_id, count(*) AS files, sum(file_size) AS bytes, max(updated_at) AS modified
+            FROM files
+            WHERE folder_id IS NOT NULL
+            GROUP BY folder_id
+        ),
+        totals AS (
+            SELECT c.ancestor_id,
+                   sum(d.files) AS files,
+                   sum(d.bytes) AS bytes,
+                   max(greatest(d.modified, f.updated_at)) AS modified
+            FROM closure c
+            JOIN folders f ON f.id = c.folder_id
+            LEFT JOIN direct d ON d.folder_id = c.folder_id
+            GROUP BY c.ancestor_id
+        )
+        UPDATE folders
+        SET direct_file_count = COALESCE(d.files, 0),
+            direct_size = COALESCE(d.bytes, 0),
+            file_count = COALESCE(t.files, 0),
+            total_size = COALESCE(t.bytes, 0),
+            last_modified_at = t.modified
+        FROM totals t LEFT JOIN direct d ON d.folder_id = t.ancestor_id
+        WHERE folders.id = t.ancestor_id
+    """)
+    op.execute("""
+        UPDATE data_room
+        SET file_count = s.files,
+            total_size = s.bytes,
+            last_modified_at = s.modified
+        FROM (
+            SELECT r.id, count(f.id) AS files, COALESCE(sum(f.file_size), 0) AS bytes, max(f.updated_at) AS modified
+            FROM data_room r LEFT JOIN files f ON f.data_room_id = r.id
+            GROUP BY r.id
+        ) s
+        WHERE data_room.id = s.id
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('folders', 'last_modified_at')
+    op.drop_column('folders', 'total_size')
+    op.drop_column('folders', 'file_count')
+    op.drop_column('folders', 'direct_size')
+    op.drop_column('folders', 'direct_file_count')
+    op.drop_column('data_room', 'last_modified_at')
+    op.drop_column('data_room', 'total_size')
+    op.drop_column('data_room', 'file_count')
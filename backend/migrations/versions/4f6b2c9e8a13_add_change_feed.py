@@ -0,0 +1,41 @@
+"""Add change feed
+
+Revision ID: 4f6b2c9e8a13
+Revises: e7c4a1b8d935
+Create Date: 2026-10-19 13:20:44.371502
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4f6b2c9e8a13'
+down_revision: Union[str, Sequence[str], None] = 'e7c4a1b8d935'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('data_room', sa.Column('change_seq', sa.BigInteger(), server_default='0', nullable=False))
+    op.create_table('changes',
+    sa.Column('data_room_id', sa.UUID(), nullable=False),
+    sa.Column('seq', sa.BigInteger(), nullable=False),
+    sa.Column('entity_type', sa.String(length=10), nullable=False),
+    sa.Column('entity_id', sa.UUID(), nullable=False),
+    sa.Column('op', sa.String(length=10), nullable=False),
+    sa.Column('parent_id', sa.UUID(), nullable=True),
+    sa.Column('name', sa.String(length=255), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['data_room_id'], ['data_room.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('data_room_id', 'seq')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('changes')
+    op.drop_column('data_room', 'change_seq')
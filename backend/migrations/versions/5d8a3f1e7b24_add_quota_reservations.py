@@ -0,0 +1,45 @@
+"""Add quota reservations
+
+Revision ID: 5d8a3f1e7b24
+Revises: 9e3b7d5a2c61
+Create Date: 2026-10-19 16:12:37.518240
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5d8a3f1e7b24'
+down_revision: Union[str, Sequence[str], None] = '9e3b7d5a2c61'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('quota_reservations',
+    sa.Column('id', sa.UUID(), nullable=False),
+    sa.Column('data_room_id', sa.UUID(), nullable=False),
+    sa.Column('files', sa.Integer(), nullable=False),
+    sa.Column('bytes', sa.BigInteger(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+    sa.ForeignKeyConstraint(['data_room_id'], ['data_room.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_quota_reservations_created_at', 'quota_reservations', ['created_at'], unique=False)
+    # Reservations held so far have no row; give them one so they expire like new ones
+    op.execute("""
+        INSERT INTO quota_reservations (id, data_room_id, files, bytes, created_at)
+        SELECT gen_random_uuid(), id, reserved_files, reserved_bytes, now()
+        FROM data_room
+        WHERE reserved_files > 0 OR reserved_bytes > 0
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_quota_reservations_created_at', table_name='quota_reservations')
+    op.drop_table('quota_reservations')
@@ -0,0 +1,34 @@
+"""Add data room quotas
+
+Revision ID: 8d2e4b7c1a06
+Revises: 3c1f8e2a9b47
+Create Date: 2026-10-19 11:02:17.884120
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8d2e4b7c1a06'
+down_revision: Union[str, Sequence[str], None] = '3c1f8e2a9b47'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('data_room', sa.Column('quota_bytes', sa.BigInteger(), nullable=True))
+    op.add_column('data_room', sa.Column('quota_files', sa.Integer(), nullable=True))
+    op.add_column('data_room', sa.Column('reserved_bytes', sa.BigInteger(), server_default='0', nullable=False))
+    op.add_column('data_room', sa.Column('reserved_files', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('data_room', 'reserved_files')
+    op.drop_column('data_room', 'reserved_bytes')
+    op.drop_column('data_room', 'quota_files')
+    op.drop_column('data_room', 'quota_bytes')
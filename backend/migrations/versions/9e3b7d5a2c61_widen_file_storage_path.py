@@ -0,0 +1,39 @@
+"""Widen file storage path
+
+Revision ID: 9e3b7d5a2c61
+Revises: 4f6b2c9e8a13
+Create Date: 2026-10-19 15:48:12.904215
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9e3b7d5a2c61'
+down_revision: Union[str, Sequence[str], None] = '4f6b2c9e8a13'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # storage_path holds UPLOAD_DIR plus the blob name, so 50 characters only fit the default directory
+    op.drop_constraint('storage_path_length_check', 'files', type_='check')
+    op.alter_column('files', 'storage_path',
+               existing_type=sa.String(length=50),
+               type_=sa.String(length=1024),
+               existing_nullable=False)
+    op.create_check_constraint('storage_path_length_check', 'files', 'length(storage_path) <= 1024')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint('storage_path_length_check', 'files', type_='check')
+    op.alter_column('files', 'storage_path',
+               existing_type=sa.String(length=1024),
+               type_=sa.String(length=50),
+               existing_nullable=False)
+    op.create_check_constraint('storage_path_length_check', 'files', 'length(storage_path) <= 100')
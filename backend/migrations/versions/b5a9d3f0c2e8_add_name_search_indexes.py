@@ -0,0 +1,41 @@
+"""Add name search indexes
+
+Revision ID: b5a9d3f0c2e8
+Revises: 8d2e4b7c1a06
+Create Date: 2026-10-19 11:48:05.127934
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b5a9d3f0c2e8'
+down_revision: Union[str, Sequence[str], None] = '8d2e4b7c1a06'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    # Trigram GIN indexes serve ILIKE '%q%' and prefix matches of the search endpoint
+    op.create_index('ix_files_name_trgm', 'files', ['name'], postgresql_using='gin',
+                    postgresql_ops={'name': 'gin_trgm_ops'})
+    op.create_index('ix_files_original_name_trgm', 'files', ['original_name'], postgresql_using='gin',
+                    postgresql_ops={'original_name': 'gin_trgm_ops'})
+    op.create_index('ix_folders_name_trgm', 'folders', ['name'], postgresql_using='gin',
+                    postgresql_ops={'name': 'gin_trgm_ops'})
+    op.create_index('ix_files_data_room_id', 'files', ['data_room_id'])
+    op.create_index('ix_folders_data_room_id', 'folders', ['data_room_id'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_folders_data_room_id', table_name='folders')
+    op.drop_index('ix_files_data_room_id', table_name='files')
+    op.drop_index('ix_folders_name_trgm', table_name='folders')
+    op.drop_index('ix_files_original_name_trgm', table_name='files')
+    op.drop_index('ix_files_name_trgm', table_name='files')
@@ -0,0 +1,37 @@
+"""Add file content search
+
+Revision ID: e7c4a1b8d935
+Revises: b5a9d3f0c2e8
+Create Date: 2026-10-19 12:31:52.640217
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7c4a1b8d935'
+down_revision: Union[str, Sequence[str], None] = 'b5a9d3f0c2e8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('files', sa.Column('text_status', sa.String(length=20), server_default='pending', nullable=False))
+    op.add_column('files', sa.Column('page_count', sa.Integer(), nullable=True))
+    op.add_column('files', sa.Column('content_tsv', postgresql.TSVECTOR(), nullable=True))
+    op.create_index('ix_files_content_tsv', 'files', ['content_tsv'], postgresql_using='gin')
+    # Lets the backfill command find unindexed files without scanning the table
+    op.create_index('ix_files_text_pending', 'files', ['id'], postgresql_where=sa.text("text_status = 'pending'"))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_files_text_pending', table_name='files')
+    op.drop_index('ix_files_content_tsv', table_name='files')
+    op.drop_column('files', 'content_tsv')
+    op.drop_column('files', 'page_count')
+    op.drop_column('files', 'text_status')
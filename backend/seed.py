@@ -1,8 +1,12 @@
-from src.database.db import session
+from src.database.db import SessionLocal
 from src.database.models import DataRoom, Folder, File
 
 
-if __name__ == "__main__":
+def seed() -> None:
+    """
+    Create the demo data room unless it exists.
+    """
+    session = SessionLocal()
     data_room_name = 'data room'
     try:
         # Check if data already exists
@@ -11,7 +15,7 @@ if __name__ == "__main__":
         if existing_room:
             print("Seed data already exists. Skipping seeding.")
             session.close()
-            exit(0)
+            return
     except Exception as e:
         print(f"Error checking existing data (this is normal for first run): {e}")
         # Continue with seeding on a fresh database
@@ -67,5 +71,10 @@ if __name__ == "__main__":
     # Add all to session
     session.add_all([parent_folder, child_folder, parent_file, child_file])
     session.commit()
+    session.close()
 
     print("Seed data created successfully!")
+
+
+if __name__ == "__main__":
+    seed()
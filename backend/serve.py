@@ -0,0 +1,100 @@
+"""
+Production server: SERVER_WORKERS uvicorn worker processes (default: one per
+available CPU) sharing one listening socket that the supervisor binds before
+forking, with uvloop and httptools when they are installed.
+
+- Workers are restarted after SERVER_MAX_REQUESTS requests (plus a random
+  jitter, so they do not all restart at once) to cap memory growth.
+- On SIGTERM/SIGINT the supervisor passes the signal on; each worker stops
+  accepting, closes live event streams, and lets in-flight requests (uploads,
+  downloads) finish for up to SERVER_GRACEFUL_TIMEOUT seconds.
+- Workers share their metrics through files in METRICS_DIR (a temporary
+  directory unless configured), so /metrics answers for all of them.
+
+Migrations and seeding are not run here; see `manage.py migrate`.
+
+    cd backend && python serve.py [--workers 4] [--port 8000]
+"""
+import argparse
+import importlib.util
+import os
+import random
+import shutil
+import tempfile
+
+import uvicorn
+from uvicorn.supervisors import Multiprocess
+
+from config import settings
+from src import metrics
+
+
+def default_workers() -> int:
+    try:
+        # CPUs this process may run on, e.g. a container's cpuset
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def _installed(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+
+class Server(uvicorn.Server):
+    def run(self, sockets=None):
+        if self.config.limit_max_requests and settings.SERVER_MAX_REQUESTS_JITTER:
+            self.config.limit_max_requests += random.randint(0, settings.SERVER_MAX_REQUESTS_JITTER)
+        return super().run(sockets=sockets)
+
+    async def shutdown(self, sockets=None):
+        # Event streams never finish on their own and would hold up the drain
+        from src.events import get_broker
+        await get_broker().stop()
+        await super().shutdown(sockets=sockets)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default=settings.SERVER_HOST)
+    parser.add_argument('--port', type=int, default=settings.SERVER_PORT)
+    parser.add_argument('--workers', type=int, default=settings.SERVER_WORKERS or default_workers())
+    args = parser.parse_args()
+
+    metrics_dir = None
+    if settings.METRICS_DIR:
+        os.makedirs(settings.METRICS_DIR, exist_ok=True)
+        metrics.clear_snapshots(settings.METRICS_DIR)
+    elif args.workers > 1:
+        # Workers are spawned and read the directory from the environment
+        metrics_dir = os.environ["METRICS_DIR"] = tempfile.mkdtemp(prefix="data-rooms-metrics-")
+
+    config = uvicorn.Config(
+        "main:create_app",
+        factory=True,
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        loop="uvloop" if _installed("uvloop") else "asyncio",
+        http="httptools" if _installed("httptools") else "h11",
+        backlog=settings.SERVER_BACKLOG,
+        limit_max_requests=settings.SERVER_MAX_REQUESTS or None,
+        timeout_keep_alive=settings.SERVER_KEEPALIVE_TIMEOUT,
+        timeout_graceful_shutdown=settings.SERVER_GRACEFUL_TIMEOUT,
+        proxy_headers=True,
+        access_log=settings.SERVER_ACCESS_LOG,
+    )
+    server = Server(config)
+    sock = config.bind_socket()
+    try:
+        if config.workers > 1:
+            Multiprocess(config, target=server.run, sockets=[sock]).run()
+        else:
+            server.run(sockets=[sock])
+    finally:
+        if metrics_dir is not None:
+            shutil.rmtree(metrics_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
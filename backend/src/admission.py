@@ -0,0 +1,186 @@
+import asyncio
+import json
+import re
+import time
+from collections import deque
+from typing import Dict, Optional
+from config import settings
+from src import deadlines, metrics
+from src.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Admission control: every API request belongs to a concurrency class with its
+# own bound on requests in flight and on requests queued behind them, so that
+# a burst of large uploads cannot take all threadpool threads and database
+# connections away from tree browsing.
+#
+#   upload    POST /api/files/upload
+#   download  GET  /api/files/{id}/download
+#   admin     imports, clones, copies, batches, quotas and data room deletion
+#   metadata  everything else under /api
+#
+# A request over its class's limit waits in a FIFO queue for up to
+# ADMISSION_QUEUE_TIMEOUT seconds; when the queue is full, or the wait is over,
+# it is shed with 503 and Retry-After before its body is read. The wait is also
+# bounded by the request deadline (src/deadlines.py). The slot is held until
+# the response has been sent, including streamed download bodies.
+#
+# Limits are per worker process. Sync handlers run in one threadpool (40
+# threads by default), so the sum of the limits should stay below that; the
+# database pool (5 + 10 overflow) is the tighter bound for the classes that hold
+# a session for most of the request. Live event streams (SSE) and /metrics are
+# not limited.
+
+CLASSES = ("upload", "download", "metadata", "admin")
+
+_RULES = (
+    ("upload", "POST", re.compile(r"^/api/files/upload/?$")),
+    ("download", "GET", re.compile(r"^/api/files/[^/]+/download/?$")),
+    ("admin", "POST", re.compile(r"^/api/data-rooms/[^/]+/(import|clone)/?$")),
+    ("admin", "POST", re.compile(r"^/api/folders/[^/]+/copy/?$")),
+    ("admin", "POST", re.compile(r"^/api/batch/?$")),
+    ("admin", "PUT", re.compile(r"^/api/data-rooms/[^/]+/quota/?$")),
+    ("admin", "DELETE", re.compile(r"^/api/data-rooms/[^/]+/?$")),
+)
+
+_EXCLUDED = re.compile(r"^/api/data-rooms/[^/]+/events/?$")
+
+
+def classify(method: str, path: str) -> Optional[str]:
+    """
+    Concurrency class of a request, None if it is not limited.
+    """
+    if not path.startswith("/api/") or _EXCLUDED.match(path):
+        return None
+    for name, rule_method, pattern in _RULES:
+        if method == rule_method and pattern.match(path):
+            return name
+    return "metadata"
+
+
+class Limiter:
+    """
+    At most `limit` holders, at most `queue_size` waiters (served in order).
+    Lives on the event loop; not thread-safe.
+    """
+
+    def __init__(self, limit: int, queue_size: int):
+        self.limit = limit
+        self.queue_size = queue_size
+        self.active = 0
+        self._waiters: deque = deque()
+
+    async def acquire(self, timeout: float) -> Optional[str]:
+        """
+        None once a slot is held, otherwise why the request was not admitted
+        ("queue_full" or "timeout").
+        """
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            return None
+        if len(self._waiters) >= self.queue_size:
+            return "queue_full"
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait({waiter}, timeout=timeout)
+        except asyncio.CancelledError:
+            self._abandon(waiter)
+            raise
+        if waiter.done():
+            # release() handed its slot over
+            return None
+        self._abandon(waiter)
+        return "timeout"
+
+    def _abandon(self, waiter: asyncio.Future) -> None:
+        if waiter.done() and not waiter.cancelled():
+            # Granted in the meantime: pass the slot on
+            self.release()
+            return
+        waiter.cancel()
+        try:
+            self._waiters.remove(waiter)
+        except ValueError:
+            pass
+
+    def release(self) -> None:
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+
+def _limits() -> Dict[str, Limiter]:
+    return {
+        "upload": Limiter(settings.ADMISSION_UPLOAD_CONCURRENCY, settings.ADMISSION_UPLOAD_QUEUE),
+        "download": Limiter(settings.ADMISSION_DOWNLOAD_CONCURRENCY, settings.ADMISSION_DOWNLOAD_QUEUE),
+        "metadata": Limiter(settings.ADMISSION_METADATA_CONCURRENCY, settings.ADMISSION_METADATA_QUEUE),
+        "admin": Limiter(settings.ADMISSION_ADMIN_CONCURRENCY, settings.ADMISSION_ADMIN_QUEUE),
+    }
+
+
+async def _send_busy(send) -> None:
+    body = json.dumps({"detail": "The server is busy, please retry later"}).encode()
+    await send({
+        "type": "http.response.start",
+        "status": 503,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(settings.ADMISSION_RETRY_AFTER).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+class AdmissionMiddleware:
+    """
+    Pure ASGI middleware applying the per-class limits (see above).
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.limiters = _limits()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.ADMISSION_ENABLED:
+            await self.app(scope, receive, send)
+            return
+        name = classify(scope["method"], scope["path"])
+        if name is None:
+            await self.app(scope, receive, send)
+            return
+
+        limiter = self.limiters[name]
+        timeout = settings.ADMISSION_QUEUE_TIMEOUT
+        left = deadlines.remaining()
+        if left is not None:
+            timeout = max(min(timeout, left), 0)
+        start = time.perf_counter()
+        metrics.admission_queued.inc(name)
+        try:
+            rejected = await limiter.acquire(timeout)
+        finally:
+            metrics.admission_queued.dec(name)
+        metrics.admission_queue_wait.observe(time.perf_counter() - start, name)
+        if rejected is not None:
+            metrics.admission_rejected.inc(name, rejected)
+            logger.debug("Shed %s request %s %s: %s", name, scope["method"], scope["path"], rejected)
+            await _send_busy(send)
+            return
+
+        metrics.admission_in_flight.inc(name)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            metrics.admission_in_flight.dec(name)
+            limiter.release()
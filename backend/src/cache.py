@@ -0,0 +1,139 @@
+import time
+from contextlib import contextmanager
+from typing import Optional
+from uuid import UUID
+import redis
+import redis.asyncio
+from config import settings
+from src import metrics, tracing
+from src.logger import get_logger
+
+logger = get_logger(__name__)
+
+# After an error Redis is skipped for this long, so an outage costs one timeout
+# per worker instead of one per request
+ERROR_BACKOFF_SECONDS = 5
+
+_VERSION_KEY = "data_room_version:{}"
+
+# Versions only ever grow, so a slow writer must not overwrite a newer value
+_SET_MAX_SCRIPT = """
+local current = redis.call('GET', KEYS[1])
+if not current or tonumber(current) < tonumber(ARGV[1]) then
+    redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+end
+"""
+
+_client = None
+_async_client = None
+_set_max = None
+_skip_until = 0.0
+
+
+def get_redis() -> Optional[redis.Redis]:
+    """
+    Synchronous Redis client for use in (threadpool) request handlers and the
+    repository layer. Returns None while Redis is considered unavailable.
+    """
+    global _client, _set_max
+    if time.monotonic() < _skip_until:
+        return None
+    if _client is None:
+        _client = redis.Redis(
+            host=settings.REDIS_DOMAIN,
+            port=settings.REDIS_PORT,
+            password=settings.REDIS_PASSWORD,
+            db=0,
+            decode_responses=True,
+            socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+            socket_connect_timeout=settings.REDIS_SOCKET_TIMEOUT,
+        )
+        _set_max = _client.register_script(_SET_MAX_SCRIPT)
+    return _client
+
+
+def use_clients(client: redis.Redis, async_client: redis.asyncio.Redis) -> None:
+    """
+    Replace the clients, e.g. with fakeredis ones in benchmarks.
+    """
+    global _client, _async_client, _set_max, _skip_until
+    _client, _async_client = client, async_client
+    _set_max = client.register_script(_SET_MAX_SCRIPT)
+    _skip_until = 0.0
+
+
+def get_async_redis() -> Optional[redis.asyncio.Redis]:
+    """
+    Asyncio Redis client for ASGI middleware, sharing the error backoff of
+    get_redis(). Returns None while Redis is considered unavailable.
+    """
+    global _async_client
+    if time.monotonic() < _skip_until:
+        return None
+    if _async_client is None:
+        _async_client = redis.asyncio.Redis(
+            host=settings.REDIS_DOMAIN,
+            port=settings.REDIS_PORT,
+            password=settings.REDIS_PASSWORD,
+            db=0,
+            decode_responses=True,
+            socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+            socket_connect_timeout=settings.REDIS_SOCKET_TIMEOUT,
+        )
+    return _async_client
+
+
+@contextmanager
+def redis_call(operation: str):
+    """
+    Time a Redis call for the metrics and the trace of the request.
+    """
+    with metrics.redis_duration.time(operation), tracing.span(f"redis.{operation}"):
+        yield
+
+
+def failed(e: Exception) -> None:
+    """
+    Record a Redis error: Redis is skipped for ERROR_BACKOFF_SECONDS.
+    """
+    global _skip_until
+    _skip_until = time.monotonic() + ERROR_BACKOFF_SECONDS
+    logger.warning("Redis unavailable, falling back to the database: %s", e)
+
+
+def get_room_version(data_room_id: UUID) -> Optional[int]:
+    """
+    Cached version (change_seq) of a data room, None on a miss or if Redis is down.
+    """
+    client = get_redis()
+    if client is None:
+        return None
+    try:
+        with redis_call("get_room_version"):
+            value = client.get(_VERSION_KEY.format(data_room_id))
+    except redis.RedisError as e:
+        failed(e)
+        return None
+    return int(value) if value is not None else None
+
+
+def set_room_version(data_room_id: UUID, version: int) -> None:
+    client = get_redis()
+    if client is None:
+        return
+    try:
+        with redis_call("set_room_version"):
+            _set_max(keys=[_VERSION_KEY.format(data_room_id)], args=[version, settings.VERSION_CACHE_TTL])
+    except redis.RedisError as e:
+        failed(e)
+
+
+def forget_room_version(data_room_id: UUID) -> None:
+    client = get_redis()
+    if client is None:
+        return
+    try:
+        with redis_call("forget_room_version"):
+            client.delete(_VERSION_KEY.format(data_room_id))
+    except redis.RedisError as e:
+        failed(e)
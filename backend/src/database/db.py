@@ -1,14 +1,51 @@
+import threading
 from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import sessionmaker
-import os
 from config import settings
+from src.metrics import InstrumentedQueuePool, instrument_engine
+from src.profiling import profile_engine
+from src import deadlines, tracing
 
-engine = create_engine(settings.DATABASE_URL)
-#
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-#
-# # Create a session instance for scripts like seed.py
-session = SessionLocal()
+# The engine is created on first use (the first session, or get_engine() in
+# the app lifespan), so importing the app, CLI tools or benchmarks does not
+# build it; connections are opened by the pool on demand as before.
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+class _LazySessionmaker(sessionmaker):
+    """
+    sessionmaker that binds itself to the engine on its first session.
+    """
+
+    def __call__(self, **local_kw):
+        if self.kw.get("bind") is None:
+            get_engine()
+        return super().__call__(**local_kw)
+
+
+SessionLocal = _LazySessionmaker(autocommit=False, autoflush=False)
+# Sessions of GET endpoints that only read (see src/repository/reads.py):
+# nothing to flush and no loaded state to expire
+ReadSessionLocal = _LazySessionmaker(autocommit=False, autoflush=False, expire_on_commit=False)
+deadlines.instrument_sessions(SessionLocal, ReadSessionLocal)
+
+
+def get_engine() -> Engine:
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            engine = create_engine(settings.DATABASE_URL, poolclass=InstrumentedQueuePool)
+            instrument_engine(engine)
+            profile_engine(engine)
+            tracing.instrument_engine(engine)
+            deadlines.instrument_engine(engine)
+            SessionLocal.configure(bind=engine)
+            ReadSessionLocal.configure(bind=engine)
+            _engine = engine
+    return _engine
 
 
 # Dependency
@@ -18,3 +55,11 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+def get_read_db():
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
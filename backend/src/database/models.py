@@ -8,10 +8,12 @@ from sqlalchemy import (
     func,
     CheckConstraint,
     UniqueConstraint,
+    Index,
+    text,
 )
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.dialects.postgresql import UUID, TSVECTOR
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship, Mapped, mapped_column
+from sqlalchemy.orm import relationship, deferred, Mapped, mapped_column
 from typing import Optional, List
 import uuid
 
@@ -26,6 +28,21 @@ class DataRoom(Base):
     created_at = Column(DateTime, default=func.now())
     updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
 
+    # Aggregates maintained by src/repository/stats.py
+    file_count = Column(Integer, nullable=False, default=0, server_default="0")
+    total_size = Column(BigInteger, nullable=False, default=0, server_default="0")
+    last_modified_at = Column(DateTime, nullable=True)
+
+    # Storage quota (NULL = unlimited) and space reserved by uploads in flight
+    # (the sum of its quota_reservations rows), see quotas.py
+    quota_bytes = Column(BigInteger, nullable=True)
+    quota_files = Column(Integer, nullable=True)
+    reserved_bytes = Column(BigInteger, nullable=False, default=0, server_default="0")
+    reserved_files = Column(Integer, nullable=False, default=0, server_default="0")
+
+    # Last sequence number of the change feed, see src/repository/changes.py
+    change_seq = Column(BigInteger, nullable=False, default=0, server_default="0")
+
     __table_args__ = (
         UniqueConstraint("name"),
     )
@@ -33,6 +50,8 @@ class DataRoom(Base):
     # Relationships
     folders = relationship("Folder", back_populates="data_room", cascade="all, delete-orphan")
     files = relationship("File", back_populates="data_room", cascade="all, delete-orphan")
+    changes = relationship("Change", cascade="all, delete-orphan", passive_deletes=True)
+    quota_reservations = relationship("QuotaReservation", cascade="all, delete-orphan", passive_deletes=True)
 
 
 class Folder(Base):
@@ -46,10 +65,20 @@ class Folder(Base):
     created_at = Column(DateTime, default=func.now())
     updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
 
+    # Aggregates maintained by src/repository/stats.py
+    # direct_* cover files in this folder, file_count/total_size the whole subtree
+    direct_file_count = Column(Integer, nullable=False, default=0, server_default="0")
+    direct_size = Column(BigInteger, nullable=False, default=0, server_default="0")
+    file_count = Column(Integer, nullable=False, default=0, server_default="0")
+    total_size = Column(BigInteger, nullable=False, default=0, server_default="0")
+    last_modified_at = Column(DateTime, nullable=True)
+
     __table_args__ = (
         UniqueConstraint("parent_folder_id", "name"),
         CheckConstraint("parent_folder_id IS NULL OR parent_folder_id != id"),
         CheckConstraint("length(name) <= 50", name="folder_name_length_check"),
+        Index("ix_folders_data_room_id", "data_room_id"),
+        Index("ix_folders_name_trgm", "name", postgresql_using="gin", postgresql_ops={"name": "gin_trgm_ops"}),
     )
 
     # Relationships
@@ -67,19 +96,64 @@ class File(Base):
     folder_id = Column(UUID(as_uuid=True), ForeignKey("folders.id", ondelete="CASCADE"), nullable=True)
     name = Column(String(50), nullable=False)
     original_name = Column(String(50), nullable=False)
-    storage_path = Column(String(50), nullable=False)
+    storage_path = Column(String(1024), nullable=False)  # UPLOAD_DIR/<uuid>.pdf
     file_size = Column(BigInteger, nullable=False)
     content_type = Column(String(100), default="application/pdf")
     created_at = Column(DateTime, default=func.now())
     updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
 
+    # Filled in asynchronously by src/text_index.py ('pending', 'indexed' or 'failed')
+    text_status = Column(String(20), nullable=False, default="pending", server_default="pending")
+    page_count = Column(Integer, nullable=True)
+    content_tsv = deferred(Column(TSVECTOR, nullable=True))
+
     __table_args__ = (
         UniqueConstraint("folder_id", "name"),
         CheckConstraint("length(name) <= 50", name="file_name_length_check"),
         CheckConstraint("length(original_name) <= 100", name="original_name_length_check"),
-        CheckConstraint("length(storage_path) <= 100", name="storage_path_length_check"),
+        CheckConstraint("length(storage_path) <= 1024", name="storage_path_length_check"),
+        Index("ix_files_data_room_id", "data_room_id"),
+        Index("ix_files_name_trgm", "name", postgresql_using="gin", postgresql_ops={"name": "gin_trgm_ops"}),
+        Index(
+            "ix_files_original_name_trgm", "original_name",
+            postgresql_using="gin", postgresql_ops={"original_name": "gin_trgm_ops"}
+        ),
+        Index("ix_files_content_tsv", "content_tsv", postgresql_using="gin"),
+        Index("ix_files_text_pending", "id", postgresql_where=text("text_status = 'pending'")),
     )
 
     # Relationships
     data_room = relationship("DataRoom", back_populates="files")
     folder = relationship("Folder", back_populates="files")
+
+
+class Change(Base):
+    __tablename__ = "changes"
+
+    data_room_id = Column(UUID(as_uuid=True), ForeignKey("data_room.id", ondelete="CASCADE"), primary_key=True)
+    seq = Column(BigInteger, primary_key=True)
+    entity_type = Column(String(10), nullable=False)  # 'data_room', 'folder' or 'file'
+    entity_id = Column(UUID(as_uuid=True), nullable=False)
+    op = Column(String(10), nullable=False)  # 'upsert' or 'delete'
+    parent_id = Column(UUID(as_uuid=True), nullable=True)  # parent folder of a folder / folder of a file
+    name = Column(String(255), nullable=True)
+    created_at = Column(DateTime, default=func.now())
+
+
+class QuotaReservation(Base):
+    """
+    Space held by one upload (or import batch) in flight; counted in
+    data_room.reserved_files/reserved_bytes until it is settled, released or
+    expired (see src/repository/quotas.py).
+    """
+    __tablename__ = "quota_reservations"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    data_room_id = Column(UUID(as_uuid=True), ForeignKey("data_room.id", ondelete="CASCADE"), nullable=False)
+    files = Column(Integer, nullable=False)
+    bytes = Column(BigInteger, nullable=False)
+    created_at = Column(DateTime, nullable=False, default=func.now(), server_default=func.now())
+
+    __table_args__ = (
+        Index("ix_quota_reservations_created_at", "created_at"),
+    )
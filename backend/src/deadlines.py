@@ -0,0 +1,188 @@
+import time
+from contextvars import ContextVar
+from typing import Optional
+import anyio
+from fastapi import HTTPException, status
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.responses import FileResponse
+from config import settings
+from src import admission
+from src.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Request deadlines. Every API request gets one from its concurrency class
+# (REQUEST_DEADLINE_*, see src/admission.py), which a client can shorten with
+# an X-Request-Timeout header in seconds. The deadline is kept in a contextvar
+# (copied into the threadpool of sync handlers) and enforced where the time
+# goes:
+#
+# - every transaction of a request session starts with SET LOCAL
+#   statement_timeout set to the time left, and a statement cancelled by it
+#   becomes a 504
+# - the request body is not read past the deadline
+# - uploads are copied to storage in chunks and stop at the deadline
+# - downloads stop streaming at the deadline or when the client goes away
+# - the admission queue wait is bounded by it
+#
+# Work outside requests (text indexing, imports in their own threads) has no
+# deadline.
+
+HEADER = b"x-request-timeout"
+
+# Postgres query_canceled, also raised by statement_timeout
+_QUERY_CANCELED = "57014"
+
+_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+
+
+class DeadlineExceeded(HTTPException):
+    def __init__(self):
+        super().__init__(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail="The request did not complete within its deadline"
+        )
+
+
+def remaining() -> Optional[float]:
+    """
+    Seconds left until the deadline of the current request, None without one.
+    """
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def check() -> None:
+    """
+    Raise DeadlineExceeded if the current request is past its deadline.
+    """
+    deadline = _deadline.get()
+    if deadline is not None and time.monotonic() >= deadline:
+        raise DeadlineExceeded()
+
+
+def _route_deadline(method: str, path: str) -> Optional[float]:
+    name = admission.classify(method, path)
+    if name is None:
+        return None
+    return {
+        "upload": settings.REQUEST_DEADLINE_UPLOAD,
+        "download": settings.REQUEST_DEADLINE_DOWNLOAD,
+        "metadata": settings.REQUEST_DEADLINE_METADATA,
+        "admin": settings.REQUEST_DEADLINE_ADMIN,
+    }[name] or None
+
+
+def _requested(headers) -> Optional[float]:
+    value = dict(headers).get(HEADER)
+    if value is None:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        return None
+    return seconds if seconds > 0 else None
+
+
+# ------------------- Database -------------------
+
+def instrument_sessions(*session_factories) -> None:
+    """
+    Limit the statements of request transactions to the time left.
+    """
+
+    def after_begin(session, transaction, connection):
+        left = remaining()
+        if left is None:
+            return
+        if left <= 0:
+            raise DeadlineExceeded()
+        connection.exec_driver_sql(f"SET LOCAL statement_timeout = {max(int(left * 1000), 1)}")
+
+    for factory in session_factories:
+        event.listen(factory, "after_begin", after_begin)
+
+
+def instrument_engine(engine: Engine) -> None:
+    """
+    Turn statements cancelled by a request's statement_timeout into 504s.
+    Registered after the other handle_error listeners, which still see the
+    original error.
+    """
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(context):
+        if _deadline.get() is None:
+            return
+        if getattr(context.original_exception, "pgcode", None) == _QUERY_CANCELED:
+            raise DeadlineExceeded() from context.original_exception
+
+
+# ------------------- HTTP -------------------
+
+class DeadlineFileResponse(FileResponse):
+    """
+    FileResponse that stops sending when the request deadline passes or the
+    client disconnects, instead of reading the rest of the file for nobody.
+    """
+
+    async def __call__(self, scope, receive, send):
+        deadline = _deadline.get()
+
+        async def checked_send(message):
+            if message["type"] == "http.response.body" and deadline is not None and time.monotonic() >= deadline:
+                raise DeadlineExceeded()
+            await send(message)
+
+        async with anyio.create_task_group() as tasks:
+            async def watch_disconnect():
+                try:
+                    while (await receive())["type"] != "http.disconnect":
+                        pass
+                except DeadlineExceeded:
+                    pass
+                tasks.cancel_scope.cancel()
+
+            tasks.start_soon(watch_disconnect)
+            try:
+                await super().__call__(scope, receive, checked_send)
+            except DeadlineExceeded:
+                # Headers are out, so all that is left is to cut the response short
+                logger.warning("Download of %s stopped at the request deadline", self.path)
+            tasks.cancel_scope.cancel()
+
+
+class DeadlineMiddleware:
+    """
+    Pure ASGI middleware setting the deadline of API requests and refusing to
+    read their body past it.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        seconds = _route_deadline(scope["method"], scope["path"])
+        if seconds is None:
+            await self.app(scope, receive, send)
+            return
+        requested = _requested(scope["headers"])
+        if requested is not None:
+            seconds = min(seconds, requested)
+        deadline = time.monotonic() + seconds
+
+        async def receive_wrapper():
+            message = await receive()
+            if message["type"] == "http.request" and time.monotonic() >= deadline:
+                raise DeadlineExceeded()
+            return message
+
+        token = _deadline.set(deadline)
+        try:
+            await self.app(scope, receive_wrapper, send)
+        finally:
+            _deadline.reset(token)
@@ -0,0 +1,75 @@
+import re
+from typing import Optional, Tuple
+from uuid import UUID
+from fastapi import Response, status
+from sqlalchemy.orm import Session
+from src.repository import reads
+from src import cache
+
+# Metadata responses are tagged with the version (change_seq) of their data
+# room: W/"<data_room_id>.<version>". Any change in the room bumps the version,
+# so If-None-Match is answered from the version of the room the resource is in
+# alone: the cached room version for data rooms, one primary key lookup
+# (folder_version/file_version) for folders and files.
+
+CACHE_CONTROL = "private, no-cache"
+
+_ETAG_RE = re.compile(r'(?:W/)?"([0-9a-fA-F-]{36})\.(\d+)"')
+
+
+def make_etag(data_room_id: UUID, version: int) -> str:
+    return f'W/"{data_room_id}.{version}"'
+
+
+def room_version(db: Session, data_room_id: UUID) -> Optional[int]:
+    """
+    Version of a data room, from Redis or else from the database (which then
+    fills the cache). None if the data room does not exist.
+    """
+    version = cache.get_room_version(data_room_id)
+    if version is None:
+        version = reads.get_room_version(db, data_room_id)
+        if version is not None:
+            cache.set_room_version(data_room_id, version)
+    return version
+
+
+def _owner_version(row) -> Optional[Tuple[UUID, int]]:
+    if row is None:
+        return None
+    cache.set_room_version(row.data_room_id, row.change_seq)
+    return row.data_room_id, row.change_seq
+
+
+def folder_version(db: Session, folder_id: UUID) -> Optional[Tuple[UUID, int]]:
+    """
+    (data room id, version) of the room a folder is in, None if it does not exist.
+    """
+    return _owner_version(reads.get_folder_room_version(db, folder_id))
+
+
+def file_version(db: Session, file_id: UUID) -> Optional[Tuple[UUID, int]]:
+    return _owner_version(reads.get_file_room_version(db, file_id))
+
+
+def not_modified(if_none_match: Optional[str], data_room_id: UUID, version: int) -> Optional[Response]:
+    """
+    A 304 response if one of the If-None-Match tags names the current version
+    of the data room the requested resource is in, else None. Tags of other
+    rooms never match. Take the version before reading the data, so a tag is
+    never newer than the response it is sent with.
+    """
+    if not if_none_match:
+        return None
+    for tag_room_id, tag_version in _ETAG_RE.findall(if_none_match):
+        if UUID(tag_room_id) == data_room_id and int(tag_version) == version:
+            return Response(
+                status_code=status.HTTP_304_NOT_MODIFIED,
+                headers={"ETag": make_etag(data_room_id, version), "Cache-Control": CACHE_CONTROL}
+            )
+    return None
+
+
+def tag(response: Response, data_room_id: UUID, version: int) -> None:
+    response.headers["ETag"] = make_etag(data_room_id, version)
+    response.headers["Cache-Control"] = CACHE_CONTROL
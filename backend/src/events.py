@@ -0,0 +1,224 @@
+import asyncio
+import json
+from collections import defaultdict
+from typing import Dict, Optional, Set
+from uuid import UUID
+from psycopg2 import Error as PsycopgError
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+from config import settings
+from src.repository.changes import NOTIFY_CHANNEL
+from src.logger import get_logger
+
+logger = get_logger(__name__)
+
+MAX_RECONNECT_DELAY = 30
+
+
+class TooManySubscribersError(Exception):
+    pass
+
+
+class Subscription:
+    """
+    One SSE connection. Events are buffered in a bounded queue; a None in the
+    queue means the subscriber was dropped and has to resync from the change feed.
+    """
+
+    def __init__(self, data_room_id: UUID, queue_size: int):
+        self.data_room_id = data_room_id
+        self.queue: "asyncio.Queue[Optional[dict]]" = asyncio.Queue(maxsize=queue_size)
+        self.closed = False
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        self.closed = True
+        # Drop what is buffered so the close marker always fits
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(None)
+
+
+class EventBroker:
+    """
+    Fans committed changes out to the SSE subscribers of this worker.
+
+    The worker holds a single LISTEN connection to Postgres (changes.record_many
+    sends NOTIFY in the mutating transaction) that is read on the event loop, so
+    idle subscribers cost one queue each and no threads or connections.
+    A subscriber whose queue fills up is closed instead of slowing down the
+    others; it reconnects with Last-Event-ID and catches up from the feed.
+    """
+
+    def __init__(
+            self,
+            engine,
+            queue_size: int = settings.EVENTS_QUEUE_SIZE,
+            max_subscribers: int = settings.EVENTS_MAX_SUBSCRIBERS
+    ):
+        self.engine = engine
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self._subscribers: Dict[UUID, Set[Subscription]] = defaultdict(set)
+        self._count = 0
+        self._conn = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._reconnect_task: Optional[asyncio.Task] = None
+
+    @property
+    def subscriber_count(self) -> int:
+        return self._count
+
+    async def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        try:
+            await self._listen()
+        except Exception as e:
+            logger.error("Failed to listen for data room changes: %s", e)
+            self._schedule_reconnect()
+
+    async def stop(self) -> None:
+        if self._reconnect_task is not None:
+            self._reconnect_task.cancel()
+            self._reconnect_task = None
+        self._close_connection()
+        for subscriptions in self._subscribers.values():
+            for subscription in subscriptions:
+                subscription.close()
+        self._subscribers.clear()
+        self._count = 0
+
+    def subscribe(self, data_room_id: UUID) -> Subscription:
+        if self._count >= self.max_subscribers:
+            raise TooManySubscribersError("Too many event subscribers")
+        subscription = Subscription(data_room_id, self.queue_size)
+        self._subscribers[data_room_id].add(subscription)
+        self._count += 1
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        subscriptions = self._subscribers.get(subscription.data_room_id)
+        if subscriptions is None or subscription not in subscriptions:
+            return
+        subscriptions.discard(subscription)
+        if not subscriptions:
+            del self._subscribers[subscription.data_room_id]
+        self._count -= 1
+
+    async def _listen(self) -> None:
+        # Connecting blocks, so it runs in a thread; reading is driven by the loop
+        self._conn = await self._loop.run_in_executor(None, self._connect)
+        self._loop.add_reader(self._conn.fileno(), self._on_readable)
+        logger.info("Listening for data room changes on '%s'", NOTIFY_CHANNEL)
+
+    def _connect(self):
+        # A dedicated connection outside the pool, created with the engine's settings
+        raw = self.engine.raw_connection()
+        raw.detach()
+        conn = raw.dbapi_connection
+        conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+        with conn.cursor() as cursor:
+            cursor.execute(f"LISTEN {NOTIFY_CHANNEL}")
+        return conn
+
+    def _close_connection(self) -> None:
+        if self._conn is None:
+            return
+        try:
+            self._loop.remove_reader(self._conn.fileno())
+        except Exception:
+            pass
+        try:
+            self._conn.close()
+        except PsycopgError:
+            pass
+        self._conn = None
+
+    def _on_readable(self) -> None:
+        try:
+            self._conn.poll()
+        except PsycopgError as e:
+            logger.warning("Lost the change notification connection: %s", e)
+            self._close_connection()
+            # Notifications sent while disconnected are lost
+            self._close_all()
+            self._schedule_reconnect()
+            return
+
+        notifies = self._conn.notifies
+        while notifies:
+            self._dispatch(notifies.pop(0).payload)
+
+    def _dispatch(self, payload: str) -> None:
+        try:
+            event = json.loads(payload)
+            data_room_id = UUID(event['data_room_id'])
+        except (ValueError, KeyError) as e:
+            logger.warning("Ignoring malformed change notification: %s", e)
+            return
+
+        for subscription in list(self._subscribers.get(data_room_id, ())):
+            try:
+                subscription.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                logger.info("Dropping slow event subscriber of data room %s", data_room_id)
+                self.unsubscribe(subscription)
+                subscription.close()
+
+    def _close_all(self) -> None:
+        for subscriptions in list(self._subscribers.values()):
+            for subscription in list(subscriptions):
+                self.unsubscribe(subscription)
+                subscription.close()
+
+    def _schedule_reconnect(self) -> None:
+        if self._reconnect_task is None or self._reconnect_task.done():
+            self._reconnect_task = self._loop.create_task(self._reconnect())
+
+    async def _reconnect(self) -> None:
+        delay = 1
+        while True:
+            await asyncio.sleep(delay)
+            try:
+                await self._listen()
+                return
+            except Exception as e:
+                logger.warning("Reconnecting the change notification listener failed: %s", e)
+                delay = min(delay * 2, MAX_RECONNECT_DELAY)
+
+
+def format_event(event: str, data: dict, event_id: Optional[int] = None) -> str:
+    """
+    Encode one Server-Sent Event.
+    """
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, default=str)}")
+    return "\n".join(lines) + "\n\n"
+
+
+def change_event(payload: dict) -> str:
+    """
+    SSE for a change notification: a single change is sent as `change`, a block
+    of changes (copy, import) as `changes` with the range to fetch from the feed.
+    """
+    if 'entity_id' in payload:
+        data = {k: payload[k] for k in ('seq', 'entity_type', 'entity_id', 'op', 'parent_id', 'name')}
+        return format_event('change', data, payload['seq'])
+    return format_event('changes', {'first_seq': payload['first_seq'], 'seq': payload['seq']}, payload['seq'])
+
+
+_broker = None
+
+
+def get_broker() -> EventBroker:
+    """
+    The worker's broker (started and stopped in the app lifespan).
+    """
+    global _broker
+    if _broker is None:
+        from src.database.db import get_engine
+        _broker = EventBroker(get_engine())
+    return _broker
@@ -0,0 +1,279 @@
+import asyncio
+import base64
+import hashlib
+import json
+import uuid
+from typing import List, Optional
+import redis
+from config import settings
+from src import cache
+from src.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Idempotency-Key support for POST requests, as pure ASGI middleware so that a
+# replayed request is answered before a database session is opened (and, for
+# uploads, before the body is read).
+#
+# The first request with a key claims it in Redis (SET NX) with a "pending"
+# record and runs normally; its response is then stored under the key for
+# IDEMPOTENCY_TTL. A retry with the same key gets the stored response back
+# (marked with Idempotent-Replayed: true). A duplicate that arrives while the
+# first attempt is still running waits for it, up to IDEMPOTENCY_WAIT_SECONDS.
+# Server errors are not stored, so a retry after a 5xx runs again. A response
+# larger than IDEMPOTENCY_MAX_BODY is stored without its body: a retry gets the
+# original status with a short note instead of running the request again.
+#
+# A retry must be the same request: method, path, query and body. Bodies of up
+# to IDEMPOTENCY_MAX_HASHED_BODY bytes (JSON and form requests) are read first
+# and their hash is compared. Multipart bodies (uploads) and larger ones are not
+# buffered; only their declared length is compared, so reusing a key for a
+# different upload of exactly the same size replays the first response.
+#
+# If Redis is unavailable requests are processed without idempotency.
+
+HEADER = b"idempotency-key"
+MAX_KEY_LENGTH = 255
+
+_KEY = "idempotency:{}"
+
+# Statuses that are worth repeating rather than replaying
+_NOT_STORED = {429}
+
+# Delete the key only if it still holds our pending record
+_RELEASE_SCRIPT = """
+local current = redis.call('GET', KEYS[1])
+if current and cjson.decode(current)['owner'] == ARGV[1] then
+    redis.call('DEL', KEYS[1])
+end
+"""
+
+# Replace our pending record with the response, unless the claim expired and
+# another request took the key meanwhile
+_STORE_SCRIPT = """
+local current = redis.call('GET', KEYS[1])
+if current and cjson.decode(current)['owner'] == ARGV[1] then
+    redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+    return 1
+end
+return 0
+"""
+
+
+def _hashes_body(scope) -> bool:
+    """
+    Whether the body is small enough, and not an upload, to be read up front
+    and hashed into the fingerprint.
+    """
+    headers = dict(scope["headers"])
+    if headers.get(b"content-type", b"").lower().startswith(b"multipart/"):
+        return False
+    length = headers.get(b"content-length", b"")
+    return length.isdigit() and int(length) <= settings.IDEMPOTENCY_MAX_HASHED_BODY
+
+
+async def _read_body(receive) -> List[dict]:
+    """
+    Receive the messages of a request body, to be passed on to the app later.
+    """
+    messages = []
+    while True:
+        message = await receive()
+        messages.append(message)
+        if message["type"] != "http.request" or not message.get("more_body", False):
+            return messages
+
+
+def _replaying(messages: List[dict], receive):
+    async def replay():
+        if messages:
+            return messages.pop(0)
+        return await receive()
+    return replay
+
+
+def _fingerprint(scope, body_hash: Optional[str] = None) -> str:
+    """
+    What a retry must repeat for the key to apply: method, path, query, declared
+    body length and, for bodies that were read, their hash.
+    """
+    headers = dict(scope["headers"])
+    return "|".join((
+        scope["method"],
+        scope["path"],
+        scope.get("query_string", b"").decode("latin-1"),
+        headers.get(b"content-length", b"").decode("latin-1"),
+    ) + ((body_hash,) if body_hash is not None else ()))
+
+
+async def _send_json(send, status_code: int, detail: str, headers: Optional[List] = None) -> None:
+    body = json.dumps({"detail": detail}).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status_code,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+        ] + (headers or []),
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _replay(send, record: dict) -> None:
+    if record.get("body") is None:
+        # Too large to store; only the outcome is known
+        await _send_json(
+            send, record["status"],
+            "A request with this Idempotency-Key already completed; its response was too large to replay",
+            headers=[(b"idempotent-replayed", b"true")]
+        )
+        return
+    headers = [(name.encode("latin-1"), value.encode("latin-1")) for name, value in record["headers"]]
+    headers.append((b"idempotent-replayed", b"true"))
+    await send({"type": "http.response.start", "status": record["status"], "headers": headers})
+    await send({"type": "http.response.body", "body": base64.b64decode(record["body"])})
+
+
+class IdempotencyMiddleware:
+    def __init__(self, app):
+        self.app = app
+        self._release = None
+        self._store_script = None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST":
+            await self.app(scope, receive, send)
+            return
+
+        idempotency_key = dict(scope["headers"]).get(HEADER)
+        if idempotency_key is None:
+            await self.app(scope, receive, send)
+            return
+        idempotency_key = idempotency_key.decode("latin-1").strip()
+        if not idempotency_key or len(idempotency_key) > MAX_KEY_LENGTH:
+            await _send_json(send, 400, f"Idempotency-Key must be 1-{MAX_KEY_LENGTH} characters")
+            return
+
+        client = cache.get_async_redis()
+        if client is None:
+            await self.app(scope, receive, send)
+            return
+
+        body_hash = None
+        if _hashes_body(scope):
+            messages = await _read_body(receive)
+            digest = hashlib.sha256()
+            for message in messages:
+                digest.update(message.get("body", b""))
+            body_hash = digest.hexdigest()
+            receive = _replaying(messages, receive)
+
+        key = _KEY.format(idempotency_key)
+        fingerprint = _fingerprint(scope, body_hash)
+        owner = uuid.uuid4().hex
+        try:
+            with cache.redis_call("idempotency_claim"):
+                claimed = await client.set(
+                    key,
+                    json.dumps({"state": "pending", "owner": owner, "fingerprint": fingerprint}),
+                    nx=True,
+                    ex=settings.IDEMPOTENCY_LOCK_TTL,
+                )
+            record = None if claimed else await self._wait(client, key)
+        except redis.RedisError as e:
+            cache.failed(e)
+            await self.app(scope, receive, send)
+            return
+
+        if not claimed:
+            if record is None:
+                # The first attempt failed or its record expired; this one may run
+                # without idempotency rather than fail
+                await self.app(scope, receive, send)
+            elif record["fingerprint"] != fingerprint:
+                await _send_json(send, 422, "Idempotency-Key was already used for a different request")
+            elif record["state"] == "pending":
+                await _send_json(
+                    send, 409, "A request with this Idempotency-Key is still in progress",
+                    headers=[(b"retry-after", b"1")]
+                )
+            else:
+                await _replay(send, record)
+            return
+
+        await self._run(scope, receive, send, client, key, owner, fingerprint)
+
+    async def _wait(self, client, key: str) -> Optional[dict]:
+        """
+        Record under the key, once it is no longer pending or the wait is over.
+        None if the key is gone.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + settings.IDEMPOTENCY_WAIT_SECONDS
+        delay = 0.05
+        while True:
+            with cache.redis_call("idempotency_get"):
+                value = await client.get(key)
+            if value is None:
+                return None
+            record = json.loads(value)
+            if record["state"] != "pending" or loop.time() >= deadline:
+                return record
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.5)
+
+    async def _run(self, scope, receive, send, client, key: str, owner: str, fingerprint: str) -> None:
+        response = {"status": None, "headers": [], "body": bytearray(), "storable": True}
+
+        async def capture(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                response["headers"] = [
+                    (name.decode("latin-1"), value.decode("latin-1")) for name, value in message.get("headers", [])
+                ]
+            elif message["type"] == "http.response.body" and response["storable"]:
+                response["body"] += message.get("body", b"")
+                if len(response["body"]) > settings.IDEMPOTENCY_MAX_BODY:
+                    response["storable"] = False
+                    response["body"] = bytearray()
+            await send(message)
+
+        try:
+            await self.app(scope, receive, capture)
+        finally:
+            status_code = response["status"]
+            if status_code is not None and status_code < 500 and status_code not in _NOT_STORED:
+                storable = response["storable"]
+                await self._store(client, key, owner, {
+                    "state": "done",
+                    "owner": owner,
+                    "fingerprint": fingerprint,
+                    "status": status_code,
+                    "headers": response["headers"] if storable else [],
+                    "body": base64.b64encode(bytes(response["body"])).decode() if storable else None,
+                })
+            else:
+                await self._release_key(client, key, owner)
+
+    async def _store(self, client, key: str, owner: str, record: dict) -> None:
+        try:
+            if self._store_script is None:
+                self._store_script = client.register_script(_STORE_SCRIPT)
+            with cache.redis_call("idempotency_store"):
+                stored = await self._store_script(
+                    keys=[key], args=[owner, json.dumps(record), settings.IDEMPOTENCY_TTL]
+                )
+        except redis.RedisError as e:
+            cache.failed(e)
+            return
+        if not stored:
+            logger.warning("Response not stored under %s: the claim expired before the request finished", key)
+
+    async def _release_key(self, client, key: str, owner: str) -> None:
+        try:
+            if self._release is None:
+                self._release = client.register_script(_RELEASE_SCRIPT)
+            with cache.redis_call("idempotency_release"):
+                await self._release(keys=[key], args=[owner])
+        except redis.RedisError as e:
+            cache.failed(e)
@@ -1,5 +1,116 @@
+import atexit
+import json
 import logging
+import queue
+import random
 import sys
+import threading
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+from config import settings
+
+# Loggers of the app write into a bounded in-memory queue; one listener thread
+# formats the records and writes them to stdout. Request threads never format
+# a message or do I/O: records keep their %-style msg/args until the listener
+# formats them (use logger.info("... %s", value), not f-strings). If the queue
+# is full, records are dropped and counted rather than blocking.
+#
+# Output is one JSON object per line (LOG_FORMAT=text for plain lines), with
+# the request id and route template of the request that logged it. INFO and
+# DEBUG records are sampled with LOG_INFO_SAMPLE_RATE; warnings and errors
+# are always kept.
+#
+# The listener thread is started by the first record, so importing modules
+# that create loggers starts no thread.
+
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+_scope_var: ContextVar[Optional[dict]] = ContextVar("request_scope", default=None)
+
+_handler: Optional["_NonBlockingQueueHandler"] = None
+_listener: Optional[QueueListener] = None
+_listener_started = False
+_setup_lock = threading.Lock()
+
+
+class _NonBlockingQueueHandler(QueueHandler):
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Capture the request context in the calling thread; formatting is left
+        # to the listener (the base class would format here)
+        record.request_id = request_id_var.get()
+        scope = _scope_var.get()
+        if scope is not None:
+            record.route = getattr(scope.get("route"), "path", None) or scope.get("path")
+        else:
+            record.route = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        if not _listener_started:
+            _start_listener()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class _SamplingFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        rate = settings.LOG_INFO_SAMPLE_RATE
+        return record.levelno >= logging.WARNING or rate >= 1 or random.random() < rate
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        request_id = getattr(record, "request_id", None)
+        if request_id:
+            entry["request_id"] = request_id
+            entry["route"] = record.route
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def _setup() -> "_NonBlockingQueueHandler":
+    global _handler, _listener
+    with _setup_lock:
+        if _handler is None:
+            stream = logging.StreamHandler(sys.stdout)
+            if settings.LOG_FORMAT == "json":
+                stream.setFormatter(JsonFormatter())
+            else:
+                stream.setFormatter(logging.Formatter(
+                    '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+                    datefmt='%Y-%m-%d %H:%M:%S'
+                ))
+            handler = _NonBlockingQueueHandler(queue.Queue(settings.LOG_QUEUE_SIZE))
+            handler.addFilter(_SamplingFilter())
+            _listener = QueueListener(handler.queue, stream, respect_handler_level=True)
+            _handler = handler
+    return _handler
+
+
+def _start_listener() -> None:
+    global _listener_started
+    with _setup_lock:
+        if not _listener_started:
+            _listener.start()
+            # Flush what is queued when the process exits
+            atexit.register(_listener.stop)
+            _listener_started = True
+
 
 def get_logger(name: str) -> logging.Logger:
     """Get a configured logger instance."""
@@ -7,15 +118,47 @@ def get_logger(name: str) -> logging.Logger:
 
     # Only configure if not already configured
     if not logger.handlers:
-        logger.setLevel(logging.INFO)
-
-        # Console handler with formatting
-        handler = logging.StreamHandler(sys.stdout)
-        formatter = logging.Formatter(
-            '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-            datefmt='%Y-%m-%d %H:%M:%S'
-        )
-        handler.setFormatter(formatter)
-        logger.addHandler(handler)
+        logger.setLevel(settings.LOG_LEVEL)
+        logger.addHandler(_setup())
 
     return logger
+
+
+def dropped_records() -> int:
+    """
+    Number of records dropped because the log queue was full.
+    """
+    return _handler.dropped if _handler is not None else 0
+
+
+class RequestContextMiddleware:
+    """
+    Pure ASGI middleware that gives every request an id (from X-Request-ID or
+    generated), returns it in the response and makes it and the route
+    available to log records.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = dict(scope["headers"]).get(b"x-request-id", b"").decode("latin-1")[:64] or uuid.uuid4().hex
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": list(message.get("headers", [])) + [
+                    (b"x-request-id", request_id.encode("latin-1"))
+                ]}
+            await send(message)
+
+        request_id_token = request_id_var.set(request_id)
+        scope_token = _scope_var.set(scope)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            request_id_var.reset(request_id_token)
+            _scope_var.reset(scope_token)
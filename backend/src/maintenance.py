@@ -0,0 +1,61 @@
+import asyncio
+from datetime import timedelta
+from typing import Optional
+from fastapi.concurrency import run_in_threadpool
+from config import settings
+from src.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Periodic upkeep of every worker, started and stopped in the app lifespan.
+# Each QUOTA_RESERVATION_SWEEP_INTERVAL seconds, quota reservations older
+# than REQUEST_DEADLINE_UPLOAD are released (see src/repository/quotas.py).
+# Workers may sweep at the same time; each reservation is deleted, and
+# subtracted, by exactly one of them.
+
+_task: Optional[asyncio.Task] = None
+
+
+def _expire_reservations() -> int:
+    from src.database.db import SessionLocal
+    from src.repository import quotas
+
+    db = SessionLocal()
+    try:
+        released = quotas.expire_reservations(db, timedelta(seconds=settings.REQUEST_DEADLINE_UPLOAD))
+        db.commit()
+        return released
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+async def _run() -> None:
+    while True:
+        await asyncio.sleep(settings.QUOTA_RESERVATION_SWEEP_INTERVAL)
+        try:
+            released = await run_in_threadpool(_expire_reservations)
+        except Exception as e:
+            logger.warning("Releasing expired quota reservations failed: %s", e)
+            continue
+        if released:
+            logger.warning("Released %s expired quota reservations", released)
+
+
+def start() -> None:
+    global _task
+    if _task is None and settings.QUOTA_RESERVATION_SWEEP_INTERVAL > 0:
+        _task = asyncio.get_running_loop().create_task(_run())
+
+
+async def stop() -> None:
+    global _task
+    if _task is not None:
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
+        _task = None
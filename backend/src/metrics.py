@@ -0,0 +1,444 @@
+import fcntl
+import json
+import os
+import re
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import QueuePool
+from config import settings
+from src.logger import get_logger
+
+logger = get_logger(__name__)
+
+# In-process metrics in the Prometheus text format, served by /metrics.
+#
+# Every thread records into its own shard (a plain dict that only that thread
+# writes), so recording takes no lock; a scrape copies and sums the shards.
+# The event loop thread records the HTTP metrics, the threadpool threads the
+# SQL, pool, storage and Redis metrics.
+#
+# Values are per worker process. With several workers (serve.py) a scrape
+# reaches any one of them, so with METRICS_DIR set every worker also writes
+# its values to a file there and render() sums the files of all workers (see
+# "Worker processes" below).
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216, 67108864)
+
+_metrics: List["_Metric"] = []
+
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._local = threading.local()
+        self._shards: List[dict] = []
+        self._shards_lock = threading.Lock()
+        _metrics.append(self)
+
+    def _shard(self) -> dict:
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = {}
+            # Only taken once per thread
+            with self._shards_lock:
+                self._shards.append(shard)
+            return shard
+
+    def _snapshots(self) -> List[dict]:
+        with self._shards_lock:
+            shards = list(self._shards)
+        # dict() copies in one step under the GIL
+        return [dict(shard) for shard in shards]
+
+    def _label_text(self, values: Tuple, extra: str = "") -> str:
+        pairs = [f'{name}="{_escape(value)}"' for name, value in zip(self.labels, values)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def totals(self) -> Dict[Tuple, Any]:
+        """
+        Values of this process by label values, summed over the shards.
+        """
+        totals: Dict[Tuple, Any] = {}
+        for shard in self._snapshots():
+            for labels, value in shard.items():
+                totals[labels] = self.add(totals[labels], value) if labels in totals else self.add(None, value)
+        return totals
+
+    @staticmethod
+    def add(total, value):
+        raise NotImplementedError
+
+    def render(self, totals: Optional[Dict[Tuple, Any]] = None) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def inc(self, *labels, amount: float = 1) -> None:
+        shard = self._shard()
+        shard[labels] = shard.get(labels, 0) + amount
+
+    @staticmethod
+    def add(total, value):
+        return value if total is None else total + value
+
+    def render(self, totals: Optional[Dict[Tuple, float]] = None) -> List[str]:
+        totals = self.totals() if totals is None else totals
+        return [f"{self.name}{self._label_text(labels)} {_number(value)}" for labels, value in sorted(totals.items())]
+
+
+class Gauge(Counter):
+    """
+    Up/down value, e.g. requests in flight; the shards hold deltas.
+    """
+    type = "gauge"
+
+    def dec(self, *labels, amount: float = 1) -> None:
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, *labels) -> None:
+        shard = self._shard()
+        series = shard.get(labels)
+        if series is None:
+            # Per-bucket counts (the last one is +Inf), then the sum
+            series = shard[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    @contextmanager
+    def time(self, *labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    @staticmethod
+    def add(total, value):
+        if total is None:
+            return list(value)
+        for i, v in enumerate(value):
+            total[i] += v
+        return total
+
+    def render(self, totals: Optional[Dict[Tuple, list]] = None) -> List[str]:
+        totals = self.totals() if totals is None else totals
+        lines = []
+        for labels, series in sorted(totals.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{_number(bound)}"'
+                lines.append(f"{self.name}_bucket{self._label_text(labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{self._label_text(labels)} {_number(series[-1])}")
+            lines.append(f"{self.name}_count{self._label_text(labels)} {cumulative}")
+        return lines
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def render() -> str:
+    """
+    All metrics in the Prometheus text exposition format (version 0.0.4), of
+    all worker processes when METRICS_DIR is set, else of this one.
+    """
+    merged = _merged_totals() if settings.METRICS_DIR else {}
+    lines = []
+    for metric in _metrics:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.type}")
+        lines.extend(metric.render(merged.get(metric.name, {}) if settings.METRICS_DIR else None))
+    return "\n".join(lines) + "\n"
+
+
+# ------------------- Worker processes -------------------
+
+# Every worker writes its totals to <METRICS_DIR>/<pid>.json (replacing the
+# file atomically) every METRICS_EXPORT_INTERVAL seconds, when it stops, and
+# before it renders a scrape. A scrape sums the files of all workers. Counters
+# and histograms of workers that have exited (restarted after
+# SERVER_MAX_REQUESTS, killed) are folded into dead.json, so the sums never
+# go down; their gauges are dropped. Other workers' values are up to
+# METRICS_EXPORT_INTERVAL old.
+
+_DEAD_FILE = "dead.json"
+_WORKER_FILE = re.compile(r"^(\d+)\.json$")
+
+_exporter: Optional[threading.Thread] = None
+_exporter_stop = threading.Event()
+
+
+def _write_json(path: str, value: dict) -> None:
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(value, f)
+    os.replace(tmp, path)
+
+
+def _read_json(path: str) -> dict:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def write_snapshot() -> None:
+    """
+    Write the totals of this process to its file in METRICS_DIR.
+    """
+    _write_json(os.path.join(settings.METRICS_DIR, f"{os.getpid()}.json"), {
+        metric.name: [[list(labels), value] for labels, value in metric.totals().items()] for metric in _metrics
+    })
+
+
+def _merge(into: Dict[str, Dict[Tuple, Any]], snapshot: dict, gauges: bool = True) -> None:
+    by_name = {metric.name: metric for metric in _metrics}
+    for name, series in snapshot.items():
+        metric = by_name.get(name)
+        if metric is None or (metric.type == "gauge" and not gauges):
+            continue
+        totals = into.setdefault(name, {})
+        for labels, value in series:
+            labels = tuple(labels)
+            totals[labels] = metric.add(totals.get(labels), value)
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _merged_totals() -> Dict[str, Dict[Tuple, Any]]:
+    directory = settings.METRICS_DIR
+    write_snapshot()
+    merged: Dict[str, Dict[Tuple, Any]] = {}
+    # Serializes folding dead workers into dead.json between scraping workers
+    with open(os.path.join(directory, ".lock"), "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        dead_path = os.path.join(directory, _DEAD_FILE)
+        workers = [(int(match.group(1)), name) for name in os.listdir(directory) if (match := _WORKER_FILE.match(name))]
+        exited = [name for pid, name in workers if not _alive(pid)]
+        if exited:
+            dead: Dict[str, Dict[Tuple, Any]] = {}
+            _merge(dead, _read_json(dead_path))
+            for name in exited:
+                _merge(dead, _read_json(os.path.join(directory, name)), gauges=False)
+            _write_json(dead_path, {
+                name: [[list(labels), value] for labels, value in totals.items()] for name, totals in dead.items()
+            })
+            for name in exited:
+                os.remove(os.path.join(directory, name))
+
+        _merge(merged, _read_json(dead_path))
+        for pid, name in workers:
+            if name not in exited:
+                _merge(merged, _read_json(os.path.join(directory, name)))
+    return merged
+
+
+def clear_snapshots(directory: str) -> None:
+    """
+    Remove the files of an earlier run from a metrics directory.
+    """
+    for name in os.listdir(directory):
+        if _WORKER_FILE.match(name) or name in (_DEAD_FILE, ".lock") or name.endswith(".json.tmp"):
+            os.remove(os.path.join(directory, name))
+
+
+def _export_loop() -> None:
+    while not _exporter_stop.wait(settings.METRICS_EXPORT_INTERVAL):
+        try:
+            write_snapshot()
+        except OSError as e:
+            logger.warning("Writing metrics to %s failed: %s", settings.METRICS_DIR, e)
+
+
+def start_export() -> None:
+    """
+    Start writing this worker's metrics to METRICS_DIR (no-op when unset).
+    """
+    global _exporter
+    if not settings.METRICS_DIR or _exporter is not None:
+        return
+    _exporter_stop.clear()
+    _exporter = threading.Thread(target=_export_loop, name="metrics-exporter", daemon=True)
+    _exporter.start()
+
+
+def stop_export() -> None:
+    """
+    Stop the export thread and write the final values of this worker.
+    """
+    global _exporter
+    if _exporter is None:
+        return
+    _exporter_stop.set()
+    _exporter.join()
+    _exporter = None
+    try:
+        write_snapshot()
+    except OSError as e:
+        logger.warning("Writing metrics to %s failed: %s", settings.METRICS_DIR, e)
+
+
+# ------------------- Metrics -------------------
+
+http_requests = Counter(
+    "http_requests_total", "HTTP requests by route template, method and status", ("method", "route", "status")
+)
+http_request_duration = Histogram(
+    "http_request_duration_seconds", "Time until the response was sent", ("method", "route")
+)
+http_response_size = Histogram(
+    "http_response_size_bytes", "Response body size", ("method", "route"), buckets=SIZE_BUCKETS
+)
+http_in_flight = Gauge("http_requests_in_flight", "Requests being handled")
+
+db_queries = Counter("db_queries_total", "SQL statements executed by kind", ("kind",))
+db_query_duration = Histogram("db_query_duration_seconds", "SQL statement execution time", ("kind",))
+db_pool_wait = Histogram("db_pool_checkout_wait_seconds", "Time spent waiting for a pooled connection")
+
+storage_bytes = Counter("storage_bytes_total", "Bytes of files uploaded and downloaded", ("direction",))
+storage_duration = Histogram("storage_duration_seconds", "Time spent writing uploads to storage", ("operation",))
+
+redis_duration = Histogram(
+    "redis_command_duration_seconds", "Redis call latency, including failures", ("operation",),
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)
+)
+
+admission_in_flight = Gauge("admission_in_flight", "Admitted requests in flight by concurrency class", ("class",))
+admission_queued = Gauge("admission_queued", "Requests waiting for admission by concurrency class", ("class",))
+admission_queue_wait = Histogram(
+    "admission_queue_wait_seconds", "Time requests waited for admission, including shed ones", ("class",),
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+)
+admission_rejected = Counter(
+    "admission_rejected_total", "Requests shed with 503 by concurrency class and reason", ("class", "reason")
+)
+
+rate_limit_checks = Counter(
+    "rate_limit_checks_total", "Rate limit decisions by source (local lease, redis, fallback)", ("source",)
+)
+rate_limit_rejected = Counter("rate_limit_rejected_total", "Requests rejected with 429 by limit", ("limit",))
+
+
+# ------------------- HTTP -------------------
+
+# Routes not worth timing (the scrape itself)
+EXCLUDED_PATHS = {"/metrics"}
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware: requests are labelled with the matched route template
+    (e.g. /api/folders/{folder_id}), so ids do not create new series.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in EXCLUDED_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        response = {"status": 500, "size": 0}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+            elif message["type"] == "http.response.body":
+                response["size"] += len(message.get("body", b""))
+            await send(message)
+
+        http_in_flight.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            http_in_flight.dec()
+            route = scope.get("route")
+            route = getattr(route, "path", None) or "unmatched"
+            method = scope["method"]
+            http_requests.inc(method, route, str(response["status"]))
+            http_request_duration.observe(time.perf_counter() - start, method, route)
+            http_response_size.observe(response["size"], method, route)
+
+
+# ------------------- Database -------------------
+
+class InstrumentedQueuePool(QueuePool):
+    """
+    QueuePool that records how long a checkout waited for a connection.
+    """
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            db_pool_wait.observe(time.perf_counter() - start)
+
+
+def _statement_kind(statement: str) -> str:
+    kind = statement.lstrip().split(None, 1)[0].lower() if statement.strip() else ""
+    return kind if kind in ("select", "insert", "update", "delete", "with") else "other"
+
+
+def instrument_engine(engine: Engine) -> None:
+    """
+    Count and time every statement executed on the engine.
+    """
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metrics_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get("metrics_start")
+        if not starts:
+            return
+        kind = _statement_kind(statement)
+        db_queries.inc(kind)
+        db_query_duration.observe(time.perf_counter() - starts.pop(), kind)
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(context):
+        starts = context.connection.info.get("metrics_start") if context.connection is not None else None
+        if starts:
+            starts.pop()
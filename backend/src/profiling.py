@@ -0,0 +1,168 @@
+import re
+import time
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import List, Optional
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from config import settings
+from src.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Opt-in per-request SQL profiling (SQL_PROFILING=true). Every statement of a
+# request is counted and timed by statement shape; a shape that repeats more
+# than SQL_PROFILING_N1_THRESHOLD times in one request (lazy loading in a
+# loop) is logged as a likely N+1. Responses get a Server-Timing header with
+# the time spent in the database, in serialization and in storage I/O.
+#
+# query_budget() counts statements across all threads instead, for
+# benchmarks and tests that drive the app through a client.
+
+_current: ContextVar[Optional["RequestProfile"]] = ContextVar("request_profile", default=None)
+
+# Collapse the parameter lists of IN (...) / VALUES (...) so that the same
+# statement with a different number of ids has one shape
+_PARAMS_RE = re.compile(r"(%\(\w+\)s|\?|\$\d+)(\s*,\s*(%\(\w+\)s|\?|\$\d+))+")
+_SPACE_RE = re.compile(r"\s+")
+_SELECT_LIST_RE = re.compile(r"^SELECT .+? FROM ")
+
+_budgets: List["QueryBudget"] = []
+_budgets_lock = threading.Lock()
+
+
+class RequestProfile:
+    def __init__(self):
+        self.queries = 0
+        self.timings = {"db": 0.0, "serialize": 0.0, "storage": 0.0}
+        self.shapes: Counter = Counter()
+
+    def server_timing(self, total: float) -> str:
+        parts = [f"db;dur={self.timings['db'] * 1000:.1f};desc=\"{self.queries} queries\""]
+        for name in ("serialize", "storage"):
+            if self.timings[name]:
+                parts.append(f"{name};dur={self.timings[name] * 1000:.1f}")
+        parts.append(f"total;dur={total * 1000:.1f}")
+        return ", ".join(parts)
+
+    def repeated_shapes(self, threshold: int) -> List[tuple]:
+        return [(shape, count) for shape, count in self.shapes.most_common() if count > threshold]
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class QueryBudget:
+    def __init__(self, max_queries: int):
+        self.max_queries = max_queries
+        self.queries = 0
+        self.statements: List[str] = []
+
+
+def statement_shape(statement: str) -> str:
+    return _PARAMS_RE.sub(r"\1, ...", _SPACE_RE.sub(" ", statement).strip())
+
+
+@contextmanager
+def timed(name: str):
+    """
+    Add the time spent in the block to the current request's Server-Timing
+    entry (serialize or storage). No-op unless profiling.
+    """
+    profile = _current.get()
+    if profile is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.timings[name] += time.perf_counter() - start
+
+
+@contextmanager
+def query_budget(max_queries: int):
+    """
+    Raise QueryBudgetExceeded if more than max_queries statements run (in any
+    thread) inside the block, e.g.
+
+        with query_budget(3):
+            client.get(f"/api/data-rooms/{data_room_id}")
+    """
+    budget = QueryBudget(max_queries)
+    with _budgets_lock:
+        _budgets.append(budget)
+    try:
+        yield budget
+    finally:
+        with _budgets_lock:
+            _budgets.remove(budget)
+    if budget.queries > max_queries:
+        raise QueryBudgetExceeded(
+            f"{budget.queries} queries, budget {max_queries}:\n" + "\n".join(budget.statements)
+        )
+
+
+def profile_engine(engine: Engine) -> None:
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if _budgets:
+            with _budgets_lock:
+                for budget in _budgets:
+                    budget.queries += 1
+                    budget.statements.append(statement_shape(statement))
+        if _current.get() is not None:
+            conn.info.setdefault("profile_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        profile = _current.get()
+        starts = conn.info.get("profile_start")
+        if profile is None or not starts:
+            return
+        profile.timings["db"] += time.perf_counter() - starts.pop()
+        profile.queries += 1
+        profile.shapes[statement_shape(statement)] += 1
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(context):
+        starts = context.connection.info.get("profile_start") if context.connection is not None else None
+        if starts:
+            starts.pop()
+
+
+class ProfilingMiddleware:
+    """
+    Pure ASGI middleware that profiles each request while SQL_PROFILING is on.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.SQL_PROFILING:
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile()
+        token = _current.set(profile)
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", profile.server_timing(time.perf_counter() - start).encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            route = getattr(scope.get("route"), "path", scope["path"])
+            for shape, count in profile.repeated_shapes(settings.SQL_PROFILING_N1_THRESHOLD):
+                shape = _SELECT_LIST_RE.sub("SELECT ... FROM ", shape)
+                logger.warning("Possible N+1 on %s %s: %sx %s", scope['method'], route, count, shape[:300])
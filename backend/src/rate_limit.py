@@ -0,0 +1,237 @@
+import asyncio
+import math
+import time
+from typing import Dict, Optional, Tuple
+import redis
+from fastapi import HTTPException, Request, status
+from config import settings
+from src import admission, cache, metrics
+from src.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Rate limiting of API requests: a token bucket per client address, route
+# class (see src/admission.py) and data room (when the path names one). The
+# address is the peer's, which uvicorn (proxy_headers, see serve.py) replaces
+# with the X-Forwarded-For address only for trusted proxies
+# (FORWARDED_ALLOW_IPS); the header itself is never read here, since clients
+# could send a new address with every request.
+#
+# The buckets live in Redis and are updated by one Lua script, so all workers
+# share them. To keep Redis off the request path, a worker takes tokens from a
+# bucket in leases of up to RATE_LIMIT_LEASE_SIZE and hands them out locally
+# for RATE_LIMIT_LEASE_SECONDS; when the bucket is empty, the worker remembers
+# until when and rejects locally until then. Most requests therefore cost a
+# dict lookup. The price is precision: a worker may spend leased tokens a
+# little after the bucket has refilled, so a burst can exceed the limit by at
+# most one lease per worker.
+#
+# When Redis is unavailable the limiter fails open to per-worker buckets with
+# the same rate.
+#
+# Applied to every API router as a dependency, so it runs after routing (and,
+# for uploads, after the body was received); admission control
+# (src/admission.py) sheds load before that.
+
+_KEY = "rate_limit:{}"
+
+# Refill, then take up to ARGV[4] tokens. Returns the tokens granted and, when
+# none were, the milliseconds until the next token.
+_TAKE_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local wanted = tonumber(ARGV[4])
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or burst
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local granted = math.min(wanted, math.floor(tokens))
+tokens = tokens - granted
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+local wait = 0
+if granted == 0 then
+    wait = math.ceil((1 - tokens) / rate * 1000)
+end
+return {granted, wait}
+"""
+
+# Local entries are pruned once there are this many
+_MAX_LOCAL_KEYS = 10000
+
+
+class _Lease:
+    __slots__ = ("tokens", "expires", "empty_until")
+
+    def __init__(self):
+        self.tokens = 0
+        self.expires = 0.0
+        self.empty_until = 0.0
+
+
+class _Bucket:
+    """
+    Per-worker token bucket, used while Redis is unavailable.
+    """
+    __slots__ = ("tokens", "ts")
+
+    def __init__(self, burst: int, now: float):
+        self.tokens = float(burst)
+        self.ts = now
+
+    def take(self, rate: float, burst: int, now: float) -> float:
+        """
+        0 if a token was taken, otherwise seconds until the next one.
+        """
+        self.tokens = min(burst, self.tokens + (now - self.ts) * rate)
+        self.ts = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / rate
+
+
+def _limits(name: str) -> Tuple[float, int]:
+    return {
+        "upload": (settings.RATE_LIMIT_UPLOAD_RATE, settings.RATE_LIMIT_UPLOAD_BURST),
+        "download": (settings.RATE_LIMIT_DOWNLOAD_RATE, settings.RATE_LIMIT_DOWNLOAD_BURST),
+        "metadata": (settings.RATE_LIMIT_METADATA_RATE, settings.RATE_LIMIT_METADATA_BURST),
+        "admin": (settings.RATE_LIMIT_ADMIN_RATE, settings.RATE_LIMIT_ADMIN_BURST),
+    }[name]
+
+
+def client_id(request: Request) -> str:
+    return request.client.host if request.client else "unknown"
+
+
+class RateLimiter:
+    """
+    Leases tokens from the shared buckets (see above). Lives on the event
+    loop; not thread-safe.
+    """
+
+    def __init__(self):
+        self._leases: Dict[str, _Lease] = {}
+        self._local: Dict[str, _Bucket] = {}
+        self._refills: Dict[str, asyncio.Future] = {}
+        self._take = None
+
+    async def acquire(self, key: str, rate: float, burst: int) -> float:
+        """
+        0 if the request may proceed, otherwise seconds until it may retry.
+        """
+        now = time.time()
+        lease = self._leases.get(key)
+        if lease is None:
+            if len(self._leases) >= _MAX_LOCAL_KEYS:
+                self._prune(now)
+            lease = self._leases[key] = _Lease()
+
+        while True:
+            if lease.tokens and now < lease.expires:
+                lease.tokens -= 1
+                metrics.rate_limit_checks.inc("local")
+                return 0
+            if now < lease.empty_until:
+                metrics.rate_limit_checks.inc("local")
+                return lease.empty_until - now
+            refill = self._refills.get(key)
+            if refill is None:
+                break
+            # Another request is already asking Redis for this key
+            await refill
+            now = time.time()
+
+        refill = self._refills[key] = asyncio.get_running_loop().create_future()
+        try:
+            granted, wait = await self._lease(key, rate, burst, now)
+        finally:
+            del self._refills[key]
+            refill.set_result(None)
+
+        if granted is None:
+            metrics.rate_limit_checks.inc("fallback")
+            bucket = self._local.get(key)
+            if bucket is None:
+                bucket = self._local[key] = _Bucket(burst, now)
+            return bucket.take(rate, burst, now)
+
+        metrics.rate_limit_checks.inc("redis")
+        if not granted:
+            lease.tokens = 0
+            lease.empty_until = now + wait / 1000
+            return wait / 1000
+        lease.tokens = granted - 1
+        lease.expires = now + settings.RATE_LIMIT_LEASE_SECONDS
+        return 0
+
+    async def _lease(self, key: str, rate: float, burst: int, now: float) -> Tuple[Optional[int], int]:
+        """
+        (tokens granted, milliseconds to wait) from Redis; (None, 0) if it
+        is unavailable.
+        """
+        client = cache.get_async_redis()
+        if client is None:
+            return None, 0
+        # Small buckets are leased one token at a time to stay exact
+        size = max(1, min(settings.RATE_LIMIT_LEASE_SIZE, burst // 4))
+        try:
+            if self._take is None:
+                self._take = client.register_script(_TAKE_SCRIPT)
+            with cache.redis_call("rate_limit_take"):
+                granted, wait = await self._take(keys=[_KEY.format(key)], args=[rate, burst, now, size])
+        except redis.RedisError as e:
+            cache.failed(e)
+            return None, 0
+        return int(granted), int(wait)
+
+    def _prune(self, now: float) -> None:
+        self._leases = {
+            key: lease for key, lease in self._leases.items()
+            if (lease.tokens and now < lease.expires) or now < lease.empty_until
+        }
+        if len(self._local) >= _MAX_LOCAL_KEYS:
+            self._local.clear()
+
+
+_limiter = RateLimiter()
+
+
+class RateLimit:
+    """
+    Dependency limiting requests per client, route class and data room.
+    With `name`, `rate` (tokens per second) and `burst` it applies its own
+    bucket instead, e.g. for a single expensive route.
+    """
+
+    def __init__(self, name: Optional[str] = None, rate: Optional[float] = None, burst: Optional[int] = None):
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+
+    async def __call__(self, request: Request) -> None:
+        if not settings.RATE_LIMIT_ENABLED:
+            return
+        if self.name is not None:
+            name, (rate, burst) = self.name, (self.rate, self.burst)
+        else:
+            name = admission.classify(request.method, request.url.path)
+            if name is None:
+                return
+            rate, burst = _limits(name)
+        data_room_id = request.path_params.get("data_room_id", "-")
+        key = f"{name}:{client_id(request)}:{data_room_id}"
+
+        wait = await _limiter.acquire(key, rate, burst)
+        if wait:
+            metrics.rate_limit_rejected.inc(name)
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many requests, please slow down",
+                headers={"Retry-After": str(max(1, math.ceil(wait)))}
+            )
+
+
+# Per route class, for the dependencies of the API routers
+limit = RateLimit()
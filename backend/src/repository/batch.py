@@ -0,0 +1,294 @@
+from collections import defaultdict
+from itertools import groupby
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from uuid import UUID, uuid4
+from sqlalchemy import delete, insert, select, text, tuple_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from fastapi import status
+from src.database.models import DataRoom, Folder, File
+from src.repository.files import remove_blobs
+from src.repository import stats, changes
+from src.schemas import BatchOperation
+from src.logger import get_logger
+
+logger = get_logger(__name__)
+
+# A batch runs in one transaction. Consecutive operations of the same kind
+# form a group that is checked against the current state with a few queries
+# and then applied with one statement (inserts with executemany, renames with
+# an UPDATE over unnested arrays, deletes with one DELETE ... IN). Groups run
+# in order, so later operations see the effect of earlier ones.
+
+_RENAME_SQL = """
+UPDATE {table}
+SET name = v.name, updated_at = now()
+FROM (SELECT unnest(CAST(:ids AS uuid[])) AS id, unnest(CAST(:names AS varchar[])) AS name) v
+WHERE {table}.id = v.id
+"""
+
+# Targets that lie below another target; deleting the outer one removes them
+_NESTED_TARGETS_SQL = """
+WITH RECURSIVE up AS (
+    SELECT id AS target, parent_folder_id AS ancestor FROM folders WHERE id = ANY(CAST(:ids AS uuid[]))
+    UNION ALL
+    SELECT up.target, f.parent_folder_id FROM up JOIN folders f ON f.id = up.ancestor
+)
+SELECT DISTINCT target FROM up WHERE ancestor = ANY(CAST(:ids AS uuid[]))
+"""
+
+
+class BatchError(Exception):
+    def __init__(self, index: int, status_code: int, detail: str):
+        super().__init__(detail)
+        self.index = index
+        self.status_code = status_code
+        self.detail = detail
+
+
+def _not_found(index: int, kind: str, entity_id) -> BatchError:
+    return BatchError(index, status.HTTP_404_NOT_FOUND, f"{kind} with ID '{entity_id}' not found")
+
+
+def _create_folders(db: Session, ops: List[Tuple[int, BatchOperation]]) -> List[UUID]:
+    parent_ids = {op.parent_folder_id for _, op in ops if op.parent_folder_id}
+    parents = {
+        row.id: row for row in db.execute(
+            select(Folder.id, Folder.data_room_id, Folder.depth).where(Folder.id.in_(parent_ids))  # type: ignore
+        )
+    }
+    room_ids = {op.data_room_id for _, op in ops if op.data_room_id}
+    rooms = set(db.execute(select(DataRoom.id).where(DataRoom.id.in_(room_ids))).scalars())  # type: ignore
+
+    rows = []
+    # (data_room_id, depth) by id, of stored parents and of folders created earlier in the group
+    placed = {parent.id: (parent.data_room_id, parent.depth or 0) for parent in parents.values()}
+    for index, op in ops:
+        if op.parent_folder_id:
+            if op.parent_folder_id not in placed:
+                raise _not_found(index, "Parent folder", op.parent_folder_id)
+            room_id, parent_depth = placed[op.parent_folder_id]
+            if op.data_room_id and op.data_room_id != room_id:
+                raise BatchError(index, status.HTTP_400_BAD_REQUEST, "Parent folder is in another data room")
+            depth = parent_depth + 1
+        else:
+            if op.data_room_id not in rooms:
+                raise _not_found(index, "Data room", op.data_room_id)
+            room_id, depth = op.data_room_id, 0
+        row = {
+            'id': op.id or uuid4(),
+            'name': op.name,
+            'depth': depth,
+            'parent_folder_id': op.parent_folder_id,
+            'data_room_id': room_id,
+        }
+        placed.setdefault(row['id'], (room_id, depth))
+        rows.append(row)
+
+    existing_ids = set(db.execute(
+        select(Folder.id).where(Folder.id.in_([row['id'] for row in rows]))  # type: ignore
+    ).scalars())
+
+    # Names must be unique among siblings (per data room for root folders)
+    nested = [(row['parent_folder_id'], row['name']) for row in rows if row['parent_folder_id']]
+    taken = set()
+    if nested:
+        taken.update(
+            (None, parent_id, name) for parent_id, name in db.execute(
+                select(Folder.parent_folder_id, Folder.name).where(
+                    tuple_(Folder.parent_folder_id, Folder.name).in_(nested)
+                )
+            )
+        )
+    roots = [row for row in rows if not row['parent_folder_id']]
+    if roots:
+        taken.update(
+            (room_id, None, name) for room_id, name in db.execute(
+                select(Folder.data_room_id, Folder.name).where(
+                    Folder.data_room_id.in_({row['data_room_id'] for row in roots}),  # type: ignore
+                    Folder.parent_folder_id.is_(None),  # type: ignore
+                    Folder.name.in_({row['name'] for row in roots})  # type: ignore
+                )
+            )
+        )
+
+    for (index, _), row in zip(ops, rows):
+        if row['id'] in existing_ids:
+            raise BatchError(index, status.HTTP_409_CONFLICT, f"A folder with ID '{row['id']}' already exists")
+        existing_ids.add(row['id'])
+        key = (None if row['parent_folder_id'] else row['data_room_id'], row['parent_folder_id'], row['name'])
+        if key in taken:
+            raise BatchError(
+                index, status.HTTP_409_CONFLICT,
+                f"A folder named '{row['name']}' already exists in this location."
+            )
+        taken.add(key)
+
+    db.execute(insert(Folder), rows)
+    for room_id, room_rows in _by_room(rows):
+        changes.record_many(db, room_id, [
+            changes.entry('folder', row['id'], parent_id=row['parent_folder_id'], name=row['name'])
+            for row in room_rows
+        ])
+    return [row['id'] for row in rows]
+
+
+def _load_targets(db: Session, model, kind: str, ops: List[Tuple[int, BatchOperation]], *columns) -> Dict[UUID, object]:
+    targets = {
+        row.id: row for row in db.execute(
+            select(model.id, model.data_room_id, *columns).where(model.id.in_([op.id for _, op in ops]))  # type: ignore
+        )
+    }
+    for index, op in ops:
+        if op.id not in targets:
+            raise _not_found(index, kind, op.id)
+    return targets
+
+
+def _rename(db: Session, model, kind: str, parent_column, ops: List[Tuple[int, BatchOperation]]) -> List[UUID]:
+    targets = _load_targets(db, model, kind, ops, parent_column, model.name)
+    parent_key = parent_column.key
+    new_names = {op.id: op.name for _, op in ops}
+
+    # Final name of every sibling: renamed ones from the batch, the others as stored
+    pairs = [(getattr(targets[op.id], parent_key), op.name) for _, op in ops]
+    siblings = db.execute(
+        select(model.id, model.data_room_id, parent_column, model.name).where(
+            parent_column.in_({parent_id for parent_id, _ in pairs if parent_id is not None}),
+            model.name.in_({name for _, name in pairs})  # type: ignore
+        )
+    ).all()
+    # Root folders are unique per data room; files outside a folder are not checked
+    if model is Folder and any(parent_id is None for parent_id, _ in pairs):
+        siblings += db.execute(
+            select(model.id, model.data_room_id, parent_column, model.name).where(
+                model.data_room_id.in_({t.data_room_id for t in targets.values()}),  # type: ignore
+                parent_column.is_(None),
+                model.name.in_({name for _, name in pairs})  # type: ignore
+            )
+        ).all()
+
+    taken = {
+        (row.data_room_id if getattr(row, parent_key) is None else None, getattr(row, parent_key), row.name)
+        for row in siblings if row.id not in new_names
+    }
+    for index, op in ops:
+        target = targets[op.id]
+        parent_id = getattr(target, parent_key)
+        if parent_id is None and model is File:
+            continue
+        key = (target.data_room_id if parent_id is None else None, parent_id, op.name)
+        if key in taken and target.name != op.name:
+            raise BatchError(
+                index, status.HTTP_409_CONFLICT,
+                f"A {kind.lower()} named '{op.name}' already exists in this location."
+            )
+        taken.add(key)
+
+    try:
+        with db.begin_nested():
+            db.execute(
+                text(_RENAME_SQL.format(table=model.__tablename__)),
+                {'ids': [str(op_id) for op_id in new_names], 'names': list(new_names.values())}
+            )
+    except IntegrityError:
+        # e.g. two folders swapping names, which the unique constraint rejects row by row
+        raise BatchError(ops[0][0], status.HTTP_409_CONFLICT, "Renames conflict with each other")
+
+    entity_type = 'folder' if model is Folder else 'file'
+    for room_id, room_targets in _by_room(list(targets.values())):
+        if model is Folder:
+            stats.touched_many(db, room_id, [t.id for t in room_targets])
+        else:
+            stats.touched_many(db, room_id, [t.folder_id for t in room_targets])
+        changes.record_many(db, room_id, [
+            changes.entry(entity_type, t.id, parent_id=getattr(t, parent_key), name=new_names[t.id])
+            for t in room_targets
+        ])
+    return [op.id for _, op in ops]
+
+
+def _delete_folders(db: Session, ops: List[Tuple[int, BatchOperation]]) -> List[UUID]:
+    targets = _load_targets(
+        db, Folder, "Folder", ops, Folder.parent_folder_id, Folder.name, Folder.file_count, Folder.total_size
+    )
+    nested = set(db.execute(
+        text(_NESTED_TARGETS_SQL), {'ids': [str(target_id) for target_id in targets]}
+    ).scalars())
+    outer = [t for t in targets.values() if t.id not in nested]
+
+    for room_id, room_targets in _by_room(outer):
+        stats.subtrees_removed(db, room_id, room_targets)
+        changes.record_many(db, room_id, [
+            changes.entry('folder', t.id, op='delete', parent_id=t.parent_folder_id, name=t.name)
+            for t in room_targets
+        ])
+    db.execute(
+        delete(Folder).where(Folder.id.in_([t.id for t in outer]))  # type: ignore
+        .execution_options(synchronize_session=False)
+    )
+    return [op.id for _, op in ops]
+
+
+def _delete_files(db: Session, ops: List[Tuple[int, BatchOperation]], blobs: List[Path]) -> List[UUID]:
+    targets = _load_targets(
+        db, File, "File", ops, File.folder_id, File.name, File.file_size, File.storage_path
+    )
+    for room_id, room_targets in _by_room(list(targets.values())):
+        removed: Dict[Optional[UUID], Tuple[int, int]] = defaultdict(lambda: (0, 0))
+        for t in room_targets:
+            files, size = removed[t.folder_id]
+            removed[t.folder_id] = (files + 1, size + t.file_size)
+        stats.files_removed(db, room_id, removed)
+        changes.record_many(db, room_id, [
+            changes.entry('file', t.id, op='delete', parent_id=t.folder_id, name=t.name)
+            for t in room_targets
+        ])
+    db.execute(
+        delete(File).where(File.id.in_(list(targets)))  # type: ignore
+        .execution_options(synchronize_session=False)
+    )
+    blobs.extend(Path(t.storage_path) for t in targets.values())
+    return [op.id for _, op in ops]
+
+
+def _by_room(items) -> List[Tuple[UUID, list]]:
+    grouped: Dict[UUID, list] = defaultdict(list)
+    for item in items:
+        room_id = item['data_room_id'] if isinstance(item, dict) else item.data_room_id
+        grouped[room_id].append(item)
+    return list(grouped.items())
+
+
+def run_batch(db: Session, operations: List[BatchOperation]) -> List[UUID]:
+    """
+    Apply the operations in order in a single transaction and commit.
+
+    Returns the id of every operation's folder/file. Raises BatchError for the
+    first operation that cannot be applied; nothing is committed then.
+    """
+    ids: List[UUID] = []
+    blobs: List[Path] = []
+    try:
+        indexed = list(enumerate(operations))
+        for op_name, group in groupby(indexed, key=lambda item: item[1].op):
+            group = list(group)
+            if op_name == 'create_folder':
+                ids += _create_folders(db, group)
+            elif op_name == 'rename_folder':
+                ids += _rename(db, Folder, "Folder", Folder.parent_folder_id, group)
+            elif op_name == 'delete_folder':
+                ids += _delete_folders(db, group)
+            elif op_name == 'rename_file':
+                ids += _rename(db, File, "File", File.folder_id, group)
+            elif op_name == 'delete_file':
+                ids += _delete_files(db, group, blobs)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    # Blobs only go once the rows are gone for good
+    remove_blobs(blobs)
+    return ids
@@ -0,0 +1,211 @@
+import json
+from datetime import timedelta
+from typing import Iterable, List, Optional
+from uuid import UUID
+from sqlalchemy import delete, event, func, insert, select, text, update
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+from src.database.models import DataRoom, Change
+from src.schemas import ChangeEntry, ChangeFeed
+from src import cache
+
+# Every mutation of a data room's tree appends to its change feed inside the
+# same transaction. Sequence numbers come from data_room.change_seq, bumped with
+# UPDATE ... RETURNING; the row lock serializes writers of one data room, so
+# the numbers are gapless and a client that has seen `seq` can ask for
+# everything after it.
+#
+# change_seq doubles as the version of the data room (ETags of the metadata
+# endpoints). It is cached in Redis once the transaction has committed.
+#
+# A folder that is created or deleted together with its contents (copy, cascade
+# delete) is recorded as a single entry: clients load the contents of a new
+# folder when it is expanded and drop the contents of a deleted one.
+
+MAX_PAGE_SIZE = 1000
+# Committed changes are announced on this Postgres channel (see src/events.py)
+NOTIFY_CHANNEL = 'data_room_changes'
+
+# Pages are cut from the raw feed in seq order (a range scan of the primary
+# key), then deduplicated within the page by _compact().
+_CHANGES_SQL = """
+SELECT seq, entity_type, entity_id, op, parent_id, name
+FROM changes
+WHERE data_room_id = CAST(:data_room_id AS uuid) AND seq > :since
+ORDER BY seq
+LIMIT :limit
+"""
+
+
+class ChangesPrunedError(Exception):
+    pass
+
+
+def entry(entity_type: str, entity_id: UUID, op: str = 'upsert', parent_id: Optional[UUID] = None,
+          name: Optional[str] = None) -> dict:
+    return {
+        'entity_type': entity_type,
+        'entity_id': entity_id,
+        'op': op,
+        'parent_id': parent_id,
+        'name': name,
+    }
+
+
+def record_many(db: Session, data_room_id: UUID, entries: Iterable[dict]) -> Optional[int]:
+    """
+    Append changes to the feed of a data room, allocating one block of sequence
+    numbers for all of them. Does not commit. Returns the last sequence number.
+    """
+    entries = list(entries)
+    if not entries:
+        return None
+
+    last_seq = db.execute(
+        update(DataRoom)
+        .where(DataRoom.id == data_room_id)  # type: ignore
+        .values(change_seq=DataRoom.change_seq + len(entries))
+        .returning(DataRoom.change_seq)
+        .execution_options(synchronize_session=False)
+    ).scalar_one()
+
+    first_seq = last_seq - len(entries) + 1
+    db.execute(insert(Change), [
+        {**e, 'data_room_id': data_room_id, 'seq': first_seq + i}
+        for i, e in enumerate(entries)
+    ])
+    _notify(db, data_room_id, first_seq, last_seq, entries)
+
+    room_deleted = any(e['entity_type'] == 'data_room' and e['op'] == 'delete' for e in entries)
+    db.info.setdefault('changed_rooms', {})[data_room_id] = None if room_deleted else last_seq
+    return last_seq
+
+
+@event.listens_for(Session, 'after_commit')
+def _cache_versions(db: Session) -> None:
+    for data_room_id, version in db.info.pop('changed_rooms', {}).items():
+        if version is None:
+            cache.forget_room_version(data_room_id)
+        else:
+            cache.set_room_version(data_room_id, version)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_versions(db: Session) -> None:
+    db.info.pop('changed_rooms', None)
+
+
+def _notify(db: Session, data_room_id: UUID, first_seq: int, last_seq: int, entries: List[dict]) -> None:
+    """
+    NOTIFY is transactional: listeners get the message only once the change is
+    committed. A single change is sent in full; for a block only its range is
+    sent (payloads are limited to 8000 bytes) and clients fetch it from the feed.
+    """
+    payload = {'data_room_id': str(data_room_id), 'first_seq': first_seq, 'seq': last_seq}
+    if len(entries) == 1:
+        e = entries[0]
+        payload.update(
+            entity_type=e['entity_type'],
+            entity_id=str(e['entity_id']),
+            op=e['op'],
+            parent_id=str(e['parent_id']) if e['parent_id'] else None,
+            name=e['name'],
+        )
+    db.execute(select(func.pg_notify(NOTIFY_CHANNEL, json.dumps(payload))))
+
+
+def record(db: Session, data_room_id: UUID, entity_type: str, entity_id: UUID, op: str = 'upsert',
+           parent_id: Optional[UUID] = None, name: Optional[str] = None) -> int:
+    """
+    Append one change to the feed of a data room. Does not commit.
+    """
+    return record_many(db, data_room_id, [entry(entity_type, entity_id, op, parent_id, name)])
+
+
+def folder_changed(db: Session, folder, op: str = 'upsert') -> int:
+    return record(db, folder.data_room_id, 'folder', folder.id, op, folder.parent_folder_id, folder.name)
+
+
+def file_changed(db: Session, file, op: str = 'upsert') -> int:
+    return record(db, file.data_room_id, 'file', file.id, op, file.folder_id, file.name)
+
+
+def current_seq(db: Session, data_room_id: UUID) -> Optional[int]:
+    """
+    Position of the latest change of a data room, None if it does not exist.
+    """
+    return db.execute(
+        select(DataRoom.change_seq).where(DataRoom.id == data_room_id)  # type: ignore
+    ).scalar_one_or_none()
+
+
+def _compact(rows: List) -> List:
+    """
+    Drop changes of an entity that a later change in the page supersedes,
+    unless a change in between names the entity as its parent: applying the
+    rest in order must never reference a folder the client does not have yet
+    (e.g. a folder renamed after its contents were created keeps its first
+    entry too).
+    """
+    kept = []
+    # Entities with a kept later change that nothing after this point refers to
+    superseded = set()
+    for row in reversed(rows):
+        if row.entity_id in superseded:
+            continue
+        kept.append(row)
+        superseded.add(row.entity_id)
+        superseded.discard(row.parent_id)
+    kept.reverse()
+    return kept
+
+
+def get_changes(db: Session, data_room_id: UUID, since: int = 0, limit: int = MAX_PAGE_SIZE) -> Optional[ChangeFeed]:
+    """
+    Changes of a data room after sequence number `since`, oldest first. Up to
+    `limit` changes are read; those superseded within the page are left out.
+
+    Returns None if the data room is not found. Raises ChangesPrunedError if
+    changes after `since` were already pruned; the client has to reload the tree.
+    """
+    try:
+        latest_seq = current_seq(db, data_room_id)
+        if latest_seq is None:
+            return None
+
+        if since < latest_seq:
+            oldest_seq = db.execute(
+                select(func.min(Change.seq)).where(Change.data_room_id == data_room_id)  # type: ignore
+            ).scalar()
+            if oldest_seq is None or oldest_seq > since + 1:
+                raise ChangesPrunedError(f"Changes after {since} are no longer available")
+
+        rows = db.execute(
+            text(_CHANGES_SQL),
+            {'data_room_id': data_room_id, 'since': since, 'limit': limit + 1}
+        ).all()
+    except SQLAlchemyError:
+        db.rollback()
+        raise
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    items: List[ChangeEntry] = [ChangeEntry.model_validate(row._mapping) for row in _compact(rows)]
+    return ChangeFeed(
+        data_room_id=data_room_id,
+        since=since,
+        next_since=rows[-1].seq if has_more else max([latest_seq] + [row.seq for row in rows]),
+        has_more=has_more,
+        items=items,
+    )
+
+
+def prune_changes(db: Session, older_than: timedelta, data_room_id: Optional[UUID] = None) -> int:
+    """
+    Delete feed entries older than the given age. Does not commit.
+    Returns the number of deleted entries.
+    """
+    stmt = delete(Change).where(Change.created_at < func.now() - older_than)  # type: ignore
+    if data_room_id is not None:
+        stmt = stmt.where(Change.data_room_id == data_room_id)  # type: ignore
+    return db.execute(stmt.execution_options(synchronize_session=False)).rowcount
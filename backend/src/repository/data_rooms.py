@@ -4,7 +4,11 @@ from sqlalchemy import select
 from sqlalchemy.orm import Session, joinedload
 from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 from src.database.models import DataRoom
-from src.schemas import DataRoomCreate
+from src.schemas import DataRoomCreate, DataRoomClone, DataRoomItem
+from src.repository.folders import copy_subtree
+from src.repository.files import remove_blobs
+from src.repository import stats, changes, shaping, listings
+from src.serialization import DataRoomRecord
 
 
 def get_all_data_rooms(db: Session):
@@ -48,6 +52,20 @@ def get_data_room(db: Session, data_room_id: UUID) -> Optional[DataRoom]:
         raise
 
 
+def get_data_room_shaped(db: Session, data_room_id: UUID, shape: shaping.Shape) -> Optional[DataRoomItem]:
+    """
+    Get a data room with only the requested fields and root-level lists (see shaping.py).
+    """
+    try:
+        data_room = shaping.load_item(db, DataRoom, DataRoomItem, shape, data_room_id)
+        if data_room is not None:
+            shaping.load_children(db, data_room, shape, data_room_id=data_room_id)
+        return data_room
+    except SQLAlchemyError:
+        db.rollback()
+        raise
+
+
 def create_data_room(db: Session, data_room: DataRoomCreate) -> DataRoom:
     """
     Create a new data room.
@@ -55,6 +73,8 @@ def create_data_room(db: Session, data_room: DataRoomCreate) -> DataRoom:
     try:
         db_data_room = DataRoom(name=data_room.name)
         db.add(db_data_room)
+        db.flush()  # flush to get db_data_room.id
+        changes.record(db, db_data_room.id, 'data_room', db_data_room.id, name=db_data_room.name)
         db.commit()
         db.refresh(db_data_room)
         return db_data_room
@@ -63,6 +83,42 @@ def create_data_room(db: Session, data_room: DataRoomCreate) -> DataRoom:
         raise
 
 
+def clone_data_room(db: Session, data_room_id: UUID, body: DataRoomClone) -> Optional[DataRoomRecord]:
+    """
+    Clone a data room (folder hierarchy and optionally files) into a new data room.
+
+    Everything is copied in one transaction with set-based inserts; copied files
+    share the stored bytes of the originals through hardlinks.
+    Returns the new data room with its whole tree as a record (read like
+    GET /data-rooms/{id}), or None if the source data room is not found.
+    """
+    stored_blobs = []
+    try:
+        if db.get(DataRoom, data_room_id) is None:
+            return None
+
+        new_data_room = DataRoom(name=body.name)
+        db.add(new_data_room)
+        db.flush()  # flush to get new_data_room.id
+
+        _, stored_blobs = copy_subtree(
+            db,
+            source_room_id=data_room_id,
+            target_room_id=new_data_room.id,
+            include_files=body.include_files
+        )
+        stats.rebuild_stats(db, new_data_room.id)
+        # Nobody can have seen the new data room yet; its feed starts after the copy
+        changes.record(db, new_data_room.id, 'data_room', new_data_room.id, name=new_data_room.name)
+        db.commit()
+    except Exception:
+        db.rollback()
+        remove_blobs(stored_blobs)
+        raise
+
+    return listings.get_data_room_tree(db, new_data_room.id)
+
+
 def delete_data_room(db: Session, data_room_id: UUID) -> str:
     """
     Delete a data room by ID.
@@ -76,6 +132,8 @@ def delete_data_room(db: Session, data_room_id: UUID) -> str:
         if data_room is None:
             return 'Data Room not found'
 
+        # The entry is removed with the data room; only its notification reaches listeners
+        changes.record(db, data_room.id, 'data_room', data_room.id, op='delete', name=data_room.name)
         db.delete(data_room)
         db.commit()
         return 'Data Room deleted'
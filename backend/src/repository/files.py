@@ -1,6 +1,7 @@
-from typing import List, Optional
+from typing import Iterable, List, Optional
 from uuid import UUID, uuid4
 from pathlib import Path
+import os
 import shutil
 from sqlalchemy import select
 from sqlalchemy.exc import SQLAlchemyError
@@ -8,23 +9,86 @@ from sqlalchemy.orm import Session
 from fastapi import UploadFile
 from src.database.models import File
 from src.schemas import FileCreate
+from src.repository import stats, quotas, changes
 from src.logger import get_logger
+from src import deadlines, metrics, profiling, tracing
+from config import settings
 
 logger = get_logger(__name__)
 
 # Storage configuration
-UPLOAD_DIR = Path("uploads")
-UPLOAD_DIR.mkdir(exist_ok=True)
+UPLOAD_DIR = Path(settings.UPLOAD_DIR)
+MAX_FILE_SIZE = 100 * 1024 * 1024  # 100MB
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+_storage_ready = False
+
+
+def init_storage() -> None:
+    """
+    Create the storage directory on first use (and in the app lifespan), not at import.
+    """
+    global _storage_ready
+    if not _storage_ready:
+        UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+        _storage_ready = True
+
+
+def store_blob(source: Path, target: Path) -> bool:
+    """
+    Put an existing file into storage without copying bytes where possible.
+
+    Hardlinks the source and falls back to a byte copy when source and storage
+    live on different devices. The source is left in place.
+    Blobs are never modified in place, so hardlinked copies can share an inode.
+    """
+    try:
+        init_storage()
+        try:
+            os.link(source, target)
+        except OSError:
+            shutil.copyfile(source, target)
+        return True
+    except OSError as e:
+        logger.warning("Failed to place %s into storage: %s", source, e)
+        return False
+
+
+def copy_to_storage(source, target) -> None:
+    """
+    Copy an upload into storage in chunks, stopping at the request deadline.
+    """
+    while True:
+        chunk = source.read(COPY_CHUNK_SIZE)
+        if not chunk:
+            break
+        deadlines.check()
+        target.write(chunk)
+
+
+def remove_blobs(paths: Iterable[Path]) -> None:
+    """
+    Best-effort removal of stored files, e.g. after a failed database write.
+    """
+    for path in paths:
+        try:
+            Path(path).unlink(missing_ok=True)
+        except OSError as e:
+            logger.warning("Failed to delete file %s: %s", path, e)
 
 
 def upload_file(
         db: Session,
         file: UploadFile,
         folder_id: UUID,
-        custom_name: str
+        custom_name: str,
+        reservation_id: Optional[UUID] = None
 ) -> Optional[File]:
     """
     Upload a PDF file and save it to disk.
+    A quota reservation (see quotas.reserve_upload) is settled in the same
+    transaction that stores the file.
     """
     # Validate file type
     if not file.filename.lower().endswith('.pdf'):
@@ -42,17 +106,23 @@ def upload_file(
 
     # Save file to disk
     try:
-        with storage_path.open("wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        init_storage()
+        with metrics.storage_duration.time("upload"), profiling.timed("storage"), tracing.span("storage.write"):
+            with storage_path.open("wb") as buffer:
+                copy_to_storage(file.file, buffer)
+    except deadlines.DeadlineExceeded:
+        remove_blobs([storage_path])
+        raise
     except OSError as e:
-        logger.error(f"Failed to save file to disk: {e}", exc_info=True)
+        logger.error("Failed to save file to disk: %s", e, exc_info=True)
         return None
     except Exception as e:
-        logger.error(f"Unexpected error during file save: {e}", exc_info=True)
+        logger.error("Unexpected error during file save: %s", e, exc_info=True)
         return None
 
     # Get file size
     file_size = storage_path.stat().st_size
+    metrics.storage_bytes.inc("upload", amount=file_size)
 
     # Use the provided custom name
     file_name = custom_name
@@ -68,7 +138,7 @@ def upload_file(
         try:
             storage_path.unlink()
         except OSError as e:
-            logger.warning(f"Failed to delete file {storage_path} after folder not found: {e}")
+            logger.warning("Failed to delete file %s after folder not found: %s", storage_path, e)
         return None  # Folder not found
 
     data_room_id = folder.data_room_id
@@ -86,7 +156,7 @@ def upload_file(
         try:
             storage_path.unlink()
         except OSError as e:
-            logger.warning(f"Failed to delete duplicate file {storage_path}: {e}")
+            logger.warning("Failed to delete duplicate file %s: %s", storage_path, e)
         # Return a special marker to indicate duplicate
         # We'll use a File object with id=None as a marker
         duplicate_marker = File(
@@ -114,6 +184,11 @@ def upload_file(
 
     try:
         db.add(new_file)
+        db.flush()  # flush to get new_file.id
+        stats.file_added(db, data_room_id, folder_id, file_size)
+        changes.file_changed(db, new_file)
+        if reservation_id is not None:
+            quotas.settle_reservation(db, reservation_id)
         db.commit()
         db.refresh(new_file)
         return new_file
@@ -123,7 +198,7 @@ def upload_file(
         try:
             storage_path.unlink()
         except OSError as e:
-            logger.warning(f"Failed to delete file {storage_path} after database error: {e}")
+            logger.warning("Failed to delete file %s after database error: %s", storage_path, e)
         raise
 
 
@@ -143,6 +218,8 @@ def update_file_name(db: Session, file_id: UUID, name: str) -> Optional[File]:
 
         if file:
             file.name = name
+            stats.touched(db, file.data_room_id, file.folder_id)
+            changes.file_changed(db, file)
             db.commit()
             db.refresh(file)
 
@@ -166,11 +243,13 @@ def delete_file(db: Session, file_id: UUID) -> Optional[File]:
             if file_path.exists():
                 file_path.unlink()
         except OSError as e:
-            logger.error(f"Failed to delete physical file {file.storage_path}: {e}")
+            logger.error("Failed to delete physical file %s: %s", file.storage_path, e)
             # Continue even if file deletion fails - we still want to remove DB record
 
         # Delete from database
         db.delete(file)
+        stats.file_removed(db, file.data_room_id, file.folder_id, file.file_size)
+        changes.file_changed(db, file, op='delete')
         db.commit()
 
     return file
@@ -1,12 +1,80 @@
-from typing import List, Optional
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List, Optional, Set, Tuple
 from uuid import UUID
-from sqlalchemy import select
+from sqlalchemy import select, text
 from sqlalchemy.orm import Session, joinedload
-from src.database.models import Folder
-from src.schemas import FolderCreate
+from src.database.models import DataRoom, Folder
+from src.schemas import FolderCreate, FolderCopy, FolderItem
+from src.repository.files import UPLOAD_DIR, store_blob, remove_blobs
+from src.repository import stats, quotas, changes, shaping, listings
+from src.serialization import FolderRecord
 from sqlalchemy.exc import SQLAlchemyError
 from fastapi import HTTPException, status
 
+COPY_WORKERS = 8
+
+# Copies a folder subtree (and its files) in one statement. The recursive CTE
+# collects the source folders, `folder_map` assigns every one of them a new id
+# (materialized once because gen_random_uuid() is volatile) and the parent ids
+# of the copies are remapped by joining the map onto itself.
+_COPY_SUBTREE_SQL = """
+WITH RECURSIVE subtree AS (
+    SELECT id, parent_folder_id, name, depth, direct_file_count, direct_size, file_count, total_size
+    FROM folders WHERE {seed}
+    UNION ALL
+    SELECT f.id, f.parent_folder_id, f.name, f.depth,
+           f.direct_file_count, f.direct_size, f.file_count, f.total_size
+    FROM folders f JOIN subtree s ON f.parent_folder_id = s.id
+),
+folder_map AS (
+    SELECT id AS old_id, gen_random_uuid() AS new_id, parent_folder_id, name, depth,
+           direct_file_count, direct_size, file_count, total_size
+    FROM subtree
+),
+new_folders AS (
+    INSERT INTO folders (id, data_room_id, parent_folder_id, name, depth, created_at, updated_at,
+                         direct_file_count, direct_size, file_count, total_size, last_modified_at)
+    SELECT m.new_id,
+           CAST(:target_room_id AS uuid),
+           COALESCE(p.new_id, CAST(:target_parent_id AS uuid)),
+           CASE WHEN p.new_id IS NULL THEN COALESCE(CAST(:root_name AS varchar), m.name) ELSE m.name END,
+           COALESCE(m.depth, 0) + :depth_offset,
+           now(), now(),
+           -- aggregates of a copy equal those of its source (or stay zero without files)
+           CASE WHEN :include_files THEN m.direct_file_count ELSE 0 END,
+           CASE WHEN :include_files THEN m.direct_size ELSE 0 END,
+           CASE WHEN :include_files THEN m.file_count ELSE 0 END,
+           CASE WHEN :include_files THEN m.total_size ELSE 0 END,
+           CASE WHEN :include_files AND m.file_count > 0 THEN now() END
+    FROM folder_map m LEFT JOIN folder_map p ON p.old_id = m.parent_folder_id
+    RETURNING id
+),
+file_map AS (
+    SELECT f.*, m.new_id AS new_folder_id,
+           :storage_prefix || gen_random_uuid()::text || '.pdf' AS new_storage_path
+    FROM files f LEFT JOIN folder_map m ON m.old_id = f.folder_id
+    WHERE :include_files
+      AND f.data_room_id = CAST(:source_room_id AS uuid)
+      AND (m.old_id IS NOT NULL OR (:include_root_files AND f.folder_id IS NULL))
+),
+new_files AS (
+    INSERT INTO files (id, data_room_id, folder_id, name, original_name, storage_path,
+                       file_size, content_type, created_at, updated_at,
+                       text_status, page_count, content_tsv)
+    SELECT gen_random_uuid(), CAST(:target_room_id AS uuid), new_folder_id, name, original_name,
+           new_storage_path, file_size, content_type, now(), now(),
+           text_status, page_count, content_tsv
+    FROM file_map
+    RETURNING id
+)
+SELECT (SELECT new_id FROM folder_map WHERE old_id = CAST(:root_id AS uuid)) AS new_root_id,
+       (SELECT count(*) FROM new_folders) AS folder_count,
+       (SELECT count(*) FROM new_files) AS file_count,
+       COALESCE((SELECT array_agg(storage_path) FROM file_map), '{{}}') AS source_paths,
+       COALESCE((SELECT array_agg(new_storage_path) FROM file_map), '{{}}') AS target_paths
+"""
+
 
 def create_folder(db: Session, folder_data: FolderCreate) -> Optional[Folder]:
     """
@@ -50,6 +118,8 @@ def create_folder(db: Session, folder_data: FolderCreate) -> Optional[Folder]:
         )
 
         db.add(new_folder)
+        db.flush()  # flush to get new_folder.id
+        changes.folder_changed(db, new_folder)
         db.commit()
         db.refresh(new_folder)
         return new_folder
@@ -77,6 +147,20 @@ def get_folder(db: Session, folder_id: UUID) -> Optional[Folder]:
         raise
 
 
+def get_folder_shaped(db: Session, folder_id: UUID, shape: shaping.Shape) -> Optional[FolderItem]:
+    """
+    Get a folder with only the requested fields and child lists (see shaping.py).
+    """
+    try:
+        folder = shaping.load_item(db, Folder, FolderItem, shape, folder_id)
+        if folder is not None:
+            shaping.load_children(db, folder, shape, folder_id=folder_id)
+        return folder
+    except SQLAlchemyError:
+        db.rollback()
+        raise
+
+
 def update_folder_name(db: Session, folder_id: UUID, name: str) -> Optional[Folder]:
     """
     Update a folder's name.
@@ -89,6 +173,8 @@ def update_folder_name(db: Session, folder_id: UUID, name: str) -> Optional[Fold
 
         if folder:
             folder.name = name
+            stats.touched(db, folder.data_room_id, folder.id)
+            changes.folder_changed(db, folder)
             db.commit()
             db.refresh(folder)
 
@@ -108,6 +194,8 @@ def delete_folder(folder_id: UUID, db: Session) -> Optional[Folder]:
         folder = result.scalar_one_or_none()
 
         if folder:
+            stats.subtree_removed(db, folder)
+            changes.folder_changed(db, folder, op='delete')
             db.delete(folder)
             db.commit()
 
@@ -115,3 +203,150 @@ def delete_folder(folder_id: UUID, db: Session) -> Optional[Folder]:
     except SQLAlchemyError:
         db.rollback()
         raise
+
+
+def copy_subtree(
+        db: Session,
+        source_room_id: UUID,
+        target_room_id: UUID,
+        root_folder_id: Optional[UUID] = None,
+        target_parent_id: Optional[UUID] = None,
+        root_name: Optional[str] = None,
+        depth_offset: int = 0,
+        include_files: bool = True
+) -> Tuple[Optional[UUID], List[Path]]:
+    """
+    Duplicate folders and files with set-based INSERT ... SELECT statements.
+
+    Copies the subtree of root_folder_id, or the whole data room (all root
+    folders and root files) when root_folder_id is None. Copied files share
+    the bytes of the originals through hardlinks.
+
+    Does not commit. Returns the id of the copied root folder (None for a
+    whole-room copy) and the stored blob paths, which the caller removes
+    again if the transaction is rolled back.
+    """
+    if root_folder_id is not None:
+        seed = "id = CAST(:root_id AS uuid)"
+    else:
+        seed = "data_room_id = CAST(:source_room_id AS uuid) AND parent_folder_id IS NULL"
+
+    row = db.execute(
+        text(_COPY_SUBTREE_SQL.format(seed=seed)),
+        {
+            'root_id': root_folder_id,
+            'source_room_id': source_room_id,
+            'target_room_id': target_room_id,
+            'target_parent_id': target_parent_id,
+            'root_name': root_name,
+            'depth_offset': depth_offset,
+            'include_files': include_files,
+            'include_root_files': root_folder_id is None,
+            'storage_prefix': f"{UPLOAD_DIR}/",
+        }
+    ).one()
+
+    sources = [Path(p) for p in row.source_paths]
+    targets = [Path(p) for p in row.target_paths]
+    if targets:
+        with ThreadPoolExecutor(max_workers=COPY_WORKERS) as pool:
+            placed = list(pool.map(store_blob, sources, targets))
+        if not all(placed):
+            remove_blobs(t for t, ok in zip(targets, placed) if ok)
+            raise OSError("Failed to link copied files into storage")
+
+    return row.new_root_id, targets
+
+
+def _copy_name(name: str, taken: Set[str]) -> str:
+    """
+    The folder name if it is free, else "<name> (copy)", "<name> (copy 2)", ...
+    with the name shortened to keep within 50 characters.
+    """
+    if name not in taken:
+        return name
+    number = 1
+    while True:
+        suffix = " (copy)" if number == 1 else f" (copy {number})"
+        candidate = name[:50 - len(suffix)] + suffix
+        if candidate not in taken:
+            return candidate
+        number += 1
+
+
+def copy_folder(db: Session, folder_id: UUID, body: FolderCopy) -> Optional[FolderRecord]:
+    """
+    Copy a folder with all nested folders (and files) in a single transaction.
+
+    The copy goes into target_parent_folder_id if given, else into the root of
+    target_data_room_id, else next to the source folder. Without a name the
+    copy keeps the source name, or "<name> (copy)", "<name> (copy 2)", ...
+    when that is taken in the target location. Raises
+    quotas.QuotaExceededError if the copy does not fit the target's quota.
+
+    Returns the copied subtree as a record (read like GET /folders/{id}, with
+    two queries however large it is), or None if the folder, target parent or
+    target data room is not found.
+    """
+    stored_blobs: List[Path] = []
+    try:
+        folder = db.get(Folder, folder_id)
+        if folder is None:
+            return None
+
+        if body.target_parent_folder_id:
+            target_parent = db.get(Folder, body.target_parent_folder_id)
+            if target_parent is None:
+                return None
+            target_room_id = target_parent.data_room_id
+            target_parent_id = target_parent.id
+            depth = (target_parent.depth or 0) + 1
+        elif body.target_data_room_id:
+            if db.get(DataRoom, body.target_data_room_id) is None:
+                return None
+            target_room_id = body.target_data_room_id
+            target_parent_id = None
+            depth = 0
+        else:
+            target_room_id = folder.data_room_id
+            target_parent_id = folder.parent_folder_id
+            depth = folder.depth or 0
+
+        # The unique constraint does not cover root folders (NULL parent), so check like create_folder
+        sibling_names = set(db.execute(
+            select(Folder.name).where(
+                Folder.data_room_id == target_room_id,  # type: ignore
+                Folder.parent_folder_id == target_parent_id  # type: ignore
+            )
+        ).scalars())
+        if body.name is None:
+            copy_name = _copy_name(folder.name, sibling_names)
+        elif body.name in sibling_names:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=f"A folder named '{body.name}' already exists in this location."
+            )
+        else:
+            copy_name = body.name
+
+        new_folder_id, stored_blobs = copy_subtree(
+            db,
+            source_room_id=folder.data_room_id,
+            target_room_id=target_room_id,
+            root_folder_id=folder.id,
+            target_parent_id=target_parent_id,
+            root_name=copy_name,
+            depth_offset=depth - (folder.depth or 0),
+            include_files=body.include_files
+        )
+        new_folder = db.get(Folder, new_folder_id)
+        stats.subtree_added(db, new_folder)
+        changes.folder_changed(db, new_folder)
+        quotas.ensure_within_quota(db, target_room_id)
+        db.commit()
+    except Exception:
+        db.rollback()
+        remove_blobs(stored_blobs)
+        raise
+
+    return listings.get_folder_tree(db, new_folder_id)
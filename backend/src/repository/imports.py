@@ -0,0 +1,381 @@
+import os
+import shutil
+import stat
+import tempfile
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from uuid import UUID, uuid4
+from sqlalchemy import insert, select
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+from src.database.models import DataRoom, Folder, File
+from src.repository.files import UPLOAD_DIR, MAX_FILE_SIZE, init_storage, store_blob, remove_blobs
+from src.repository import stats, quotas, changes
+from src.schemas import ImportSummary
+from src.logger import get_logger
+from config import settings
+
+logger = get_logger(__name__)
+
+# Rows per INSERT batch; every batch is committed so an interrupted import can resume
+BATCH_SIZE = 1000
+DEFAULT_WORKERS = 8
+EXTRACT_CHUNK_SIZE = 1024 * 1024
+INVALID_NAME_CHARS = ['/', '\\', ':', '*', '?', '"', '<', '>', '|']
+
+
+def _sanitize_name(name: str) -> str:
+    """
+    Make a file system name acceptable as a folder/file name (max 50 characters).
+    """
+    for char in INVALID_NAME_CHARS:
+        name = name.replace(char, '_')
+    return name.strip()[:50] or '_'
+
+
+def _load_child_folders(db: Session, data_room_id: UUID) -> Dict[Tuple[Optional[UUID], str], Tuple[UUID, int]]:
+    """
+    Map (parent_folder_id, name) -> (id, depth) for every folder of the data room.
+    """
+    stmt = select(Folder.parent_folder_id, Folder.name, Folder.id, Folder.depth).where(
+        Folder.data_room_id == data_room_id  # type: ignore
+    )
+    return {
+        (parent_id, name): (folder_id, depth or 0)
+        for parent_id, name, folder_id, depth in db.execute(stmt)
+    }
+
+
+def _flush_folders(db: Session, rows: List[dict], summary: ImportSummary) -> None:
+    if not rows:
+        return
+    try:
+        db.execute(insert(Folder), rows)
+        changes.record_many(db, rows[0]['data_room_id'], [
+            changes.entry('folder', row['id'], parent_id=row['parent_folder_id'], name=row['name'])
+            for row in rows
+        ])
+        db.commit()
+    except SQLAlchemyError:
+        db.rollback()
+        raise
+    summary.folders_created += len(rows)
+    rows.clear()
+
+
+def _flush_files(
+        db: Session,
+        pool: ThreadPoolExecutor,
+        rows: List[dict],
+        sources: List[Path],
+        move: bool,
+        summary: ImportSummary
+) -> None:
+    """
+    Place the blobs of a batch in parallel, then insert the rows that made it and commit.
+
+    Blobs are always hardlinked (or copied) into storage; with move=True the
+    sources are unlinked only after the batch is committed, so a failed batch
+    leaves them where they were.
+    """
+    if not rows:
+        return
+
+    # Skip names that an earlier, interrupted run already imported
+    folder_ids = {row['folder_id'] for row in rows}
+    existing_stmt = select(File.folder_id, File.name, File.storage_path).where(
+        File.folder_id.in_([f for f in folder_ids if f is not None])  # type: ignore
+    )
+    existing = {(folder_id, name): path for folder_id, name, path in db.execute(existing_stmt)}
+    if None in folder_ids:
+        root_stmt = select(File.folder_id, File.name, File.storage_path).where(
+            File.data_room_id == rows[0]['data_room_id'],  # type: ignore
+            File.folder_id.is_(None)  # type: ignore
+        )
+        existing.update({(folder_id, name): path for folder_id, name, path in db.execute(root_stmt)})
+
+    pending = []
+    imported_sources = []
+    for row, source in zip(rows, sources):
+        stored = existing.get((row['folder_id'], row['name']))
+        if stored is None:
+            pending.append((row, source))
+            continue
+        summary.files_skipped += 1
+        if move and _same_file(source, stored):
+            # Committed by a run that was stopped before it unlinked the source
+            imported_sources.append(source)
+
+    if pending:
+        data_room_id = rows[0]['data_room_id']
+        reserved_size = sum(row['file_size'] for row, _ in pending)
+        # Raises QuotaExceededError before anything of the batch is stored
+        reservation_id = quotas.reserve_files(db, data_room_id, len(pending), reserved_size)
+
+        targets = [Path(row['storage_path']) for row, _ in pending]
+        placed = list(pool.map(store_blob, [source for _, source in pending], targets))
+
+        batch = [row for (row, _), ok in zip(pending, placed) if ok]
+        summary.files_failed += len(pending) - len(batch)
+
+        try:
+            quotas.settle_reservation(db, reservation_id)
+            if batch:
+                db.execute(insert(File), batch)
+                stats.room_files_added(db, data_room_id, len(batch), sum(row['file_size'] for row in batch))
+                changes.record_many(db, data_room_id, [
+                    changes.entry('file', row['id'], parent_id=row['folder_id'], name=row['name'])
+                    for row in batch
+                ])
+            db.commit()
+        except Exception:
+            db.rollback()
+            # Rows never made it, so the blobs placed for them are orphans;
+            # the sources are untouched
+            remove_blobs([t for t, ok in zip(targets, placed) if ok])
+            quotas.release_reservation(db, reservation_id)
+            raise
+        summary.files_created += len(batch)
+        imported_sources.extend(source for (_, source), ok in zip(pending, placed) if ok)
+
+    if move:
+        remove_blobs(imported_sources)
+
+    rows.clear()
+    sources.clear()
+
+
+def _same_file(source: Path, stored: str) -> bool:
+    try:
+        return os.path.samefile(source, stored)
+    except OSError:
+        return False
+
+
+def import_directory(
+        db: Session,
+        data_room_id: UUID,
+        source_dir: Path,
+        parent_folder_id: Optional[UUID] = None,
+        workers: int = DEFAULT_WORKERS,
+        move: bool = False
+) -> Optional[ImportSummary]:
+    """
+    Import a directory tree of PDF files into a data room.
+
+    Folders mirror the directory hierarchy under the target (the data room root
+    or parent_folder_id). Rows are inserted in batches and committed per batch;
+    folders and files that already exist by name are reused/skipped, so running
+    the same import again resumes where an interrupted one stopped.
+
+    Every batch of files is checked against the data room quota and reserved
+    before its blobs are placed; quotas.QuotaExceededError stops the import
+    with the batches before it committed.
+
+    Symlinks (to files or directories) are ignored: only regular files below
+    source_dir are imported, wherever a link would point.
+
+    Blobs are hardlinked into storage by a worker pool. With move=True the
+    sources are removed once their batch is committed; a source whose blob
+    was committed by an interrupted run is removed when the run is repeated.
+    Folder and data room aggregates are rebuilt once at the end.
+    Returns None if the data room or the parent folder is not found.
+    """
+    data_room = db.get(DataRoom, data_room_id)
+    if data_room is None:
+        return None
+
+    root_depth = 0
+    if parent_folder_id:
+        parent = db.get(Folder, parent_folder_id)
+        if parent is None or parent.data_room_id != data_room_id:
+            return None
+        root_depth = (parent.depth or 0) + 1
+
+    summary = ImportSummary()
+    existing_folders = _load_child_folders(db, data_room_id)
+    # Directory path -> (folder id, depth of its children)
+    dir_folders: Dict[str, Tuple[Optional[UUID], int]] = {str(source_dir): (parent_folder_id, root_depth)}
+
+    folder_rows: List[dict] = []
+    file_rows: List[dict] = []
+    file_sources: List[Path] = []
+
+    quota_error = None
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for dirpath, dirnames, filenames in os.walk(source_dir):
+                # os.walk does not descend into them, they would become empty folders
+                dirnames[:] = sorted(d for d in dirnames if not os.path.islink(os.path.join(dirpath, d)))
+                folder_id, child_depth = dir_folders[dirpath]
+
+                for dirname in dirnames:
+                    name = _sanitize_name(dirname)
+                    key = (folder_id, name)
+                    if key in existing_folders:
+                        summary.folders_existing += 1
+                        sub_id, sub_depth = existing_folders[key]
+                    else:
+                        sub_id, sub_depth = uuid4(), child_depth
+                        existing_folders[key] = (sub_id, sub_depth)
+                        folder_rows.append({
+                            'id': sub_id,
+                            'name': name,
+                            'depth': sub_depth,
+                            'parent_folder_id': folder_id,
+                            'data_room_id': data_room_id,
+                        })
+                    dir_folders[os.path.join(dirpath, dirname)] = (sub_id, sub_depth + 1)
+
+                if len(folder_rows) >= BATCH_SIZE:
+                    _flush_folders(db, folder_rows, summary)
+
+                seen_names = set()
+                for filename in sorted(filenames):
+                    if not filename.lower().endswith('.pdf'):
+                        summary.files_ignored += 1
+                        continue
+
+                    source = Path(dirpath) / filename
+                    try:
+                        # lstat: a symlink would be linked into storage and serve its target
+                        source_stat = source.lstat()
+                    except OSError:
+                        summary.files_failed += 1
+                        continue
+                    file_size = source_stat.st_size
+                    if not stat.S_ISREG(source_stat.st_mode) or file_size == 0 or file_size > MAX_FILE_SIZE:
+                        summary.files_ignored += 1
+                        continue
+
+                    name = _sanitize_name(Path(filename).stem)
+                    if name in seen_names:
+                        summary.files_skipped += 1
+                        continue
+                    seen_names.add(name)
+
+                    file_rows.append({
+                        'id': uuid4(),
+                        'name': name,
+                        'original_name': filename[:50],
+                        'storage_path': str(UPLOAD_DIR / f"{uuid4()}.pdf"),
+                        'file_size': file_size,
+                        'content_type': 'application/pdf',
+                        'data_room_id': data_room_id,
+                        'folder_id': folder_id,
+                    })
+                    file_sources.append(source)
+
+                    if len(file_rows) >= BATCH_SIZE:
+                        # Parent folders of the batch must be in the database first
+                        _flush_folders(db, folder_rows, summary)
+                        _flush_files(db, pool, file_rows, file_sources, move, summary)
+
+            _flush_folders(db, folder_rows, summary)
+            _flush_files(db, pool, file_rows, file_sources, move, summary)
+    except quotas.QuotaExceededError as e:
+        # Stop, but leave the batches that fit with correct aggregates
+        quota_error = e
+
+    # One set-based recompute instead of per-row aggregate updates
+    try:
+        stats.rebuild_stats(db, data_room_id)
+        # The aggregates changed after the last batch, so the data room version has to move too
+        changes.record(db, data_room_id, 'data_room', data_room_id, name=data_room.name)
+        db.commit()
+    except SQLAlchemyError:
+        db.rollback()
+        raise
+    if quota_error is not None:
+        raise quota_error
+
+    logger.info(
+        "Imported %s into data room %s: %s folders, %s files created, %s skipped, %s failed",
+        source_dir, data_room_id, summary.folders_created, summary.files_created,
+        summary.files_skipped, summary.files_failed
+    )
+    return summary
+
+
+class ArchiveTooLargeError(Exception):
+    pass
+
+
+def _member_path(extract_dir: Path, filename: str) -> Optional[Path]:
+    """
+    Target of an archive member below extract_dir, dropping absolute paths,
+    drive letters and '..' components like ZipFile.extract does.
+    """
+    parts = [
+        part for part in filename.replace('\\', '/').split('/')
+        if part not in ('', '.', '..') and not part.endswith(':')
+    ]
+    if not parts:
+        return None
+    return extract_dir.joinpath(*parts)
+
+
+def _extract(zf: zipfile.ZipFile, extract_dir: Path) -> None:
+    """
+    Extract the PDF members of an archive, counting the bytes actually
+    written: declared sizes in the archive can lie, so the limits on members
+    and on extracted bytes are enforced while decompressing.
+    """
+    members = [m for m in zf.infolist() if not m.is_dir() and m.filename.lower().endswith('.pdf')]
+    if len(members) > settings.IMPORT_MAX_MEMBERS:
+        raise ArchiveTooLargeError(f"Archive has more than {settings.IMPORT_MAX_MEMBERS} PDF files")
+    if sum(m.file_size for m in members) > settings.IMPORT_MAX_BYTES:
+        raise ArchiveTooLargeError(f"Archive extracts to more than {settings.IMPORT_MAX_BYTES} bytes")
+
+    extracted = 0
+    for member in members:
+        target = _member_path(extract_dir, member.filename)
+        if target is None or member.file_size > MAX_FILE_SIZE:
+            continue
+        target.parent.mkdir(parents=True, exist_ok=True)
+        written = 0
+        with zf.open(member) as source, target.open('wb') as out:
+            while chunk := source.read(EXTRACT_CHUNK_SIZE):
+                written += len(chunk)
+                extracted += len(chunk)
+                if extracted > settings.IMPORT_MAX_BYTES:
+                    raise ArchiveTooLargeError(f"Archive extracts to more than {settings.IMPORT_MAX_BYTES} bytes")
+                if written > MAX_FILE_SIZE:
+                    break
+                out.write(chunk)
+        if written > MAX_FILE_SIZE:
+            # Larger than declared; not importable, like any file over the limit
+            target.unlink()
+
+
+def import_zip(
+        db: Session,
+        data_room_id: UUID,
+        archive,
+        parent_folder_id: Optional[UUID] = None,
+        workers: int = DEFAULT_WORKERS
+) -> Optional[ImportSummary]:
+    """
+    Import a ZIP archive (path or binary file object) of PDF files into a data room.
+
+    Only PDF members are extracted. The archive is unpacked next to the storage
+    directory so blobs can be hardlinked into storage instead of copied.
+    Raises ArchiveTooLargeError, before anything is imported, if the archive
+    has more than IMPORT_MAX_MEMBERS PDF files or extracts to more than
+    IMPORT_MAX_BYTES.
+    """
+    init_storage()
+    extract_dir = Path(tempfile.mkdtemp(prefix='.import-', dir=UPLOAD_DIR))
+    try:
+        with zipfile.ZipFile(archive) as zf:
+            _extract(zf, extract_dir)
+
+        return import_directory(
+            db, data_room_id, extract_dir,
+            parent_folder_id=parent_folder_id,
+            workers=workers
+        )
+    finally:
+        shutil.rmtree(extract_dir, ignore_errors=True)
@@ -0,0 +1,79 @@
+from typing import Dict, Iterable, List, Optional
+from uuid import UUID
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+from src.repository import reads
+from src.serialization import DataRoomRecord, FolderRecord, FileRecord
+
+# Read path for the tree endpoints. A whole subtree is loaded with one query
+# for its folders and one for its files (instead of lazy loading the children
+# of every folder, see reads.py) and assembled into plain dicts for
+# src/serialization.py.
+
+
+def _assemble(folder_rows: Iterable, file_rows: Iterable) -> tuple:
+    """
+    Nest folder and file rows. Returns the folders by id, the top-level folders
+    (whose parent is not among the rows) and the files without a folder.
+    """
+    folders: Dict[UUID, FolderRecord] = {}
+    for row in folder_rows:
+        folder = row._asdict()
+        folder['folders'] = []
+        folder['files'] = []
+        folders[folder['id']] = folder
+
+    top_folders: List[FolderRecord] = []
+    for folder in folders.values():
+        parent = folders.get(folder['parent_folder_id'])
+        if parent is not None:
+            parent['folders'].append(folder)
+        else:
+            top_folders.append(folder)
+
+    loose_files: List[FileRecord] = []
+    for row in file_rows:
+        file = row._asdict()
+        folder = folders.get(file['folder_id'])
+        if folder is not None:
+            folder['files'].append(file)
+        else:
+            loose_files.append(file)
+
+    return folders, top_folders, loose_files
+
+
+def get_folder_tree(db: Session, folder_id: UUID) -> Optional[FolderRecord]:
+    """
+    A folder with all nested folders and files, in the shape of FolderResponse.
+    Returns None if the folder is not found.
+    """
+    try:
+        folder_rows, file_rows = reads.get_folder_subtree(db, folder_id)
+    except SQLAlchemyError:
+        db.rollback()
+        raise
+
+    if not folder_rows:
+        return None
+    folders, _, _ = _assemble(folder_rows, file_rows)
+    return folders[folder_id]
+
+
+def get_data_room_tree(db: Session, data_room_id: UUID) -> Optional[DataRoomRecord]:
+    """
+    A data room with its whole folder tree and all files, in the shape of
+    DataRoomResponse. Returns None if the data room is not found.
+    """
+    try:
+        row = reads.get_data_room(db, data_room_id)
+        if row is None:
+            return None
+        folder_rows, file_rows = reads.get_data_room_contents(db, data_room_id)
+    except SQLAlchemyError:
+        db.rollback()
+        raise
+
+    data_room = row._asdict()
+    _, data_room['folders'], data_room['files'] = _assemble(folder_rows, file_rows)
+    return data_room
@@ -0,0 +1,201 @@
+from datetime import timedelta
+from typing import Optional
+from uuid import UUID, uuid4
+from sqlalchemy import delete, func, insert, or_, select, text, update
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+from src.database.models import DataRoom, Folder, QuotaReservation
+from src.schemas import DataRoomQuota
+from src.repository import changes
+
+# Usage lives on the data room row (file_count/total_size, see stats.py) and
+# uploads in flight hold a reservation (reserved_files/reserved_bytes), so a
+# quota check is a single conditional UPDATE of one row instead of a SUM over files.
+#
+# Every reservation is also a quota_reservations row, deleted when it is
+# settled or released. Reservations of uploads that died without doing either
+# (worker killed) are released by expire_reservations once they are older than
+# any upload can run (REQUEST_DEADLINE_UPLOAD); the app does so periodically
+# (src/maintenance.py), as does `manage.py rebuild-stats`.
+
+# Deletes the expired rows and subtracts them from their data rooms; one row
+# (with the number of released reservations) per data room
+_EXPIRE_SQL = """
+WITH expired AS (
+    DELETE FROM quota_reservations
+    WHERE created_at < now() - make_interval(secs => :seconds) {room_filter}
+    RETURNING data_room_id, files, bytes
+), totals AS (
+    SELECT data_room_id, count(*) AS reservations, sum(files) AS files, sum(bytes) AS bytes
+    FROM expired GROUP BY data_room_id
+)
+UPDATE data_room
+SET reserved_files = greatest(data_room.reserved_files - totals.files, 0),
+    reserved_bytes = greatest(data_room.reserved_bytes - totals.bytes, 0)
+FROM totals
+WHERE data_room.id = totals.data_room_id
+RETURNING totals.reservations
+"""
+
+
+class QuotaExceededError(Exception):
+    pass
+
+
+def _within_quota(files: int, size: int):
+    return (
+        or_(
+            DataRoom.quota_bytes.is_(None),  # type: ignore
+            DataRoom.total_size + DataRoom.reserved_bytes + size <= DataRoom.quota_bytes
+        ),
+        or_(
+            DataRoom.quota_files.is_(None),  # type: ignore
+            DataRoom.file_count + DataRoom.reserved_files + files <= DataRoom.quota_files
+        ),
+    )
+
+
+def _reserve(db: Session, where, files: int, size: int) -> Optional[UUID]:
+    """
+    Add a reservation to the counters of the data room matched by `where` (if
+    it has room) and record it as a row. Commits right away so concurrent
+    uploads see it. Returns the reservation id, None if nothing matched.
+    """
+    try:
+        stmt = (
+            update(DataRoom)
+            .where(where, *_within_quota(files, size))  # type: ignore
+            .values(
+                reserved_bytes=DataRoom.reserved_bytes + size,
+                reserved_files=DataRoom.reserved_files + files,
+            )
+            .returning(DataRoom.id)
+            .execution_options(synchronize_session=False)
+        )
+        data_room_id = db.execute(stmt).scalar_one_or_none()
+        reservation_id = None
+        if data_room_id is not None:
+            reservation_id = db.execute(
+                insert(QuotaReservation)
+                .values(id=uuid4(), data_room_id=data_room_id, files=files, bytes=size)
+                .returning(QuotaReservation.id)
+            ).scalar_one()
+        db.commit()
+    except SQLAlchemyError:
+        db.rollback()
+        raise
+    return reservation_id
+
+
+def reserve_upload(db: Session, folder_id: UUID, size: int) -> Optional[UUID]:
+    """
+    Reserve room for one file of the declared size in the data room of a folder.
+
+    Commits right away so concurrent uploads see the reservation.
+    Returns the reservation id, or None if the folder does not exist.
+    Raises QuotaExceededError if the data room has no room left.
+    """
+    room_id = select(Folder.data_room_id).where(Folder.id == folder_id).scalar_subquery()  # type: ignore
+    reservation_id = _reserve(db, DataRoom.id == room_id, 1, size)
+
+    if reservation_id is None:
+        folder_exists = db.execute(select(Folder.id).where(Folder.id == folder_id)).first()  # type: ignore
+        if folder_exists:
+            raise QuotaExceededError("Data room storage quota exceeded")
+
+    return reservation_id
+
+
+def reserve_files(db: Session, data_room_id: UUID, files: int, size: int) -> UUID:
+    """
+    Reserve room for a batch of files in a data room, e.g. a batch of a bulk
+    import before its blobs are placed. Commits right away.
+    Returns the reservation id.
+    Raises QuotaExceededError if the batch does not fit.
+    """
+    reservation_id = _reserve(db, DataRoom.id == data_room_id, files, size)
+    if reservation_id is None:
+        raise QuotaExceededError("Data room storage quota exceeded")
+    return reservation_id
+
+
+def settle_reservation(db: Session, reservation_id: UUID) -> None:
+    """
+    Drop a reservation inside the transaction that stores its files (which
+    adds them to the usage). Does not commit. A reservation that already
+    expired is not subtracted again.
+    """
+    reservation = db.execute(
+        delete(QuotaReservation)
+        .where(QuotaReservation.id == reservation_id)  # type: ignore
+        .returning(QuotaReservation.data_room_id, QuotaReservation.files, QuotaReservation.bytes)
+        .execution_options(synchronize_session=False)
+    ).one_or_none()
+    if reservation is None:
+        return
+    db.execute(
+        update(DataRoom)
+        .where(DataRoom.id == reservation.data_room_id)  # type: ignore
+        .values(
+            reserved_bytes=func.greatest(DataRoom.reserved_bytes - reservation.bytes, 0),
+            reserved_files=func.greatest(DataRoom.reserved_files - reservation.files, 0),
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+def release_reservation(db: Session, reservation_id: UUID) -> None:
+    """
+    Give back a reservation whose files were not stored.
+    """
+    try:
+        db.rollback()
+        settle_reservation(db, reservation_id)
+        db.commit()
+    except SQLAlchemyError:
+        db.rollback()
+        raise
+
+
+def expire_reservations(db: Session, older_than: timedelta, data_room_id: Optional[UUID] = None) -> int:
+    """
+    Release reservations older than the given age: their upload or import
+    batch died (worker killed) without settling or releasing them. Does not
+    commit. Returns the number of released reservations.
+    """
+    room_filter = "AND data_room_id = CAST(:data_room_id AS uuid)" if data_room_id is not None else ""
+    released = db.execute(text(_EXPIRE_SQL.format(room_filter=room_filter)), {
+        'seconds': older_than.total_seconds(),
+        'data_room_id': data_room_id,
+    }).scalars().all()
+    return sum(released)
+
+
+def ensure_within_quota(db: Session, data_room_id: UUID) -> None:
+    """
+    Check the (already updated) usage of a data room against its quota, e.g. after
+    a folder copy. Raises QuotaExceededError so the caller can roll back.
+    """
+    stmt = select(DataRoom.id).where(DataRoom.id == data_room_id, *_within_quota(0, 0))  # type: ignore
+    if db.execute(stmt).first() is None:
+        raise QuotaExceededError("Data room storage quota exceeded")
+
+
+def update_quota(db: Session, data_room_id: UUID, quota: DataRoomQuota) -> Optional[DataRoom]:
+    """
+    Set (or clear, with null values) the byte and file count limits of a data room.
+    """
+    try:
+        data_room = db.get(DataRoom, data_room_id)
+        if data_room is None:
+            return None
+
+        data_room.quota_bytes = quota.quota_bytes
+        data_room.quota_files = quota.quota_files
+        changes.record(db, data_room.id, 'data_room', data_room.id, name=data_room.name)
+        db.commit()
+        db.refresh(data_room)
+        return data_room
+    except SQLAlchemyError:
+        db.rollback()
+        raise
@@ -0,0 +1,105 @@
+from typing import Optional, Sequence, Tuple
+from uuid import UUID
+from sqlalchemy import Row, lambda_stmt, select
+from sqlalchemy.orm import Session
+from src.database.models import DataRoom, Folder, File
+
+# Read side of the hottest GET endpoints. Statements are lambda_stmt()s: the
+# lambda is analyzed once, after which SQLAlchemy finds the compiled statement
+# by the lambda's code location instead of building the statement and its
+# cache key on every call; only the closure variables are extracted as
+# parameters. Results are Core rows (immutable named tuples), so no ORM
+# identity map or attribute instrumentation is involved. Use with get_read_db.
+
+FILE_COLUMNS = (
+    File.id, File.name, File.original_name, File.storage_path, File.file_size, File.content_type,
+    File.data_room_id, File.folder_id, File.created_at, File.updated_at, File.text_status, File.page_count,
+)
+FOLDER_COLUMNS = (
+    Folder.id, Folder.name, Folder.depth, Folder.parent_folder_id, Folder.data_room_id,
+    Folder.created_at, Folder.updated_at, Folder.direct_file_count, Folder.direct_size,
+    Folder.file_count, Folder.total_size, Folder.last_modified_at,
+)
+DATA_ROOM_COLUMNS = (
+    DataRoom.id, DataRoom.name, DataRoom.created_at, DataRoom.updated_at, DataRoom.file_count,
+    DataRoom.total_size, DataRoom.last_modified_at, DataRoom.quota_bytes, DataRoom.quota_files,
+    DataRoom.change_seq,
+)
+
+
+def _subtree_ids(folder_id: UUID):
+    """
+    Recursive CTE of the ids of a folder and all folders below it.
+    """
+    subtree = select(Folder.id).where(Folder.id == folder_id).cte('subtree', recursive=True)  # type: ignore
+    return subtree.union_all(
+        select(Folder.id).join(subtree, Folder.parent_folder_id == subtree.c.id)
+    )
+
+
+def get_file(db: Session, file_id: UUID) -> Optional[Row]:
+    return db.connection().execute(lambda_stmt(
+        lambda: select(*FILE_COLUMNS).where(File.id == file_id)  # type: ignore
+    )).first()
+
+
+def get_data_room(db: Session, data_room_id: UUID) -> Optional[Row]:
+    return db.connection().execute(lambda_stmt(
+        lambda: select(*DATA_ROOM_COLUMNS).where(DataRoom.id == data_room_id)  # type: ignore
+    )).first()
+
+
+def get_folder_subtree(db: Session, folder_id: UUID) -> Tuple[Sequence[Row], Sequence[Row]]:
+    """
+    Folder rows and file rows of a folder and everything below it.
+    """
+    folders = db.connection().execute(lambda_stmt(
+        lambda: select(*FOLDER_COLUMNS).where(Folder.id.in_(select(_subtree_ids(folder_id).c.id)))  # type: ignore
+    )).all()
+    if not folders:
+        return folders, []
+    files = db.connection().execute(lambda_stmt(
+        lambda: select(*FILE_COLUMNS).where(File.folder_id.in_(select(_subtree_ids(folder_id).c.id)))  # type: ignore
+    )).all()
+    return folders, files
+
+
+def get_data_room_contents(db: Session, data_room_id: UUID) -> Tuple[Sequence[Row], Sequence[Row]]:
+    """
+    All folder rows and file rows of a data room.
+    """
+    folders = db.connection().execute(lambda_stmt(
+        lambda: select(*FOLDER_COLUMNS).where(Folder.data_room_id == data_room_id)  # type: ignore
+    )).all()
+    files = db.connection().execute(lambda_stmt(
+        lambda: select(*FILE_COLUMNS).where(File.data_room_id == data_room_id)  # type: ignore
+    )).all()
+    return folders, files
+
+
+def get_room_version(db: Session, data_room_id: UUID) -> Optional[int]:
+    return db.connection().execute(lambda_stmt(
+        lambda: select(DataRoom.change_seq).where(DataRoom.id == data_room_id)  # type: ignore
+    )).scalar_one_or_none()
+
+
+def get_folder_room_version(db: Session, folder_id: UUID) -> Optional[Row]:
+    """
+    (data_room_id, change_seq) of the data room a folder is in.
+    """
+    return db.connection().execute(lambda_stmt(
+        lambda: select(Folder.data_room_id, DataRoom.change_seq)
+        .join(DataRoom, DataRoom.id == Folder.data_room_id)  # type: ignore
+        .where(Folder.id == folder_id)  # type: ignore
+    )).first()
+
+
+def get_file_room_version(db: Session, file_id: UUID) -> Optional[Row]:
+    """
+    (data_room_id, change_seq) of the data room a file is in.
+    """
+    return db.connection().execute(lambda_stmt(
+        lambda: select(File.data_room_id, DataRoom.change_seq)
+        .join(DataRoom, DataRoom.id == File.data_room_id)  # type: ignore
+        .where(File.id == file_id)  # type: ignore
+    )).first()
@@ -0,0 +1,129 @@
+from typing import Optional
+from uuid import UUID
+from sqlalchemy import select, text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+from src.database.models import DataRoom
+from config import settings
+from src.schemas import SearchHit, SearchResponse
+
+# Name search matches folder names and file names/original names of one data
+# room by substring (ILIKE, served by the pg_trgm GIN indexes, which need at
+# least 3 characters, hence the minimum length of q); prefix matches
+# rank first, then trigram similarity. Content search matches the extracted PDF
+# text (tsvector, GIN index) ranked by ts_rank. Both share the tail that pages
+# the hits and resolves the folder path of every hit on the page in the same
+# statement by walking its ancestors.
+_NAME_HITS_SQL = """
+    SELECT 'folder' AS kind, id, name, NULL AS original_name, parent_folder_id AS folder_id,
+           name ILIKE :prefix AS is_prefix,
+           similarity(name, :q) AS score
+    FROM folders
+    WHERE data_room_id = CAST(:data_room_id AS uuid) AND name ILIKE :pattern
+    UNION ALL
+    SELECT 'file', id, name, original_name, folder_id,
+           name ILIKE :prefix OR original_name ILIKE :prefix,
+           greatest(similarity(name, :q), similarity(original_name, :q))
+    FROM files
+    WHERE data_room_id = CAST(:data_room_id AS uuid)
+      AND (name ILIKE :pattern OR original_name ILIKE :pattern)
+"""
+
+_CONTENT_HITS_SQL = """
+    SELECT 'file' AS kind, id, name, original_name, folder_id,
+           FALSE AS is_prefix,
+           ts_rank(content_tsv, query) AS score
+    FROM files, websearch_to_tsquery(CAST(:config AS regconfig), :content) AS query
+    WHERE data_room_id = CAST(:data_room_id AS uuid)
+      AND content_tsv @@ query
+      {name_filter}
+"""
+
+_SEARCH_SQL = """
+WITH RECURSIVE hits AS ({hits}),
+page AS (
+    SELECT * FROM hits
+    ORDER BY is_prefix DESC, score DESC, name, id
+    LIMIT :limit OFFSET :offset
+),
+ancestors AS (
+    SELECT p.id AS hit_id, f.parent_folder_id, f.name, 0 AS level
+    FROM page p JOIN folders f ON f.id = p.folder_id
+    UNION ALL
+    SELECT a.hit_id, f.parent_folder_id, f.name, a.level + 1
+    FROM ancestors a JOIN folders f ON f.id = a.parent_folder_id
+)
+SELECT t.total, p.kind, p.id, p.name, p.original_name, p.folder_id, p.score,
+       COALESCE(
+           (SELECT string_agg(a.name, '/' ORDER BY a.level DESC) FROM ancestors a WHERE a.hit_id = p.id),
+           ''
+       ) AS path
+FROM (SELECT count(*) AS total FROM hits) t
+LEFT JOIN page p ON TRUE
+ORDER BY p.is_prefix DESC, p.score DESC, p.name, p.id
+"""
+
+
+def _escape_like(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def search_data_room(
+        db: Session,
+        data_room_id: UUID,
+        q: Optional[str] = None,
+        content: Optional[str] = None,
+        limit: int = 50,
+        offset: int = 0
+) -> Optional[SearchResponse]:
+    """
+    Search a data room by folder/file name (q) and/or PDF content (content).
+    With both, only files whose content and name match are returned.
+    Returns None if the data room is not found.
+    """
+    escaped = _escape_like(q or '')
+    params = {
+        'data_room_id': data_room_id,
+        'q': q,
+        'pattern': f"%{escaped}%",
+        'prefix': f"{escaped}%",
+        'content': content,
+        'config': settings.TEXT_SEARCH_CONFIG,
+        'limit': limit,
+        'offset': offset,
+    }
+    if content:
+        name_filter = "AND (name ILIKE :pattern OR original_name ILIKE :pattern)" if q else ""
+        hits = _CONTENT_HITS_SQL.format(name_filter=name_filter)
+    else:
+        hits = _NAME_HITS_SQL
+
+    try:
+        rows = db.execute(text(_SEARCH_SQL.format(hits=hits)), params).all()
+    except SQLAlchemyError:
+        db.rollback()
+        raise
+
+    total = rows[0].total if rows else 0
+    if total == 0:
+        # Only pay for the existence check when there is nothing to show
+        if db.execute(select(DataRoom.id).where(DataRoom.id == data_room_id)).first() is None:  # type: ignore
+            return None
+
+    return SearchResponse(
+        total=total,
+        limit=limit,
+        offset=offset,
+        items=[
+            SearchHit(
+                kind=row.kind,
+                id=row.id,
+                name=row.name,
+                original_name=row.original_name,
+                folder_id=row.folder_id,
+                path=row.path,
+                score=row.score,
+            )
+            for row in rows if row.id is not None
+        ]
+    )
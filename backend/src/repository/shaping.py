@@ -0,0 +1,100 @@
+from typing import FrozenSet, List, NamedTuple, Optional, Type
+from uuid import UUID
+from pydantic import BaseModel
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from src.database.models import Folder, File
+from src.schemas import FolderItem, FileItem
+
+# Shaped responses (?fields= / ?include=) are read with plain column selects
+# instead of ORM entities with joined children: only the requested columns
+# are fetched, child lists that are not included are not queried at all, and
+# the rows go into the compact *Item schemas without validation.
+
+INCLUDE_CHOICES = frozenset({'folders', 'files'})
+_CHILD_LISTS = {'folders', 'files'}
+
+
+class Shape(NamedTuple):
+    include: FrozenSet[str]
+    fields: Optional[FrozenSet[str]]  # None means all fields
+
+
+def _item_fields(schema: Type[BaseModel]) -> List[str]:
+    return [name for name in schema.model_fields if name not in _CHILD_LISTS]
+
+
+def parse_shape(fields: Optional[str], include: Optional[str], schema: Type[BaseModel]) -> Shape:
+    """
+    Parse comma separated `fields` and `include` query values for a response
+    whose top-level object is `schema`. A field applies to every object of the
+    response that has it; `id` is always returned.
+    Raises ValueError for unknown names.
+    """
+    if include is None:
+        include_set = INCLUDE_CHOICES
+    else:
+        include_set = frozenset(name.strip() for name in include.split(',') if name.strip())
+        unknown = include_set - INCLUDE_CHOICES
+        if unknown:
+            raise ValueError(f"Unknown include: {', '.join(sorted(unknown))}")
+
+    if fields is None:
+        return Shape(include_set, None)
+
+    field_set = frozenset(name.strip() for name in fields.split(',') if name.strip())
+    known = set(_item_fields(schema))
+    if 'folders' in include_set:
+        known.update(_item_fields(FolderItem))
+    if 'files' in include_set:
+        known.update(_item_fields(FileItem))
+    unknown = field_set - known
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+
+    return Shape(include_set, field_set | {'id'})
+
+
+def columns(model, schema: Type[BaseModel], shape: Shape) -> list:
+    return [
+        getattr(model, name) for name in _item_fields(schema)
+        if shape.fields is None or name in shape.fields
+    ]
+
+
+def load_item(db: Session, model, schema: Type[BaseModel], shape: Shape, entity_id: UUID):
+    """
+    The selected columns of one row as a compact schema instance, None if not found.
+    """
+    row = db.execute(
+        select(*columns(model, schema, shape)).where(model.id == entity_id)  # type: ignore
+    ).first()
+    return schema.model_construct(**row._mapping) if row is not None else None
+
+
+def load_children(
+        db: Session,
+        item,
+        shape: Shape,
+        data_room_id: Optional[UUID] = None,
+        folder_id: Optional[UUID] = None
+) -> None:
+    """
+    Attach the included child folders/files of a folder (folder_id) or of the
+    root of a data room (data_room_id) to a compact item, ordered by name.
+    """
+    if 'folders' in shape.include:
+        stmt = select(*columns(Folder, FolderItem, shape)).order_by(Folder.name)
+        if folder_id is not None:
+            stmt = stmt.where(Folder.parent_folder_id == folder_id)  # type: ignore
+        else:
+            stmt = stmt.where(Folder.data_room_id == data_room_id, Folder.parent_folder_id.is_(None))  # type: ignore
+        item.folders = [FolderItem.model_construct(**row._mapping) for row in db.execute(stmt)]
+
+    if 'files' in shape.include:
+        stmt = select(*columns(File, FileItem, shape)).order_by(File.name)
+        if folder_id is not None:
+            stmt = stmt.where(File.folder_id == folder_id)  # type: ignore
+        else:
+            stmt = stmt.where(File.data_room_id == data_room_id, File.folder_id.is_(None))  # type: ignore
+        item.files = [FileItem.model_construct(**row._mapping) for row in db.execute(stmt)]
@@ -0,0 +1,225 @@
+from typing import Dict, Iterable, Optional, Tuple
+from uuid import UUID
+from sqlalchemy import case, func, select, text, update
+from sqlalchemy.orm import Session
+from src.database.models import DataRoom, Folder
+
+# Aggregates are kept up to date incrementally by the repository functions that
+# mutate folders and files (within their transaction). rebuild_stats recomputes
+# them from scratch, e.g. after a bulk import or to repair drift.
+
+_REBUILD_FOLDER_STATS_SQL = """
+WITH RECURSIVE closure AS (
+    SELECT id AS ancestor_id, id AS folder_id FROM folders WHERE {room_filter}
+    UNION ALL
+    SELECT c.ancestor_id, f.id FROM folders f JOIN closure c ON f.parent_folder_id = c.folder_id
+),
+direct AS (
+    SELECT folder_id, count(*) AS files, sum(file_size) AS bytes, max(updated_at) AS modified
+    FROM files
+    WHERE folder_id IS NOT NULL AND {room_filter}
+    GROUP BY folder_id
+),
+totals AS (
+    SELECT c.ancestor_id,
+           sum(d.files) AS files,
+           sum(d.bytes) AS bytes,
+           max(greatest(d.modified, f.updated_at)) AS modified
+    FROM closure c
+    JOIN folders f ON f.id = c.folder_id
+    LEFT JOIN direct d ON d.folder_id = c.folder_id
+    GROUP BY c.ancestor_id
+)
+UPDATE folders
+SET direct_file_count = COALESCE(d.files, 0),
+    direct_size = COALESCE(d.bytes, 0),
+    file_count = COALESCE(t.files, 0),
+    total_size = COALESCE(t.bytes, 0),
+    last_modified_at = t.modified
+FROM totals t LEFT JOIN direct d ON d.folder_id = t.ancestor_id
+WHERE folders.id = t.ancestor_id
+"""
+
+_REBUILD_ROOM_STATS_SQL = """
+UPDATE data_room
+SET file_count = s.files,
+    total_size = s.bytes,
+    last_modified_at = s.modified
+FROM (
+    SELECT r.id, count(f.id) AS files, COALESCE(sum(f.file_size), 0) AS bytes, max(f.updated_at) AS modified
+    FROM data_room r LEFT JOIN files f ON f.data_room_id = r.id
+    WHERE {room_filter}
+    GROUP BY r.id
+) s
+WHERE data_room.id = s.id
+"""
+
+
+def _ancestors(folder_id: UUID):
+    """
+    Recursive CTE of a folder and all of its ancestors.
+    """
+    return _ancestors_of([folder_id])
+
+
+def _ancestors_of(folder_ids: Iterable[UUID]):
+    """
+    Recursive CTE of some folders and all of their ancestors (may repeat ids).
+    """
+    ancestors = select(Folder.id, Folder.parent_folder_id).where(
+        Folder.id.in_(list(folder_ids))  # type: ignore
+    ).cte('ancestors', recursive=True)
+    return ancestors.union_all(
+        select(Folder.id, Folder.parent_folder_id).join(ancestors, Folder.id == ancestors.c.parent_folder_id)
+    )
+
+
+def _apply_folder_delta(db: Session, folder_id: UUID, files: int, size: int, direct: bool) -> None:
+    """
+    Add a delta to the recursive totals of a folder and all its ancestors
+    (and to the direct totals of the folder itself when direct=True).
+    """
+    ancestors = _ancestors(folder_id)
+    values = {
+        'file_count': Folder.file_count + files,
+        'total_size': Folder.total_size + size,
+        'last_modified_at': func.now(),
+    }
+    if direct:
+        values['direct_file_count'] = Folder.direct_file_count + case((Folder.id == folder_id, files), else_=0)
+        values['direct_size'] = Folder.direct_size + case((Folder.id == folder_id, size), else_=0)
+
+    db.execute(
+        update(Folder)
+        .where(Folder.id.in_(select(ancestors.c.id)))  # type: ignore
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def _apply_room_delta(db: Session, data_room_id: UUID, files: int, size: int) -> None:
+    db.execute(
+        update(DataRoom)
+        .where(DataRoom.id == data_room_id)  # type: ignore
+        .values(
+            file_count=DataRoom.file_count + files,
+            total_size=DataRoom.total_size + size,
+            last_modified_at=func.now(),
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+def file_added(db: Session, data_room_id: UUID, folder_id: Optional[UUID], size: int) -> None:
+    if folder_id is not None:
+        _apply_folder_delta(db, folder_id, 1, size, direct=True)
+    _apply_room_delta(db, data_room_id, 1, size)
+
+
+def file_removed(db: Session, data_room_id: UUID, folder_id: Optional[UUID], size: int) -> None:
+    if folder_id is not None:
+        _apply_folder_delta(db, folder_id, -1, -size, direct=True)
+    _apply_room_delta(db, data_room_id, -1, -size)
+
+
+def room_files_added(db: Session, data_room_id: UUID, files: int, size: int) -> None:
+    """
+    Add files inserted in bulk to the data room totals only, leaving the folder
+    aggregates to rebuild_stats (bulk imports).
+    """
+    _apply_room_delta(db, data_room_id, files, size)
+
+
+def subtree_added(db: Session, folder: Folder) -> None:
+    """
+    Account for a folder that arrived with contents (copy or move target).
+    folder.file_count/total_size must already hold the totals of its subtree.
+    """
+    if folder.parent_folder_id is not None:
+        _apply_folder_delta(db, folder.parent_folder_id, folder.file_count, folder.total_size, direct=False)
+    _apply_room_delta(db, folder.data_room_id, folder.file_count, folder.total_size)
+
+
+def subtree_removed(db: Session, folder: Folder) -> None:
+    """
+    Account for a folder and everything in it leaving its parent (delete or move).
+    Call before the folder is deleted, while its totals are still readable.
+    """
+    if folder.parent_folder_id is not None:
+        _apply_folder_delta(db, folder.parent_folder_id, -folder.file_count, -folder.total_size, direct=False)
+    _apply_room_delta(db, folder.data_room_id, -folder.file_count, -folder.total_size)
+
+
+def touched(db: Session, data_room_id: UUID, folder_id: Optional[UUID]) -> None:
+    """
+    Bump last_modified_at of a folder, its ancestors and the data room (renames).
+    """
+    if folder_id is not None:
+        _apply_folder_delta(db, folder_id, 0, 0, direct=False)
+    _apply_room_delta(db, data_room_id, 0, 0)
+
+
+def files_removed(db: Session, data_room_id: UUID, removed: Dict[Optional[UUID], Tuple[int, int]]) -> None:
+    """
+    Account for several files removed at once; removed maps
+    folder_id -> (number of files, bytes).
+    """
+    for folder_id, (files, size) in removed.items():
+        if folder_id is not None:
+            _apply_folder_delta(db, folder_id, -files, -size, direct=True)
+    _apply_room_delta(
+        db, data_room_id,
+        -sum(files for files, _ in removed.values()),
+        -sum(size for _, size in removed.values())
+    )
+
+
+def subtrees_removed(db: Session, data_room_id: UUID, folders: Iterable) -> None:
+    """
+    subtree_removed for several folders of one data room, none of which may
+    contain another. Deltas are summed per parent.
+    """
+    per_parent: Dict[UUID, Tuple[int, int]] = {}
+    files_total = size_total = 0
+    for folder in folders:
+        files_total += folder.file_count
+        size_total += folder.total_size
+        if folder.parent_folder_id is not None:
+            files, size = per_parent.get(folder.parent_folder_id, (0, 0))
+            per_parent[folder.parent_folder_id] = (files + folder.file_count, size + folder.total_size)
+
+    for parent_id, (files, size) in per_parent.items():
+        _apply_folder_delta(db, parent_id, -files, -size, direct=False)
+    _apply_room_delta(db, data_room_id, -files_total, -size_total)
+
+
+def touched_many(db: Session, data_room_id: UUID, folder_ids: Iterable[Optional[UUID]]) -> None:
+    """
+    touched() for several folders of one data room with one statement per table.
+    """
+    folder_ids = {folder_id for folder_id in folder_ids if folder_id is not None}
+    if folder_ids:
+        ancestors = _ancestors_of(folder_ids)
+        db.execute(
+            update(Folder)
+            .where(Folder.id.in_(select(ancestors.c.id)))  # type: ignore
+            .values(last_modified_at=func.now())
+            .execution_options(synchronize_session=False)
+        )
+    _apply_room_delta(db, data_room_id, 0, 0)
+
+
+def rebuild_stats(db: Session, data_room_id: Optional[UUID] = None) -> None:
+    """
+    Recompute folder and data room aggregates from scratch with set-based
+    statements, for one data room or for all of them. Does not commit.
+    """
+    if data_room_id is not None:
+        folder_filter = "data_room_id = CAST(:data_room_id AS uuid)"
+        room_filter = "r.id = CAST(:data_room_id AS uuid)"
+    else:
+        folder_filter = room_filter = "TRUE"
+    params = {'data_room_id': data_room_id}
+
+    db.execute(text(_REBUILD_FOLDER_STATS_SQL.format(room_filter=folder_filter)), params)
+    db.execute(text(_REBUILD_ROOM_STATS_SQL.format(room_filter=room_filter)), params)
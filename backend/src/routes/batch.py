@@ -0,0 +1,87 @@
+from fastapi import APIRouter, HTTPException, Depends, status
+from fastapi.responses import JSONResponse
+from sqlalchemy.orm import Session
+
+from src.database.db import get_db
+from src.schemas import BatchRequest, BatchResponse, BatchResult
+from src.repository import batch as repository_batch
+from src.repository.batch import BatchError
+from src import rate_limit
+
+router = APIRouter(prefix='/batch', tags=["batch"], dependencies=[Depends(rate_limit.limit)])
+
+INVALID_CHARS = ['/', '\\', ':', '*', '?', '"', '<', '>', '|']
+
+
+@router.post(
+    "",
+    response_model=BatchResponse,
+    responses={
+        400: {"model": BatchResponse},
+        404: {"model": BatchResponse},
+        409: {"model": BatchResponse},
+    }
+)
+def run_batch(
+        body: BatchRequest,
+        db: Session = Depends(get_db)
+):
+    """
+    Apply many folder/file mutations in one request and one transaction.
+
+    Operations run in order (create_folder, rename_folder, delete_folder,
+    rename_file, delete_file); a create_folder may set its own id so later
+    operations can refer to the new folder.
+
+    Parameters:
+    - body: the operations, at most 1000
+
+    Returns:
+    - committed=true and one 'ok' result per operation
+
+    Errors:
+    - If an operation fails nothing is applied. The response has the status
+      code of the failing operation and committed=false; its result is
+      'failed' with the error, earlier ones 'rolled_back' and later ones 'skipped'
+    """
+    operations = body.operations
+    try:
+        for index, op in enumerate(operations):
+            if op.name is not None and (not op.name.strip() or any(char in op.name for char in INVALID_CHARS)):
+                raise BatchError(
+                    index, status.HTTP_400_BAD_REQUEST,
+                    f"Name cannot be empty or contain: {', '.join(INVALID_CHARS)}"
+                )
+
+        ids = repository_batch.run_batch(db, operations)
+
+        return BatchResponse(
+            committed=True,
+            results=[
+                BatchResult(index=index, op=op.op, id=entity_id, status='ok')
+                for index, (op, entity_id) in enumerate(zip(operations, ids))
+            ]
+        )
+
+    except BatchError as e:
+        results = []
+        for index, op in enumerate(operations):
+            if index < e.index:
+                results.append(BatchResult(index=index, op=op.op, id=op.id, status='rolled_back'))
+            elif index == e.index:
+                results.append(BatchResult(
+                    index=index, op=op.op, id=op.id, status='failed', status_code=e.status_code, detail=e.detail
+                ))
+            else:
+                results.append(BatchResult(index=index, op=op.op, id=op.id, status='skipped'))
+        return JSONResponse(
+            status_code=e.status_code,
+            content=BatchResponse(committed=False, results=results).model_dump(mode='json')
+        )
+    except HTTPException:
+        raise
+    except Exception:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="An unexpected error occurred while applying the batch"
+        )
@@ -1,16 +1,32 @@
+import asyncio
+import zipfile
 from uuid import UUID
-from fastapi import APIRouter, HTTPException, Depends, status
+from pathlib import Path
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Depends, Query, Response, status, UploadFile, File as FastAPIFile, Form, Header
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError, SQLAlchemyError
-from fastapi_limiter.depends import RateLimiter
-from src.database.db import get_db
-from src.schemas import DataRoomResponse, DataRoomCreate, List
+from src.database.db import get_db, get_read_db, SessionLocal
+from config import settings
+from src.schemas import DataRoomItem, DataRoomResponse, DataRoomCreate, DataRoomClone, DataRoomQuota, ImportSummary, SearchResponse, ChangeFeed, List
 from src.repository import data_rooms as repository_data_rooms
+from src.repository import imports as repository_imports
+from src.repository import quotas as repository_quotas
+from src.repository import search as repository_search
+from src.repository import changes as repository_changes
+from src.repository import shaping
+from src.repository import listings as repository_listings
+from src import serialization
+from src import etags
+from src import rate_limit
+from src.events import get_broker, format_event, change_event, Subscription, TooManySubscribersError
 
-router = APIRouter(prefix='/data-rooms', tags=["data-rooms"])
+router = APIRouter(prefix='/data-rooms', tags=["data-rooms"], dependencies=[Depends(rate_limit.limit)])
 
 
-@router.get('', response_model=List[DataRoomResponse], dependencies=[Depends(RateLimiter(times=7, seconds=5))], )
+@router.get('', response_model=List[DataRoomResponse], dependencies=[Depends(rate_limit.RateLimit("list_data_rooms", rate=7 / 5, burst=7))], )
 def get_all_data_rooms(db: Session = Depends(get_db)):
     try:
         new_data_room = repository_data_rooms.get_all_data_rooms(db)
@@ -59,16 +75,90 @@ def create_data_room(
         raise
 
 
+@router.post(
+    "/{data_room_id}/clone",
+    response_model=DataRoomResponse,
+    status_code=status.HTTP_201_CREATED,
+    responses={
+        201: {"description": "Data room cloned successfully"},
+        400: {"description": "Bad request - data room name already exists"},
+        404: {"description": "Source data room not found"},
+        500: {"description": "Internal server error"}
+    }
+)
+def clone_data_room(
+        data_room_id: UUID,
+        body: DataRoomClone,
+        db: Session = Depends(get_db)
+):
+    """
+    Clone a data room as a template: copies the whole folder hierarchy and,
+    unless include_files is false, the files (sharing their stored bytes).
+    """
+    try:
+        data_room = repository_data_rooms.clone_data_room(db, data_room_id, body)
+
+        if data_room is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Data room with ID '{data_room_id}' not found"
+            )
+
+        return serialization.json_response(
+            serialization.data_room_adapter, data_room, status_code=status.HTTP_201_CREATED
+        )
+
+    except IntegrityError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"A data room with the name '{body.name}' already exists"
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="An unexpected error occurred while cloning the data room"
+        )
+
+
 @router.get("/{data_room_id}", response_model=DataRoomResponse)
 def get_data_room(
         data_room_id: UUID,
-        db: Session = Depends(get_db)
+        fields: Optional[str] = Query(None, description="Comma separated fields to return, e.g. id,name"),
+        include: Optional[str] = Query(None, description="Child lists to return: folders, files (both by default)"),
+        if_none_match: Optional[str] = Header(None),
+        db: Session = Depends(get_read_db)
 ):
     """
-    Get a data room by ID with its root-level folders and files.
+    Get a data room by ID with its root-level folders and files; folders
+    contain their subfolders and files, nested down the whole tree.
+
+    With fields and/or include, only the selected fields (of the data room and
+    of the root-level items) and child lists are loaded and returned, e.g.
+    ?include=folders&fields=id,name,file_count for a tree view.
+
+    The response carries an ETag of the data room version; send it back in
+    If-None-Match to get 304 Not Modified while nothing in the room changed.
     """
     try:
-        data_room = repository_data_rooms.get_data_room(db, data_room_id)
+        shape = None
+        if fields is not None or include is not None:
+            try:
+                shape = shaping.parse_shape(fields, include, DataRoomItem)
+            except ValueError as e:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+        version = etags.room_version(db, data_room_id)
+        data_room = None
+        if version is not None:
+            cached = etags.not_modified(if_none_match, data_room_id, version)
+            if cached is not None:
+                return cached
+            if shape is not None:
+                data_room = repository_data_rooms.get_data_room_shaped(db, data_room_id, shape)
+            else:
+                data_room = repository_listings.get_data_room_tree(db, data_room_id)
 
         if data_room is None:
             raise HTTPException(
@@ -76,7 +166,12 @@ def get_data_room(
                 detail=f"Data room with ID '{data_room_id}' not found"
             )
 
-        return data_room
+        if shape is not None:
+            response = Response(data_room.model_dump_json(exclude_unset=True), media_type="application/json")
+        else:
+            response = serialization.json_response(serialization.data_room_adapter, data_room)
+        etags.tag(response, data_room_id, version)
+        return response
 
     except HTTPException:
         raise
@@ -87,6 +182,254 @@ def get_data_room(
         )
 
 
+@router.get("/{data_room_id}/search", response_model=SearchResponse)
+def search_data_room(
+        data_room_id: UUID,
+        # Shorter patterns have no trigram the GIN indexes could use
+        q: Optional[str] = Query(None, min_length=3, max_length=100),
+        content: Optional[str] = Query(None, min_length=1, max_length=200),
+        limit: int = Query(50, ge=1, le=200),
+        offset: int = Query(0, ge=0),
+        db: Session = Depends(get_db)
+):
+    """
+    Search folders and files of a data room by name and/or document content.
+
+    q matches folder names, file names and original file names by substring
+    (case-insensitive); prefix matches rank first, then by similarity.
+    content runs a full-text query over the extracted PDF text (web search
+    syntax: words, "phrases", -excluded) and ranks by relevance. With both,
+    files must match both. Every hit carries the path of the folder it is in.
+
+    Parameters:
+    - q: Name to search for (at least 3 characters)
+    - content: Full-text query over document content
+    - limit: Page size (default 50, max 200)
+    - offset: Number of hits to skip
+
+    Errors:
+    - 400: Neither q nor content given
+    - 422: q shorter than 3 characters
+    - 404: Data room not found
+    """
+    if not q and not content:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Provide a name (q) and/or a content query"
+        )
+
+    try:
+        result = repository_search.search_data_room(
+            db, data_room_id, q=q, content=content, limit=limit, offset=offset
+        )
+
+        if result is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Data room with ID '{data_room_id}' not found"
+            )
+
+        return result
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="An unexpected error occurred while searching the data room"
+        )
+
+
+@router.get("/{data_room_id}/changes", response_model=ChangeFeed)
+def get_data_room_changes(
+        data_room_id: UUID,
+        since: int = Query(0, ge=0),
+        limit: int = Query(repository_changes.MAX_PAGE_SIZE, ge=1, le=repository_changes.MAX_PAGE_SIZE),
+        db: Session = Depends(get_db)
+):
+    """
+    Get the changes of a data room's tree after a known position, for clients
+    that keep a local copy of the tree.
+
+    Start from the change_seq of the data room response, apply the items and
+    continue with next_since (repeat while has_more). Within a page, earlier
+    changes of a folder/file are left out when a later one supersedes them and
+    nothing in between refers to it. A deleted folder implies its contents are
+    gone, a created or copied folder is listed without its contents.
+
+    Parameters:
+    - since: Last change sequence number the client has applied
+    - limit: Maximum number of changes (default and max 1000)
+
+    Errors:
+    - 404: Data room not found
+    - 410: Changes after since were pruned; reload the tree
+    """
+    try:
+        feed = repository_changes.get_changes(db, data_room_id, since=since, limit=limit)
+
+        if feed is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Data room with ID '{data_room_id}' not found"
+            )
+
+        return feed
+
+    except repository_changes.ChangesPrunedError as e:
+        raise HTTPException(status_code=status.HTTP_410_GONE, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="An unexpected error occurred while retrieving the data room changes"
+        )
+
+
+def _load_replay(data_room_id: UUID, since: Optional[int]):
+    """
+    Change position to stream from and, when resuming from `since`, the changes
+    missed in between (None if too many or no longer available).
+    Returns (None, None) if the data room does not exist.
+    """
+    db = SessionLocal()
+    try:
+        latest_seq = repository_changes.current_seq(db, data_room_id)
+        if latest_seq is None or since is None or since >= latest_seq:
+            return latest_seq, []
+        try:
+            feed = repository_changes.get_changes(db, data_room_id, since=since)
+        except repository_changes.ChangesPrunedError:
+            return latest_seq, None
+        if feed.has_more:
+            return latest_seq, None
+        return feed.next_since, feed.items
+    finally:
+        db.close()
+
+
+async def _event_stream(subscription: Subscription, start_seq: int, replay):
+    broker = get_broker()
+    try:
+        yield format_event('ready', {'seq': start_seq})
+        if replay is None:
+            # Too far behind to replay; the client reloads the tree or uses the feed
+            yield format_event('resync', {'seq': start_seq})
+        else:
+            for item in replay:
+                yield format_event('change', item.model_dump(mode='json'), item.seq)
+
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), settings.EVENTS_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": ping\n\n"
+                continue
+
+            if event is None:
+                # Dropped as a slow consumer or the listener lost its connection
+                yield format_event('resync', {'seq': start_seq})
+                return
+            if event['seq'] <= start_seq:
+                continue  # already covered by the replay
+            start_seq = event['seq']
+            yield change_event(event)
+            if event.get('entity_type') == 'data_room' and event.get('op') == 'delete':
+                return
+    finally:
+        broker.unsubscribe(subscription)
+
+
+@router.get("/{data_room_id}/events")
+async def stream_data_room_events(
+        data_room_id: UUID,
+        last_event_id: Optional[int] = Header(None, ge=0)
+):
+    """
+    Live stream (Server-Sent Events) of the changes of a data room.
+
+    Events:
+    - ready: connected; data.seq is the current change position
+    - change: one change, same fields as the items of the changes endpoint
+    - changes: a block of changes (copy, import); fetch them from the changes
+      endpoint with since=first_seq - 1
+    - resync: events were missed (slow connection, server restart); catch up
+      with the changes endpoint from the last applied seq
+
+    Every event carries its seq as the SSE id, so a reconnecting EventSource
+    sends Last-Event-ID and gets the missed changes replayed first.
+    Comment lines are sent as heartbeats on idle connections.
+
+    Errors:
+    - 404: Data room not found
+    - 503: Too many open event streams on this server
+    """
+    broker = get_broker()
+    try:
+        # Subscribe before reading the position so nothing committed in between is lost
+        subscription = broker.subscribe(data_room_id)
+    except TooManySubscribersError as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+
+    try:
+        start_seq, replay = await run_in_threadpool(_load_replay, data_room_id, last_event_id)
+    except Exception:
+        broker.unsubscribe(subscription)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="An unexpected error occurred while opening the event stream"
+        )
+
+    if start_seq is None:
+        broker.unsubscribe(subscription)
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Data room with ID '{data_room_id}' not found"
+        )
+
+    return StreamingResponse(
+        _event_stream(subscription, start_seq, replay),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.put("/{data_room_id}/quota", response_model=DataRoomResponse)
+def update_data_room_quota(
+        data_room_id: UUID,
+        body: DataRoomQuota,
+        db: Session = Depends(get_db)
+):
+    """
+    Set the storage quota of a data room.
+
+    Parameters:
+    - quota_bytes: Maximum total size of all files in bytes (null = unlimited)
+    - quota_files: Maximum number of files (null = unlimited)
+
+    Lowering a quota below the current usage blocks further uploads but keeps existing files.
+    """
+    try:
+        data_room = repository_quotas.update_quota(db, data_room_id, body)
+
+        if data_room is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Data room with ID '{data_room_id}' not found"
+            )
+
+        return repository_data_rooms.get_data_room(db, data_room_id)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="An unexpected error occurred while updating the data room quota"
+        )
+
+
 @router.delete("/{data_room_id}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_data_room(
         data_room_id: UUID,
@@ -115,3 +458,99 @@ def delete_data_room(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="An unexpected error occurred while deleting the data room"
         )
+
+
+@router.post(
+    "/{data_room_id}/import",
+    response_model=ImportSummary,
+    status_code=status.HTTP_201_CREATED,
+    responses={
+        201: {"description": "Import finished"},
+        400: {"description": "Neither or both of archive and path provided, or invalid archive"},
+        403: {"description": "Server-local path is outside of the import root"},
+        404: {"description": "Data room or parent folder not found"},
+        413: {"description": "Archive too large, or the data room storage quota is exceeded"},
+        500: {"description": "Internal server error"}
+    }
+)
+def import_into_data_room(
+        data_room_id: UUID,
+        archive: Optional[UploadFile] = FastAPIFile(None),
+        path: Optional[str] = Form(None),
+        parent_folder_id: Optional[UUID] = Form(None),
+        db: Session = Depends(get_db)
+):
+    """
+    Bulk import a folder tree of PDF files into a data room.
+
+    Provide either a ZIP archive upload or a server-local directory path
+    (below the configured IMPORT_ROOT). Existing folders are reused and files
+    with names already present are skipped, so a failed import can be re-run.
+    """
+    if (archive is None) == (path is None):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Provide either a ZIP archive or a server-local path"
+        )
+
+    try:
+        if archive is not None:
+            summary = repository_imports.import_zip(
+                db, data_room_id, archive.file,
+                parent_folder_id=parent_folder_id,
+                workers=settings.IMPORT_WORKERS
+            )
+        else:
+            if not settings.IMPORT_ROOT:
+                raise HTTPException(
+                    status_code=status.HTTP_403_FORBIDDEN,
+                    detail="Server-local imports are disabled"
+                )
+            import_root = Path(settings.IMPORT_ROOT).resolve()
+            source_dir = (import_root / path).resolve()
+            if not source_dir.is_relative_to(import_root):
+                raise HTTPException(
+                    status_code=status.HTTP_403_FORBIDDEN,
+                    detail="Import path must be inside the import root"
+                )
+            if not source_dir.is_dir():
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail=f"Directory '{path}' not found"
+                )
+            summary = repository_imports.import_directory(
+                db, data_room_id, source_dir,
+                parent_folder_id=parent_folder_id,
+                workers=settings.IMPORT_WORKERS
+            )
+
+        if summary is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Data room '{data_room_id}' or parent folder not found"
+            )
+
+        return summary
+
+    except zipfile.BadZipFile:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Uploaded archive is not a valid ZIP file"
+        )
+    except repository_imports.ArchiveTooLargeError as e:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=str(e)
+        )
+    except repository_quotas.QuotaExceededError:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail="Data room storage quota exceeded; the files imported before the limit was reached were kept"
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="An unexpected error occurred while importing into the data room"
+        )
@@ -1,13 +1,17 @@
+from typing import Optional
 from uuid import UUID
 from pathlib import Path
-from fastapi import APIRouter, HTTPException, Depends, status, UploadFile, File as FastAPIFile
-from fastapi.responses import FileResponse as FastAPIFileResponse
+from fastapi import APIRouter, HTTPException, Depends, Header, Request, Response, status, UploadFile, File as FastAPIFile
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 
-from src.database.db import get_db
+from src.database.db import get_db, get_read_db
 from src.schemas import FileResponse, FileUpdate
 from src.repository import files as repository_files
+from src.repository import quotas as repository_quotas
+from src.repository import reads
+from src.text_index import get_indexer
+from src import deadlines, etags, metrics, rate_limit, serialization, tracing
 from src.logger import get_logger
 
 import os
@@ -15,11 +19,19 @@ import os
 logger = get_logger(__name__)
 IS_PRODUCTION = os.getenv("ENVIRONMENT") == "production"
 
-router = APIRouter(prefix='/files', tags=["files"])
+router = APIRouter(prefix='/files', tags=["files"], dependencies=[Depends(rate_limit.limit)])
+
+
+def _content_length(request: Request) -> int:
+    try:
+        return int(request.headers.get("content-length", 0))
+    except ValueError:
+        return 0
 
 
 @router.post("/upload", response_model=FileResponse, status_code=status.HTTP_201_CREATED)
 def upload_file(
+        request: Request,
         file: UploadFile = FastAPIFile(...),
         name: str = FastAPIFile(...),
         folder_id: UUID = FastAPIFile(...),
@@ -66,7 +78,7 @@ def upload_file(
             )
 
         # Validate file size (max 100MB)
-        max_file_size = 100 * 1024 * 1024  # 100MB
+        max_file_size = repository_files.MAX_FILE_SIZE
         file.file.seek(0, 2)
         file_size = file.file.tell()
         file.file.seek(0)
@@ -83,7 +95,31 @@ def upload_file(
                 detail="File is empty. Please upload a valid PDF file"
             )
 
-        uploaded_file = repository_files.upload_file(db, file, folder_id, name)
+        # Reserve quota before anything is stored. The declared Content-Length
+        # (whole multipart body) is an upper bound of the file size.
+        declared_size = max(_content_length(request), file_size)
+        try:
+            reservation_id = repository_quotas.reserve_upload(db, folder_id, declared_size)
+        except repository_quotas.QuotaExceededError:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail="Data room storage quota exceeded"
+            )
+
+        if reservation_id is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Folder with ID '{folder_id}' not found"
+            )
+
+        try:
+            uploaded_file = repository_files.upload_file(db, file, folder_id, name, reservation_id=reservation_id)
+        except Exception:
+            repository_quotas.release_reservation(db, reservation_id)
+            raise
+
+        if uploaded_file is None or uploaded_file.content_type == "duplicate":
+            repository_quotas.release_reservation(db, reservation_id)
 
         if uploaded_file is None:
             raise HTTPException(
@@ -92,12 +128,15 @@ def upload_file(
             )
 
         if uploaded_file.content_type == "duplicate":
-            db.rollback()
             raise HTTPException(
                 status_code=status.HTTP_409_CONFLICT,
                 detail=f"A file named '{name}.pdf' already exists in this folder. Please choose a different name or delete the existing file first."
             )
 
+        # Text extraction runs in the background; if the queue is full the file
+        # stays 'pending' until the backfill command picks it up
+        get_indexer().submit(uploaded_file.id, uploaded_file.storage_path)
+
         return uploaded_file
     except SQLAlchemyError as e:
         raise HTTPException(
@@ -107,16 +146,19 @@ def upload_file(
 @router.get("/{file_id}", response_model=FileResponse)
 def get_file(
         file_id: UUID,
-        db: Session = Depends(get_db)
+        if_none_match: Optional[str] = Header(None),
+        db: Session = Depends(get_read_db)
 ):
     """
     Get file metadata by ID.
 
     Parameters:
     - file_id: UUID of the file (required)
+    - If-None-Match header: ETag of an earlier response (optional)
 
     Returns:
     - 200: File metadata retrieved successfully
+    - 304: Nothing in the data room changed since the ETag was issued
 
     Errors:
     - 404: File not found
@@ -124,7 +166,13 @@ def get_file(
     - 500: Unexpected server error
     """
     try:
-        file = repository_files.get_file(db, file_id)
+        version = etags.file_version(db, file_id)
+        file = None
+        if version is not None:
+            cached = etags.not_modified(if_none_match, *version)
+            if cached is not None:
+                return cached
+            file = reads.get_file(db, file_id)
 
         if file is None:
             raise HTTPException(
@@ -132,14 +180,16 @@ def get_file(
                 detail=f"File with ID '{file_id}' not found"
             )
 
-        return file
+        response = serialization.json_response(serialization.file_adapter, file._asdict())
+        etags.tag(response, *version)
+        return response
 
     except HTTPException:
         raise
     except Exception as e:
         # Log detailed error for debugging
         logger.error(
-            f"Unexpected error retrieving file {file_id}: {str(e)}",
+            "Unexpected error retrieving file %s: %s", file_id, e,
             exc_info=True,
             extra={"file_id": str(file_id)}
         )
@@ -175,13 +225,16 @@ def download_file(
 
         # Check if file exists on disk
         file_path = Path(file.storage_path)
-        if not file_path.exists():
+        with tracing.span("storage.stat"):
+            exists = file_path.exists()
+        if not exists:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"File '{file.original_name}' not found on server. It may have been deleted."
             )
 
-        return FastAPIFileResponse(
+        metrics.storage_bytes.inc("download", amount=file.file_size)
+        return deadlines.DeadlineFileResponse(
             path=file.storage_path,
             media_type="application/pdf",
             filename=file.original_name
@@ -1,14 +1,21 @@
+from typing import Optional
 from uuid import UUID
 
-from fastapi import APIRouter, HTTPException, Depends, status
+from fastapi import APIRouter, HTTPException, Depends, Header, Query, Response, status
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
 
-from src.database.db import get_db
-from src.schemas import FolderResponse, FolderCreate, FolderUpdate
+from src.database.db import get_db, get_read_db
+from src.schemas import FolderItem, FolderResponse, FolderCreate, FolderUpdate, FolderCopy
 from src.repository import folders as repository_folders
+from src.repository import shaping
+from src.repository import listings as repository_listings
+from src import serialization
+from src.repository.quotas import QuotaExceededError
+from src import etags
+from src import rate_limit
 
-router = APIRouter(prefix='/folders', tags=["folders"])
+router = APIRouter(prefix='/folders', tags=["folders"], dependencies=[Depends(rate_limit.limit)])
 
 
 @router.post(
@@ -77,27 +84,51 @@ def create_folder(
 )
 def get_folder(
         folder_id: UUID,
-        db: Session = Depends(get_db)
+        fields: Optional[str] = Query(None, description="Comma separated fields to return, e.g. id,name"),
+        include: Optional[str] = Query(None, description="Child lists to return: folders, files (both by default)"),
+        if_none_match: Optional[str] = Header(None),
+        db: Session = Depends(get_read_db)
 ):
     """
-    Get a folder by ID with its immediate subfolders and files.
+    Get a folder by ID with its subfolders and files, nested down the whole subtree.
 
     Use this endpoint to expand a folder in the UI tree view.
     For the initial data room view, use GET /api/data-rooms/{data_room_id} instead.
 
     Parameters:
     - folder_id: UUID of the folder (required)
+    - fields: Comma separated fields of the folder and its children to return (optional, id is always returned)
+    - include: Child lists to return, "folders" and/or "files" (optional, both by default)
+    - If-None-Match header: ETag of an earlier response (optional)
 
     Returns:
     - 200: Folder retrieved successfully with subfolders and files
+    - 304: Nothing in the data room changed since the ETag was issued
 
     Errors:
+    - 400: Unknown field or include name
     - 404: Folder not found
     - 422: Invalid UUID format
     - 500: Unexpected server error
     """
     try:
-        folder = repository_folders.get_folder(db, folder_id)
+        shape = None
+        if fields is not None or include is not None:
+            try:
+                shape = shaping.parse_shape(fields, include, FolderItem)
+            except ValueError as e:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+        version = etags.folder_version(db, folder_id)
+        folder = None
+        if version is not None:
+            cached = etags.not_modified(if_none_match, *version)
+            if cached is not None:
+                return cached
+            if shape is not None:
+                folder = repository_folders.get_folder_shaped(db, folder_id, shape)
+            else:
+                folder = repository_listings.get_folder_tree(db, folder_id)
 
         if folder is None:
             raise HTTPException(
@@ -105,7 +136,12 @@ def get_folder(
                 detail=f"Folder with ID '{folder_id}' not found"
             )
 
-        return folder
+        if shape is not None:
+            response = Response(folder.model_dump_json(exclude_unset=True), media_type="application/json")
+        else:
+            response = serialization.json_response(serialization.folder_adapter, folder)
+        etags.tag(response, *version)
+        return response
 
     except HTTPException as e:
         raise
@@ -141,7 +177,6 @@ def update_folder_name(
     - 500: Unexpected server error
     """
     try:
-        print('body',body)
         name = body.name
         # Validate folder name
         if not name or not name.strip():
@@ -241,3 +276,72 @@ def delete_folder(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="An unexpected error occurred while deleting the folder"
         )
+
+
+@router.post(
+    "/{folder_id}/copy",
+    response_model=FolderResponse,
+    status_code=status.HTTP_201_CREATED,
+    responses={
+        201: {"description": "Folder copied successfully"},
+        400: {"description": "Invalid folder name"},
+        404: {"description": "Folder, target folder or target data room not found"},
+        409: {"description": "A folder with the same name already exists in the target location"},
+        413: {"description": "Target data room storage quota exceeded"},
+        500: {"description": "Internal server error"}
+    }
+)
+def copy_folder(
+        folder_id: UUID,
+        body: FolderCopy,
+        db: Session = Depends(get_db)
+):
+    """
+    Copy a folder with all nested folders and files.
+
+    The copy is placed into target_parent_folder_id, into the root of
+    target_data_room_id, or next to the source folder when neither is given.
+    Copied files share the stored bytes of the originals.
+
+    Parameters:
+    - folder_id: UUID of the folder to copy (required)
+    - name: Name of the copy (optional, defaults to the source folder name,
+      or "<name> (copy)", "<name> (copy 2)", ... if that is taken)
+    - include_files: Copy the files as well (default true)
+    """
+    try:
+        if body.name is not None:
+            invalid_chars = ['/', '\\', ':', '*', '?', '"', '<', '>', '|']
+            if not body.name.strip() or len(body.name) > 50 or any(char in body.name for char in invalid_chars):
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"Folder name must be 1-50 characters and cannot contain: {', '.join(invalid_chars)}"
+                )
+
+        folder = repository_folders.copy_folder(db, folder_id, body)
+
+        if folder is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Folder with ID '{folder_id}' or the copy target not found"
+            )
+
+        return serialization.json_response(serialization.folder_adapter, folder, status_code=status.HTTP_201_CREATED)
+
+    except IntegrityError:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="A folder with the same name already exists in the target location"
+        )
+    except QuotaExceededError:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail="Data room storage quota exceeded"
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="An unexpected error occurred while copying the folder"
+        )
@@ -1,6 +1,6 @@
 from datetime import datetime
-from typing import List, Optional
-from pydantic import BaseModel
+from typing import List, Literal, Optional
+from pydantic import BaseModel, Field, model_validator
 from uuid import UUID
 
 
@@ -14,15 +14,30 @@ class DataRoomCreate(DataRoomModel):
     details: str
 
 
+class DataRoomClone(DataRoomModel):
+    include_files: bool = True
+
+
 class DataRoomResponse(DataRoomModel):
     id: UUID
     created_at: datetime
     updated_at: datetime
+    file_count: int = 0
+    total_size: int = 0
+    last_modified_at: Optional[datetime] = None
+    quota_bytes: Optional[int] = None
+    quota_files: Optional[int] = None
+    change_seq: int = 0  # position in the change feed this state corresponds to
 
     folders: Optional[List["FolderResponse"]] = []
     files: Optional[List["FileResponse"]] = []
 
 
+class DataRoomQuota(BaseModel):
+    quota_bytes: Optional[int] = Field(None, ge=0)
+    quota_files: Optional[int] = Field(None, ge=0)
+
+
 # ------------------- Folder Schemas -------------------
 
 class FolderModel(BaseModel):
@@ -41,10 +56,22 @@ class FolderUpdate(BaseModel):
     name: str
 
 
+class FolderCopy(BaseModel):
+    target_parent_folder_id: Optional[UUID] = None
+    target_data_room_id: Optional[UUID] = None
+    name: Optional[str] = None
+    include_files: bool = True
+
+
 class FolderResponse(FolderModel):
     id: UUID
     created_at: datetime
     updated_at: datetime
+    direct_file_count: int = 0
+    direct_size: int = 0
+    file_count: int = 0
+    total_size: int = 0
+    last_modified_at: Optional[datetime] = None
 
     folders: Optional[List["FolderResponse"]] = []
     files: Optional[List["FileResponse"]] = []
@@ -75,11 +102,162 @@ class FileResponse(FileBase):
     id: UUID
     created_at: datetime
     updated_at: datetime
+    text_status: str = "pending"
+    page_count: Optional[int] = None
 
     class Config:
         from_attributes = True
 
 
+# ------------------- Shaped (?fields= / ?include=) Schemas -------------------
+# Every field is optional; responses are dumped with exclude_unset, so only the
+# selected fields are sent.
+
+class FileItem(BaseModel):
+    id: UUID
+    name: Optional[str] = None
+    original_name: Optional[str] = None
+    storage_path: Optional[str] = None
+    file_size: Optional[int] = None
+    content_type: Optional[str] = None
+    data_room_id: Optional[UUID] = None
+    folder_id: Optional[UUID] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    text_status: Optional[str] = None
+    page_count: Optional[int] = None
+
+
+class FolderItem(BaseModel):
+    id: UUID
+    name: Optional[str] = None
+    depth: Optional[int] = None
+    parent_folder_id: Optional[UUID] = None
+    data_room_id: Optional[UUID] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    direct_file_count: Optional[int] = None
+    direct_size: Optional[int] = None
+    file_count: Optional[int] = None
+    total_size: Optional[int] = None
+    last_modified_at: Optional[datetime] = None
+
+    folders: Optional[List["FolderItem"]] = None
+    files: Optional[List[FileItem]] = None
+
+
+class DataRoomItem(BaseModel):
+    id: UUID
+    name: Optional[str] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    file_count: Optional[int] = None
+    total_size: Optional[int] = None
+    last_modified_at: Optional[datetime] = None
+    quota_bytes: Optional[int] = None
+    quota_files: Optional[int] = None
+    change_seq: Optional[int] = None
+
+    folders: Optional[List[FolderItem]] = None
+    files: Optional[List[FileItem]] = None
+
+
+# ------------------- Batch Schemas -------------------
+
+BatchOp = Literal['create_folder', 'rename_folder', 'delete_folder', 'rename_file', 'delete_file']
+
+
+class BatchOperation(BaseModel):
+    op: BatchOp
+    # Target of renames/deletes; for create_folder an optional client-chosen id,
+    # so later operations of the same batch can use the new folder as parent
+    id: Optional[UUID] = None
+    name: Optional[str] = Field(None, min_length=1, max_length=50)
+    parent_folder_id: Optional[UUID] = None
+    data_room_id: Optional[UUID] = None
+
+    @model_validator(mode='after')
+    def check_fields(self):
+        if self.op == 'create_folder':
+            if self.name is None:
+                raise ValueError("create_folder needs a name")
+            if self.parent_folder_id is None and self.data_room_id is None:
+                raise ValueError("create_folder needs a parent_folder_id or a data_room_id")
+        else:
+            if self.id is None:
+                raise ValueError(f"{self.op} needs an id")
+            if self.op.startswith('rename') and self.name is None:
+                raise ValueError(f"{self.op} needs a name")
+        return self
+
+
+class BatchRequest(BaseModel):
+    operations: List[BatchOperation] = Field(..., min_length=1, max_length=1000)
+
+
+class BatchResult(BaseModel):
+    index: int
+    op: BatchOp
+    id: Optional[UUID] = None
+    status: Literal['ok', 'failed', 'rolled_back', 'skipped']
+    status_code: Optional[int] = None
+    detail: Optional[str] = None
+
+
+class BatchResponse(BaseModel):
+    committed: bool
+    results: List[BatchResult] = []
+
+
+# ------------------- Import Schemas -------------------
+
+class ImportSummary(BaseModel):
+    folders_created: int = 0
+    folders_existing: int = 0
+    files_created: int = 0
+    files_skipped: int = 0
+    files_ignored: int = 0
+    files_failed: int = 0
+
+
+# ------------------- Search Schemas -------------------
+
+class SearchHit(BaseModel):
+    kind: str  # "folder" or "file"
+    id: UUID
+    name: str
+    original_name: Optional[str] = None
+    folder_id: Optional[UUID] = None  # parent folder of the hit
+    path: str  # folder path of the hit, e.g. "parent/child"
+    score: float
+
+
+class SearchResponse(BaseModel):
+    total: int
+    limit: int
+    offset: int
+    items: List[SearchHit] = []
+
+
+# ------------------- Change Feed Schemas -------------------
+
+class ChangeEntry(BaseModel):
+    seq: int
+    entity_type: str  # "data_room", "folder" or "file"
+    entity_id: UUID
+    op: str  # "upsert" or "delete"
+    parent_id: Optional[UUID] = None  # parent folder of a folder, folder of a file
+    name: Optional[str] = None
+
+
+class ChangeFeed(BaseModel):
+    data_room_id: UUID
+    since: int
+    next_since: int  # pass as `since` to get the following changes
+    has_more: bool
+    items: List[ChangeEntry] = []
+
+
 # To handle forward references in nested relationships
 FolderResponse.update_forward_refs()
 DataRoomResponse.update_forward_refs()
@@ -0,0 +1,75 @@
+from datetime import datetime
+from typing import List, Optional
+from uuid import UUID
+from fastapi import Response
+from pydantic import TypeAdapter
+from typing_extensions import TypedDict
+from src import profiling
+
+# Fast JSON path for large read responses. The repository builds plain dicts
+# from Core rows and these adapters encode them in one pass in pydantic-core,
+# without validating ORM objects into response models first. The shapes match
+# FileResponse / FolderResponse / DataRoomResponse, which stay the documented
+# response models of the endpoints.
+
+
+class FileRecord(TypedDict):
+    id: UUID
+    name: str
+    original_name: str
+    storage_path: str
+    file_size: int
+    content_type: Optional[str]
+    data_room_id: UUID
+    folder_id: Optional[UUID]
+    created_at: Optional[datetime]
+    updated_at: Optional[datetime]
+    text_status: str
+    page_count: Optional[int]
+
+
+class FolderRecord(TypedDict):
+    id: UUID
+    name: str
+    depth: Optional[int]
+    parent_folder_id: Optional[UUID]
+    data_room_id: UUID
+    created_at: Optional[datetime]
+    updated_at: Optional[datetime]
+    direct_file_count: int
+    direct_size: int
+    file_count: int
+    total_size: int
+    last_modified_at: Optional[datetime]
+    folders: List["FolderRecord"]
+    files: List[FileRecord]
+
+
+class DataRoomRecord(TypedDict):
+    id: UUID
+    name: str
+    created_at: Optional[datetime]
+    updated_at: Optional[datetime]
+    file_count: int
+    total_size: int
+    last_modified_at: Optional[datetime]
+    quota_bytes: Optional[int]
+    quota_files: Optional[int]
+    change_seq: int
+    folders: List[FolderRecord]
+    files: List[FileRecord]
+
+
+# Built once at import; building an adapter compiles its serializer
+file_adapter = TypeAdapter(FileRecord)
+folder_adapter = TypeAdapter(FolderRecord)
+data_room_adapter = TypeAdapter(DataRoomRecord)
+
+
+def json_response(adapter: TypeAdapter, value, status_code: int = 200) -> Response:
+    """
+    Encode a record with its adapter into a raw response (no response_model pass).
+    """
+    with profiling.timed("serialize"):
+        body = adapter.dump_json(value)
+    return Response(body, status_code=status_code, media_type="application/json")
@@ -0,0 +1,278 @@
+import multiprocessing
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, List, Tuple
+from uuid import UUID
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from src.repository import changes
+from config import settings
+from src.logger import get_logger
+
+logger = get_logger(__name__)
+
+# tsvector values are limited to 1MB, so very long documents are cut off
+MAX_TEXT_CHARS = 500_000
+PROGRESS_LOG_EVERY = 500
+# How often dispatchers waiting on an extraction check whether the indexer stops
+STOP_POLL_SECONDS = 0.5
+
+_STORE_TEXT_SQL = """
+UPDATE files
+SET content_tsv = to_tsvector(CAST(:config AS regconfig), :content),
+    page_count = :page_count,
+    text_status = 'indexed'
+WHERE id = :file_id
+RETURNING id, data_room_id, folder_id, name
+"""
+
+_MARK_FAILED_SQL = """
+UPDATE files SET text_status = 'failed' WHERE id = :file_id
+RETURNING id, data_room_id, folder_id, name
+"""
+
+
+def extract_pdf_text(path: str) -> Tuple[str, int]:
+    """
+    Extract the text and page count of a PDF. Runs in a worker process.
+    """
+    from pypdf import PdfReader
+
+    reader = PdfReader(path)
+    parts = []
+    length = 0
+    for page in reader.pages:
+        page_text = page.extract_text() or ''
+        parts.append(page_text)
+        length += len(page_text)
+        if length >= MAX_TEXT_CHARS:
+            break
+    # NUL characters are not allowed in Postgres text values
+    content = '\n'.join(parts)[:MAX_TEXT_CHARS].replace('\x00', '')
+    return content, len(reader.pages)
+
+
+class _Stopped(Exception):
+    pass
+
+
+class TextIndexer:
+    """
+    Background pipeline that extracts PDF text in worker processes and stores
+    it as a tsvector on the file row.
+
+    Work is taken from a bounded queue by `workers` dispatcher threads, each of
+    which owns one worker process and keeps exactly one extraction running in
+    it, so CPU use and memory stay bounded no matter how many files are
+    waiting. When the queue is full, submit() either blocks (backfill) or drops
+    the job (requests); dropped files keep text_status='pending' and are picked
+    up by the backfill command.
+
+    An extraction that runs past `timeout` (a PDF the parser hangs on) is not
+    retried: its worker process is killed and replaced, so it cannot keep the
+    CPU busy. Stopping kills running extractions the same way; their files stay
+    pending.
+    """
+
+    def __init__(
+            self,
+            session_factory: Callable[[], Session],
+            workers: int = settings.TEXT_INDEX_WORKERS,
+            queue_size: int = settings.TEXT_INDEX_QUEUE_SIZE,
+            max_attempts: int = settings.TEXT_INDEX_MAX_ATTEMPTS,
+            timeout: float = settings.TEXT_INDEX_TIMEOUT
+    ):
+        self.session_factory = session_factory
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.timeout = timeout
+        self._queue: "queue.Queue[Tuple[UUID, str]]" = queue.Queue(maxsize=queue_size)
+        self._pools: List[ProcessPoolExecutor] = []
+        self._threads = []
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+        self._counts = {'submitted': 0, 'dropped': 0, 'indexed': 0, 'failed': 0, 'retried': 0, 'timed_out': 0}
+
+    @property
+    def running(self) -> bool:
+        return bool(self._threads)
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self._stopping.clear()
+        self._pools = [self._new_pool() for _ in range(self.workers)]
+        self._threads = [
+            threading.Thread(target=self._run, args=(slot,), name=f"text-indexer-{slot}", daemon=True)
+            for slot in range(self.workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    @staticmethod
+    def _new_pool() -> ProcessPoolExecutor:
+        # spawn: forking a process that runs threads (web server, SQLAlchemy pool) is unsafe
+        return ProcessPoolExecutor(
+            max_workers=1,
+            mp_context=multiprocessing.get_context('spawn'),
+            max_tasks_per_child=100
+        )
+
+    def _recycle(self, slot: int) -> None:
+        """
+        Kill the worker process of a slot (whatever it is running) and give the
+        slot a fresh one, unless the indexer is stopping.
+        """
+        pool = self._pools[slot]
+        # ProcessPoolExecutor cannot cancel a running task, so kill its process
+        for process in list((getattr(pool, '_processes', None) or {}).values()):
+            process.kill()
+        pool.shutdown(wait=False, cancel_futures=True)
+        if not self._stopping.is_set():
+            self._pools[slot] = self._new_pool()
+
+    def stop(self, wait: bool = True) -> None:
+        """
+        Stop the pipeline. With wait=True, queued jobs are finished first.
+        """
+        if not self.running:
+            return
+        if wait:
+            self._queue.join()
+        self._stopping.set()
+        # Dispatchers notice within STOP_POLL_SECONDS and kill running extractions
+        for thread in self._threads:
+            thread.join()
+        for pool in self._pools:
+            pool.shutdown(wait=True, cancel_futures=True)
+        self._pools = []
+        self._threads = []
+
+    def submit(self, file_id: UUID, storage_path: str, block: bool = False) -> bool:
+        """
+        Queue a file for text extraction. Returns False if it was not queued.
+        """
+        if not self.running:
+            return False
+        try:
+            self._queue.put((file_id, storage_path), block=block)
+        except queue.Full:
+            self._count('dropped')
+            return False
+        self._count('submitted')
+        return True
+
+    def progress(self) -> Dict[str, int]:
+        with self._lock:
+            counts = dict(self._counts)
+        counts['queued'] = self._queue.qsize()
+        return counts
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self._counts[key] += 1
+            done = self._counts['indexed'] + self._counts['failed']
+        if key in ('indexed', 'failed') and done % PROGRESS_LOG_EVERY == 0:
+            logger.info("Text indexing progress: %s", self.progress())
+
+    def _run(self, slot: int) -> None:
+        while not self._stopping.is_set():
+            try:
+                file_id, storage_path = self._queue.get(timeout=STOP_POLL_SECONDS)
+            except queue.Empty:
+                continue
+            try:
+                self._index(slot, file_id, storage_path)
+            except _Stopped:
+                pass
+            except Exception as e:
+                logger.error("Text indexing of file %s crashed: %s", file_id, e, exc_info=True)
+            finally:
+                self._queue.task_done()
+
+    def _extract(self, slot: int, storage_path: str) -> Tuple[str, int]:
+        """
+        Run one extraction in the worker process of a slot. Raises TimeoutError
+        past self.timeout and _Stopped when the indexer stops, after killing
+        the worker in both cases.
+        """
+        future = self._pools[slot].submit(extract_pdf_text, storage_path)
+        deadline = time.monotonic() + self.timeout
+        while True:
+            try:
+                return future.result(timeout=max(min(STOP_POLL_SECONDS, deadline - time.monotonic()), 0))
+            except TimeoutError:
+                if self._stopping.is_set():
+                    self._recycle(slot)
+                    raise _Stopped()
+                if time.monotonic() >= deadline:
+                    self._recycle(slot)
+                    raise
+
+    def _index(self, slot: int, file_id: UUID, storage_path: str) -> None:
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                content, page_count = self._extract(slot, storage_path)
+                break
+            except BrokenProcessPool as e:
+                # The worker died (e.g. a PDF crashed the parser)
+                self._recycle(slot)
+                error, retryable = e, True
+            except TimeoutError:
+                # The same PDF would hang again
+                self._count('timed_out')
+                error, retryable = f"timed out after {self.timeout}s", False
+            except OSError as e:
+                error, retryable = e, True
+            except Exception as e:
+                # Parser errors of a malformed PDF will not go away by retrying
+                error, retryable = e, False
+
+            if self._stopping.is_set():
+                raise _Stopped()
+            if not retryable or attempt == self.max_attempts:
+                logger.warning("Text extraction of file %s failed after %s attempts: %s", file_id, attempt, error)
+                self._store(_MARK_FAILED_SQL, {'file_id': file_id})
+                self._count('failed')
+                return
+            self._count('retried')
+            self._stopping.wait(2 ** (attempt - 1))
+
+        self._store(_STORE_TEXT_SQL, {
+            'file_id': file_id,
+            'config': settings.TEXT_SEARCH_CONFIG,
+            'content': content,
+            'page_count': page_count,
+        })
+        self._count('indexed')
+
+    def _store(self, sql: str, params: dict) -> None:
+        db = self.session_factory()
+        try:
+            file = db.execute(text(sql), params).one_or_none()
+            if file is not None:
+                # text_status/page_count are part of the file's metadata
+                changes.file_changed(db, file)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+
+_indexer = None
+
+
+def get_indexer() -> TextIndexer:
+    """
+    The process-wide indexer used by the API (started and stopped in the app lifespan).
+    """
+    global _indexer
+    if _indexer is None:
+        from src.database.db import SessionLocal
+        _indexer = TextIndexer(SessionLocal)
+    return _indexer
@@ -0,0 +1,383 @@
+import atexit
+import functools
+import importlib
+import inspect
+import json
+import os
+import pkgutil
+import queue
+import random
+import threading
+import time
+import urllib.request
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from config import settings
+from src.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Lightweight request tracing. A sampled request (TRACE_SAMPLE_RATE, or an
+# incoming W3C traceparent with the sampled flag while TRACE_SAMPLE_RATE is
+# above 0) gets a root span; spans for
+# repository calls, SQL statements, storage I/O and Redis calls nest under it
+# through a contextvar (which FastAPI copies into the threadpool of sync
+# handlers). Unsampled requests have no current span, so every instrumentation
+# point costs one contextvar lookup.
+#
+# Finished spans are exported in batches from a background thread, either as
+# JSON lines to TRACE_FILE (rotated to one backup at TRACE_FILE_MAX_BYTES) or
+# as OTLP/HTTP JSON to TRACE_OTLP_ENDPOINT.
+
+_current: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "start_ns", "end_ns", "attributes", "error")
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str] = None, attributes: Optional[dict] = None):
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.attributes = attributes or {}
+        self.error = None
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_ns": self.start_ns,
+            "duration_ms": round((self.end_ns - self.start_ns) / 1_000_000, 3),
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+# ------------------- Export -------------------
+
+class JsonlExporter:
+    """
+    Appends spans to a JSON lines file. Once it reaches max_bytes it is renamed
+    to <path>.1 (replacing the previous one), so the two files together stay
+    below about twice max_bytes.
+    """
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+
+    def export(self, spans: List[Span]) -> None:
+        data = "".join(json.dumps(span.to_dict(), default=str) + "\n" for span in spans)
+        try:
+            size = os.path.getsize(self.path)
+        except FileNotFoundError:
+            size = 0
+        if size and size + len(data) > self.max_bytes:
+            os.replace(self.path, f"{self.path}.1")
+        with open(self.path, "a") as f:
+            f.write(data)
+
+
+class OtlpJsonExporter:
+    """
+    Posts spans to an OTLP/HTTP collector (e.g. http://localhost:4318/v1/traces)
+    in the OTLP JSON encoding.
+    """
+
+    def __init__(self, endpoint: str, service_name: str = "data-rooms"):
+        self.endpoint = endpoint
+        self.service_name = service_name
+
+    def _otlp_span(self, span: Span) -> dict:
+        return {
+            "traceId": span.trace_id,
+            "spanId": span.span_id,
+            "parentSpanId": span.parent_id or "",
+            "name": span.name,
+            "startTimeUnixNano": str(span.start_ns),
+            "endTimeUnixNano": str(span.end_ns),
+            "attributes": [
+                {"key": key, "value": {"stringValue": str(value)}} for key, value in span.attributes.items()
+            ],
+            "status": {"code": 2, "message": span.error} if span.error else {},
+        }
+
+    def export(self, spans: List[Span]) -> None:
+        body = {"resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": self.service_name}}]},
+            "scopeSpans": [{"scope": {"name": __name__}, "spans": [self._otlp_span(span) for span in spans]}],
+        }]}
+        request = urllib.request.Request(
+            self.endpoint, data=json.dumps(body).encode(), headers={"Content-Type": "application/json"}
+        )
+        with urllib.request.urlopen(request, timeout=5):
+            pass
+
+
+class BatchSpanProcessor:
+    """
+    Buffers finished spans (dropping them when TRACE_QUEUE_SIZE is reached) and
+    exports them from a daemon thread every TRACE_EXPORT_INTERVAL seconds or
+    once TRACE_BATCH_SIZE spans are waiting.
+    """
+
+    def __init__(self, exporter, queue_size: int, batch_size: int, interval: float):
+        self.exporter = exporter
+        self.batch_size = batch_size
+        self.interval = interval
+        self.dropped = 0
+        self._queue: queue.Queue = queue.Queue(queue_size)
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+        self._thread.start()
+
+    def on_end(self, span: Span) -> None:
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            batch = []
+            deadline = time.monotonic() + self.interval
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get(timeout=max(deadline - time.monotonic(), 0.001)))
+                except queue.Empty:
+                    break
+            if batch:
+                self._export(batch)
+
+    def shutdown(self) -> None:
+        """
+        Stop the export thread and export what is still buffered.
+        """
+        self._stopped.set()
+        self._thread.join(timeout=self.interval + 5)
+        self.flush()
+
+    def flush(self) -> None:
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if batch:
+            self._export(batch)
+
+    def _export(self, batch: List[Span]) -> None:
+        try:
+            self.exporter.export(batch)
+        except Exception as e:
+            logger.warning("Exporting %s spans failed: %s", len(batch), e)
+
+
+_processor: Optional[BatchSpanProcessor] = None
+_processor_lock = threading.Lock()
+
+
+def get_processor() -> BatchSpanProcessor:
+    global _processor
+    with _processor_lock:
+        if _processor is None:
+            if settings.TRACE_OTLP_ENDPOINT:
+                exporter = OtlpJsonExporter(settings.TRACE_OTLP_ENDPOINT)
+            else:
+                exporter = JsonlExporter(settings.TRACE_FILE, settings.TRACE_FILE_MAX_BYTES)
+            _processor = BatchSpanProcessor(
+                exporter, settings.TRACE_QUEUE_SIZE, settings.TRACE_BATCH_SIZE, settings.TRACE_EXPORT_INTERVAL
+            )
+            atexit.register(_processor.shutdown)
+    return _processor
+
+
+# ------------------- Spans -------------------
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+
+def start_span(name: str, attributes: Optional[dict] = None) -> Optional[Span]:
+    """
+    A child of the current span, None when the request is not traced.
+    Finish it with end_span().
+    """
+    parent = _current.get()
+    if parent is None:
+        return None
+    return Span(name, parent.trace_id, parent.span_id, attributes)
+
+
+def end_span(span: Span, error: Optional[BaseException] = None) -> None:
+    span.end_ns = time.time_ns()
+    if error is not None:
+        span.error = f"{type(error).__name__}: {error}"
+    get_processor().on_end(span)
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """
+    Trace the block as a child of the current span (no-op when not traced).
+    """
+    child = start_span(name, attributes)
+    if child is None:
+        yield None
+        return
+    token = _current.set(child)
+    try:
+        yield child
+    except BaseException as e:
+        end_span(child, e)
+        raise
+    else:
+        end_span(child)
+    finally:
+        _current.reset(token)
+
+
+def traced(name: Optional[str] = None):
+    """
+    Decorator tracing every call of a sync function as a span.
+    """
+
+    def decorator(fn):
+        span_name = name or f"{fn.__module__.rsplit('.', 1)[-1]}.{fn.__name__}"
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if _current.get() is None:
+                return fn(*args, **kwargs)
+            with span(span_name):
+                return fn(*args, **kwargs)
+
+        wrapper.__traced__ = True
+        return wrapper
+
+    return decorator
+
+
+def instrument_repository() -> None:
+    """
+    Wrap the public functions of every src.repository module with traced().
+    Callers that look functions up on the module (repository_files.get_file,
+    and calls within the module) get the traced version.
+    """
+    import src.repository
+    for info in pkgutil.iter_modules(src.repository.__path__):
+        module = importlib.import_module(f"src.repository.{info.name}")
+        for attr, value in list(vars(module).items()):
+            if (
+                not attr.startswith("_") and inspect.isfunction(value) and value.__module__ == module.__name__
+                and not inspect.isgeneratorfunction(value) and not getattr(value, "__traced__", False)
+            ):
+                setattr(module, attr, traced()(value))
+
+
+def instrument_engine(engine: Engine) -> None:
+    """
+    A span per SQL statement of a traced request.
+    """
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        child = start_span("sql", {"db.statement": statement[:500]})
+        if child is not None:
+            conn.info.setdefault("trace_spans", []).append(child)
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        spans = conn.info.get("trace_spans")
+        if spans:
+            end_span(spans.pop())
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(context):
+        spans = context.connection.info.get("trace_spans") if context.connection is not None else None
+        if spans:
+            end_span(spans.pop(), context.original_exception)
+
+
+# ------------------- HTTP -------------------
+
+def _parse_traceparent(value: bytes) -> Optional[tuple]:
+    """
+    (trace id, parent span id) of a sampled W3C traceparent header.
+    """
+    parts = value.decode("latin-1").strip().split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    try:
+        sampled = int(parts[3], 16) & 1
+    except ValueError:
+        return None
+    return (parts[1], parts[2]) if sampled else None
+
+
+class TracingMiddleware:
+    """
+    Pure ASGI middleware starting the root span of sampled requests. The time
+    after the response headers (streamed bodies, e.g. downloads) is its own
+    http.response.body span.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        # With tracing disabled an incoming sampled flag is ignored too, so
+        # clients cannot make the server write spans
+        if not settings.TRACE_SAMPLE_RATE:
+            await self.app(scope, receive, send)
+            return
+        remote = None
+        traceparent = dict(scope["headers"]).get(b"traceparent")
+        if traceparent is not None:
+            remote = _parse_traceparent(traceparent)
+        if remote is None and random.random() >= settings.TRACE_SAMPLE_RATE:
+            await self.app(scope, receive, send)
+            return
+
+        trace_id, parent_id = remote or (os.urandom(16).hex(), None)
+        root = Span(f"{scope['method']} {scope['path']}", trace_id, parent_id, {"http.method": scope["method"]})
+        state: Dict[str, Optional[Span]] = {"body": None}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                root.attributes["http.status_code"] = message["status"]
+                message = {**message, "headers": list(message.get("headers", [])) + [
+                    (b"traceparent", f"00-{trace_id}-{root.span_id}-01".encode())
+                ]}
+                state["body"] = Span("http.response.body", trace_id, root.span_id)
+            await send(message)
+
+        token = _current.set(root)
+        error = None
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            _current.reset(token)
+            if state["body"] is not None:
+                end_span(state["body"])
+            route = getattr(scope.get("route"), "path", None)
+            if route:
+                root.name = f"{scope['method']} {route}"
+                root.attributes["http.route"] = route
+            end_span(root, error)
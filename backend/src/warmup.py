@@ -0,0 +1,94 @@
+import time
+from uuid import uuid4
+from sqlalchemy import select, text
+from config import settings
+from src.database.db import ReadSessionLocal, get_engine
+from src.database.models import DataRoom
+from src.repository import listings, reads
+from src import etags
+from src.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Optional warm-up in the app lifespan (WARMUP_ENABLED), before the worker
+# accepts connections: the first requests then find open pool connections,
+# compiled statements, the room versions in Redis and the data of the busiest
+# rooms in the Postgres buffer cache, instead of paying for all of it.
+
+# Larger rooms are only versioned, their trees would make startup too slow
+_MAX_TREE_FILES = 20000
+
+
+def open_connections(count: int) -> int:
+    """
+    Fill the pool with up to `count` connections (at most the pool size).
+    """
+    engine = get_engine()
+    connections = []
+    try:
+        for _ in range(min(count, engine.pool.size())):
+            connection = engine.connect()
+            connection.execute(text("SELECT 1"))
+            connections.append(connection)
+    finally:
+        for connection in connections:
+            connection.close()
+    return len(connections)
+
+
+def compile_statements() -> None:
+    """
+    Run the hot read statements once with an unknown id, which fills the
+    compiled statement cache without reading much.
+    """
+    db = ReadSessionLocal()
+    try:
+        missing = uuid4()
+        reads.get_file(db, missing)
+        reads.get_data_room(db, missing)
+        reads.get_room_version(db, missing)
+        reads.get_folder_room_version(db, missing)
+        reads.get_file_room_version(db, missing)
+        listings.get_folder_tree(db, missing)
+        db.rollback()
+    finally:
+        db.close()
+
+
+def load_rooms(count: int) -> int:
+    """
+    Cache the versions of the most recently changed data rooms and read the
+    trees of those that are not too large.
+    """
+    db = ReadSessionLocal()
+    try:
+        rows = db.execute(
+            select(DataRoom.id, DataRoom.file_count)
+            .order_by(DataRoom.last_modified_at.desc().nulls_last())
+            .limit(count)
+        ).all()
+        for data_room_id, file_count in rows:
+            etags.room_version(db, data_room_id)
+            if file_count <= _MAX_TREE_FILES:
+                listings.get_data_room_tree(db, data_room_id)
+            db.rollback()
+        return len(rows)
+    finally:
+        db.close()
+
+
+def warm_up() -> None:
+    """
+    Best effort: a failure is logged and the worker starts anyway.
+    """
+    started = time.perf_counter()
+    try:
+        connections = open_connections(settings.WARMUP_CONNECTIONS)
+        compile_statements()
+        rooms = load_rooms(settings.WARMUP_ROOMS)
+    except Exception as e:
+        logger.warning("Warm-up failed: %s", e)
+        return
+    logger.info(
+        "Warmed up %s connections and %s data rooms in %.2fs", connections, rooms, time.perf_counter() - started
+    )
@@ -0,0 +1,7 @@
+from benchmarks import import_time
+
+
+def test_import_time_budget_and_side_effects():
+    # No database or Redis needed: the app is imported against an unreachable DATABASE_URL
+    result = import_time.measure(repeat=3)
+    assert import_time.check(result) == []